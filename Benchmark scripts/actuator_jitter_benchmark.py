@@ -0,0 +1,141 @@
+"""Measures how late the actuator ticks while orientation messages are parsed, with the simulated pigpio backend.
+
+Four runs with the same message load (json.loads + Car math, and every BURST_EVERY messages a large message whose
+parsing leaves a lot of garbage behind, so the garbage collector runs):
+
+    idle      actuator process, no messages parsed; the jitter of the operating system alone
+    single    parsing and the actuator tick in one thread, like v10 without SPLIT_PROCESSES; a tick has to wait
+              until the message being parsed is done
+    split     parsing in this process, the actuator in its own process reading the shared command slot
+    split_rt  as split, with the real-time mode of rt_tuning.py in the actuator process (its report is printed)
+
+Usage: python actuator_jitter_benchmark.py [--seconds S] [--rate MESSAGES_PER_SECOND] [--tick-us US]"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+import sim_pigpio  # noqa: E402
+sim_pigpio.install()
+import actuator_process  # noqa: E402
+import rt_tuning  # noqa: E402
+from car_model import Car, START_PW_Z, START_PW_ELEVATION  # noqa: E402
+from latency_stats import monotonic  # noqa: E402
+from pin_map import CARS  # noqa: E402
+from shared_command import CommandSlot  # noqa: E402
+
+PINS = {'enable_l': 4, 'enable_r': 17, 'dir_l': 27, 'dir_r': 22, 'servo_z': 19, 'servo_elevation': 18}
+LEVELS = CARS['v10'].levels()
+BURST_EVERY = 100  # Every 100th message is a large one
+BURST_ITEMS = 20000  # Objects in a large message
+
+
+def orientation_message(i):
+    return json.dumps({'do': {'alpha': (i * 7.3) % 360, 'beta': 10.0, 'gamma': ((i * 3.1) % 180) - 90,
+                              'absolute': False},
+                       'dm': {'gx': 0.5, 'gy': -0.25, 'gz': 9.8, 'x': 0, 'y': 0, 'z': 0}}).encode('utf-8')
+
+
+LARGE_MESSAGE = json.dumps({'log': [{'index': i, 'values': [i, i + 1]} for i in range(BURST_ITEMS)]}).encode('utf-8')
+
+
+class Parser(object):
+    """The network process work for one message: parse it and calculate the pulse widths"""
+
+    def __init__(self):
+        self.car = Car()
+        self.count = 0
+        self.kept = []  # Some parsed large messages are kept for a while, so the collector has real work
+
+    def handle(self):
+        self.count += 1
+        if self.count % BURST_EVERY == 0:
+            self.kept.append(json.loads(LARGE_MESSAGE))
+            if len(self.kept) > 3:
+                self.kept.pop(0)
+        self.car.extract_json_data(json.loads(orientation_message(self.count)))
+        self.car.calculate_new_pulse_widths()
+        return (self.car.get_driving_direction(), round(self.car.get_camera_direction_z(), -1),
+                round(self.car.get_camera_direction_elevation(), 0))
+
+
+def run_single(seconds, rate, tick_period):
+    """Parsing and ticking in one thread"""
+    slot = CommandSlot(create=True)
+    reader = CommandSlot(slot.name)
+    actuator = actuator_process.Actuator(sim_pigpio.pi(), reader, PINS, LEVELS, tick_period)
+    parser = Parser()
+    start = monotonic()
+    deadline = start
+    next_message = start
+    while monotonic() - start < seconds:
+        now = monotonic()
+        wake = min(deadline, next_message)
+        if wake > now:
+            time.sleep(wake - now)
+            now = monotonic()
+        if now >= deadline:
+            actuator.lateness.record(now - deadline)
+            actuator.tick(now)
+            deadline += tick_period
+            if monotonic() > deadline:
+                missed = int((monotonic() - deadline) / tick_period) + 1
+                actuator.missed_ticks += missed
+                deadline += missed * tick_period
+        while monotonic() >= next_message and monotonic() < deadline:
+            direction, pulse_width_z, pulse_width_elevation = parser.handle()
+            slot.write(monotonic(), 0, pulse_width_z, pulse_width_elevation)
+            next_message += 1.0 / rate
+    reader.close()
+    slot.close(unlink=True)
+    return actuator.summary()
+
+
+def run_split(seconds, rate, tick_period, parse=True, realtime=None):
+    """Parsing in this process, ticking in the actuator process"""
+    import multiprocessing
+    results = multiprocessing.get_context('fork').Queue()
+    process = actuator_process.ActuatorProcess(PINS, LEVELS, START_PW_Z, START_PW_ELEVATION, tick_period, results, realtime)
+    parser = Parser()
+    start = monotonic()
+    next_message = start
+    while monotonic() - start < seconds:
+        now = monotonic()
+        if next_message > now:
+            time.sleep(next_message - now)
+        if parse:
+            direction, pulse_width_z, pulse_width_elevation = parser.handle()
+            process.publish(direction, pulse_width_z, pulse_width_elevation)
+        else:
+            process.publish()  # Keeps the command fresh, so the motor timeout does not trigger
+        next_message += 1.0 / rate
+    process.quit()
+    return results.get(timeout=5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Actuator tick jitter with and without a separate process')
+    parser.add_argument('--seconds', type=float, default=5.0, help='length of every run')
+    parser.add_argument('--rate', type=float, default=500.0, help='orientation messages per second')
+    parser.add_argument('--tick-us', type=float, default=actuator_process.TICK_PERIOD * 1e6,
+                        help='actuator tick period in microseconds')
+    args = parser.parse_args()
+    tick_period = args.tick_us / 1e6
+    runs = [('idle', run_split(args.seconds, args.rate, tick_period, parse=False)),
+            ('single', run_single(args.seconds, args.rate, tick_period)),
+            ('split', run_split(args.seconds, args.rate, tick_period)),
+            ('split_rt', run_split(args.seconds, args.rate, tick_period,
+                                   realtime=rt_tuning.RealTimeMode(jitter_seconds=0)))]
+    print('%-8s %8s %12s %12s %12s %8s' % ('run', 'ticks', 'late p50 us', 'late p99 us', 'late max us', 'missed'))
+    for name, summary in runs:
+        print('%-8s %8d %12.0f %12.0f %12.0f %8d' % (
+            name, summary['ticks'], summary['lateness_p50'] * 1e6, summary['lateness_p99'] * 1e6,
+            summary['lateness_max'] * 1e6, summary['missed_ticks']))
+
+
+if __name__ == "__main__":
+    main()
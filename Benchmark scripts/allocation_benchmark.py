@@ -0,0 +1,104 @@
+"""Measures the memory the v10 hot path allocates for one binary orientation message, with tracemalloc (Python 3.9+).
+
+    legacy         connection.recv (new bytes object), binary_protocol.decode (new tuple), Car with an instance dict
+                   read through the getter methods
+    preallocated   connection.recv_into a reused buffer, binary_protocol.decode_into a reused Message, Car with
+                   __slots__ read through its fields, as v10 does now
+
+For each path the peak memory allocated while handling one message (above what was allocated before) and the time
+per message are printed, together with the size of a Car object with and without __slots__. The messages go through
+a real Unix SOCK_SEQPACKET socket pair like the UV4L socket. Floats are still new objects for every message; Python
+has no way to update a float in place.
+
+Usage: python allocation_benchmark.py [number of messages]"""
+
+import os
+import socket
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import binary_protocol  # noqa: E402
+from car_model import Car  # noqa: E402
+
+
+class DictCar(Car):
+    """Car as it was before __slots__: a subclass without __slots__ gets an instance dict again"""
+
+
+def handle_legacy(connection, the_car, buffer, message):
+    data = connection.recv(256)
+    flags, sequence, timestamp, alpha, beta, gamma, gx, gy, keycodes = binary_protocol.decode(data)
+    the_car.set_orientation(alpha, gamma, gx, gy, beta)
+    the_car.calculate_new_pulse_widths()
+    return round(the_car.get_camera_direction_z(), -1), round(the_car.get_camera_direction_elevation(), 0)
+
+
+def handle_preallocated(connection, the_car, buffer, message):
+    size = connection.recv_into(buffer)
+    binary_protocol.decode_into(buffer, size, message)
+    the_car.set_orientation(message.alpha, message.gamma, message.gx, message.gy, message.beta)
+    the_car.calculate_new_pulse_widths()
+    return round(the_car.cameraDirection_Z, -1), round(the_car.cameraDirection_Elevation, 0)
+
+
+def sample_messages(count):
+    return [binary_protocol.encode(i, i * 16, (i * 7.3) % 360, ((i * 3.1) % 180) - 90, 0.5, -0.25)
+            for i in range(count)]
+
+
+def measure(handle, the_car, messages):
+    """Returns (mean peak bytes per message, bytes still allocated after all messages, seconds per message)"""
+    sender, receiver = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    buffer = bytearray(256)
+    message = binary_protocol.Message()
+    for data in messages[:100]:  # Warm up, fills caches like the float free list
+        sender.send(data)
+        handle(receiver, the_car, buffer, message)
+    tracemalloc.start()
+    start_size = tracemalloc.get_traced_memory()[0]
+    peaks = 0
+    for data in messages:
+        sender.send(data)
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        handle(receiver, the_car, buffer, message)
+        peaks += tracemalloc.get_traced_memory()[1] - before
+    retained = tracemalloc.get_traced_memory()[0] - start_size
+    tracemalloc.stop()
+    elapsed = 0.0
+    for data in messages:
+        sender.send(data)
+        start = time.perf_counter()
+        handle(receiver, the_car, buffer, message)
+        elapsed += time.perf_counter() - start
+    sender.close()
+    receiver.close()
+    return float(peaks) / len(messages), retained, elapsed / len(messages)
+
+
+def object_size(cls, count=10000):
+    """Bytes allocated per object of cls, measured with tracemalloc"""
+    tracemalloc.start()
+    objects = [cls() for _ in range(count)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return float(size) / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    messages = sample_messages(count)
+    print('%-14s %16s %14s %14s' % ('path', 'peak bytes/msg', 'retained', 'us/msg'))
+    for name, handle, the_car in (('legacy', handle_legacy, DictCar()),
+                                  ('preallocated', handle_preallocated, Car())):
+        peak, retained, seconds = measure(handle, the_car, messages)
+        print('%-14s %16.1f %14d %14.2f' % (name, peak, retained, seconds * 1e6))
+    print('Car object: %.0f bytes with an instance dict, %.0f bytes with __slots__' % (
+        object_size(DictCar), object_size(Car)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Measures what logging costs the v10 control loop over a slow console, with the simulated pigpio backend.
+
+The log goes to a simulated serial console: a write takes as long as the line needs at --baud (10 bits per byte),
+like a print to a serial console or a congested SSH session. v10 runs with a simulated phone sending orientation
+messages at each of --rates per second (control_path_benchmark.bench_loop), once for each way of logging:
+
+    off               control_log disabled
+    print             every message logged, written in the control loop (what v9 does with print)
+    queued            every message logged, written by the background thread of control_log.py
+    queued, limited   the background thread with the LOG_LIMITS of v10 (the default)
+
+and the time from sending a message to the servo update is compared. A line of ~100 bytes takes ~9 ms at 115200
+baud: printed, the loop keeps up at 60 messages per second but not at 250.
+
+Usage: python control_log_benchmark.py [--rates HZ [HZ ...]] [--count N] [--baud BAUD]"""
+
+import argparse
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+import control_path_benchmark  # noqa: E402  (installs sim_pigpio and imports v10)
+from control_log import ControlLog  # noqa: E402
+
+car_program = control_path_benchmark.car_program
+percentile = control_path_benchmark.percentile
+UNLIMITED = dict((kind, (None, 1, 1)) for kind in ('message', 'direction', 'invalid', 'connection', 'link',
+                                                   'sample_age'))
+
+
+class SlowConsole(object):
+    """Stream whose writes take as long as sending the text at baud"""
+
+    def __init__(self, baud):
+        self.baud = baud
+        self.bytes = 0
+
+    def write(self, text):
+        self.bytes += len(text)
+        time.sleep(len(text) * 10.0 / self.baud)
+
+    def flush(self):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Control loop latency with logging off, printed and queued')
+    parser.add_argument('--rates', type=float, nargs='+', default=[60.0, 250.0], help='messages per second')
+    parser.add_argument('--count', type=int, default=300, help='messages per run')
+    parser.add_argument('--baud', type=int, default=115200, help='speed of the simulated console')
+    args = parser.parse_args()
+    modes = (('off', None, False), ('print', UNLIMITED, False), ('queued', UNLIMITED, True),
+             ('queued, limited', car_program.LOG_LIMITS, True))
+    print('%-6s %-16s %10s %10s %10s %10s %9s %9s' % ('rate', 'logging', 'msgs/s', 'p50 ms', 'p99 ms', 'max ms',
+                                                      'written', 'dropped'))
+    for rate in args.rates:
+        for name, limits, background in modes:
+            log = ControlLog(limits, stream=SlowConsole(args.baud), enabled=limits is not None)
+            car_program.control_log = log
+            car_program.monitor.log = car_program.link_timing.log = log.log
+            car_program.CONTROL_LOG = background  # main() starts the writer thread
+            throughput, latencies = control_path_benchmark.bench_loop(rate, args.count)
+            log.close(timeout=30)
+            dropped = log.overflows + sum(limit.sampled_out + limit.limited for limit in log.limits.values())
+            print('%-6d %-16s %10.1f %10.2f %10.2f %10.2f %9d %9d' % (
+                rate, name, throughput, percentile(latencies, 0.5) * 1e3, percentile(latencies, 0.99) * 1e3,
+                max(latencies) * 1e3 if latencies else 0.0, log.written, dropped))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""Benchmarks of the v10 control hot path, run on a computer with the simulated pigpio backend (sim_pigpio.py).
+
+Measures:
+    calculate        Car.calculate_new_pulse_widths
+    parse            json.loads + Car.extract_json_data of an orientation message
+    keycodes         dispatch_keycodes of a keycode message
+    drive_<name>     each driving function, including the simulated pigpio calls
+    loop_<rate>      the full v10 main() loop: messages are sent through the Unix socket at the given rate (messages
+                     per second, 0 = as fast as possible) and the time from send to the servo update is measured.
+                     The servo steps repeat every 81 messages, so with a larger backlog (rate 0) the latency is
+                     underestimated and only the throughput is meaningful
+
+Usage:
+    python control_path_benchmark.py [--save NAME] [--compare NAME] [--call-delay-us US] [--quick]
+
+--save stores the results in results/NAME.json next to this script, --compare prints the change against a saved run,
+so versions of the control loop can be compared on the same computer."""
+
+import argparse
+import json
+import os
+import platform
+import socket
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+import sim_pigpio  # noqa: E402
+sim_pigpio.install()
+import v10_VRCarcontrol_WebRTC_Two_Servos as car_program  # noqa: E402
+from latency_stats import monotonic  # noqa: E402
+
+RESULTS_DIR = os.path.join(HERE, 'results')
+SOCKET_PATH = '/tmp/uv4l.socket'  # Path used by setup_connection() in v10
+LOOP_RATES = (30, 60, 120, 250, 500, 1000, 0)  # Messages per second sent to the full loop, 0 = as fast as possible
+
+
+def orientation_message(alpha, gamma=60.0, gx=0.5, gy=-0.25):
+    """Orientation message as sent by the UV4L page"""
+    return json.dumps({'do': {'alpha': alpha, 'beta': 10.0, 'gamma': gamma, 'absolute': False},
+                       'dm': {'gx': gx, 'gy': gy, 'gz': 9.8, 'x': 0, 'y': 0, 'z': 0}}).encode('utf-8')
+
+
+def sample_messages(count):
+    """Orientation messages sweeping alpha, gamma and the upside-down accelerations over their whole range"""
+    messages = []
+    for i in range(count):
+        alpha = (i * 7.3) % 360
+        gamma = ((i * 3.1) % 180) - 90
+        g = ((i * 1.7) % 20) - 10
+        messages.append(orientation_message(alpha, gamma, g, -g))
+    return messages
+
+
+def time_per_call(function, arguments, repeat):
+    """Calls function once for each argument tuple, repeat times, and returns the fastest time per call in seconds"""
+    best = None
+    for _ in range(repeat):
+        start = monotonic()
+        for args in arguments:
+            function(*args)
+        elapsed = (monotonic() - start) / len(arguments)
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def bench_calculate(samples, repeat):
+    the_car = car_program.Car()
+    states = []
+    for message in samples:
+        data = json.loads(message)
+        states.append((data['do']['alpha'], data['do']['gamma'], data['dm']['gx'], data['dm']['gy']))
+
+    def calculate(alpha, gamma, gx, gy):
+        the_car.alpha_degrees = alpha
+        the_car.gamma_degrees = gamma
+        the_car.gx = gx
+        the_car.gy = gy
+        the_car.calculate_new_pulse_widths()
+    overhead = time_per_call(lambda alpha, gamma, gx, gy: None, states, repeat)
+    return time_per_call(calculate, states, repeat) - overhead
+
+
+def bench_parse(samples, repeat):
+    the_car = car_program.Car()
+
+    def parse(message):
+        the_car.extract_json_data(json.loads(message))
+    return time_per_call(parse, [(message,) for message in samples], repeat)
+
+
+def bench_keycodes(repeat):
+    the_car = car_program.Car()
+    keycodes = [car_program.keycode_forward, car_program.keycode_backward, car_program.keycode_left,
+                car_program.keycode_right, car_program.keycode_calibrate_forward, [65]]
+    return time_per_call(car_program.dispatch_keycodes, [(the_car, codes) for codes in keycodes * 100], repeat)
+
+
+def bench_drive(repeat):
+    results = {}
+    for name, function in sorted(car_program.driving_direction_list.items()):
+        car_program.pi.reset_counts()
+        results['drive_' + name] = time_per_call(function, [()] * 1000, repeat)
+        results['drive_%s_pigpio_calls' % name] = car_program.pi.total_calls() // (1000 * repeat)
+    return results
+
+
+def connect_client():
+    """Connect to the car program like UV4L does, retrying until main() listens"""
+    for _ in range(500):
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            client.connect(SOCKET_PATH)
+            return client
+        except socket.error:
+            client.close()
+            time.sleep(0.01)
+    raise RuntimeError('could not connect to ' + SOCKET_PATH)
+
+
+def bench_loop(rate, count):
+    """Runs v10 main() against a simulated phone sending count orientation messages at rate messages per second.
+       Returns the achieved messages per second and the send-to-servo latencies (seconds)"""
+    car_program.time = sim_pigpio.no_sleep_time()  # Skip the waits for the servos and the reconnect wait
+    sim = car_program.pi
+    reference_car = car_program.Car()
+    writes = []
+
+    def listener(now, name, gpio, value):
+        pulse_width = sim_pigpio.servo_pulse_width(name, value)  # set_servo_pulsewidth or hardware_PWM
+        if pulse_width and gpio == car_program.SERVO_PIN_Z_AXIS:
+            writes.append((now, pulse_width))
+    sim.listeners.append(listener)
+    thread = threading.Thread(target=car_program.main)
+    thread.start()
+    client = connect_client()
+    sends = []
+    interval = 1.0 / rate if rate else 0.0
+    next_send = monotonic()
+    start = monotonic()
+    for i in range(count):
+        alpha = 180.0 - ((i % 81) * 10 - 450) * 90 / 750.0  # Every message moves the z servo one 10 us step
+        message = orientation_message(alpha)
+        reference_car.extract_json_data(json.loads(message))
+        reference_car.calculate_new_pulse_widths()
+        if interval:
+            delay = next_send - monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            next_send += interval
+        sends.append((monotonic(), round(reference_car.get_camera_direction_z(), -1)))
+        client.send(message)
+    wait_until = monotonic() + 10
+    while not (writes and writes[-1][1] == sends[-1][1]) and monotonic() < wait_until:
+        time.sleep(0.001)  # Wait for the backlog to be handled before stop_servos() moves the servo
+    sim.listeners.remove(listener)
+    client.send(car_program.quit_command)
+    thread.join()
+    client.close()
+    elapsed = (writes[-1][0] if writes else monotonic()) - start
+    latencies = []
+    send_index = 0
+    for write_time, pulse_width in writes:  # Match every servo update with the newest message asking for it
+        while send_index + 1 < len(sends) and sends[send_index + 1][0] <= write_time:
+            send_index += 1
+        for j in range(send_index, max(-1, send_index - 81), -1):
+            if sends[j][1] == pulse_width:
+                latencies.append(write_time - sends[j][0])
+                break
+    return len(writes) / elapsed, latencies
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_all(quick, call_delay):
+    car_program.pi.call_delay = call_delay
+    repeat = 3 if quick else 7
+    samples = sample_messages(200 if quick else 2000)
+    results = {'calculate': bench_calculate(samples, repeat), 'parse': bench_parse(samples, repeat),
+               'keycodes': bench_keycodes(repeat)}
+    results.update(bench_drive(repeat))
+    for rate in LOOP_RATES:
+        count = max(100, rate * (1 if quick else 4)) if rate else (1000 if quick else 5000)
+        throughput, latencies = bench_loop(rate, count)
+        name = 'loop_%s' % (rate or 'max')
+        results[name + '_messages_per_s'] = throughput
+        results[name + '_p50'] = percentile(latencies, 0.5)
+        results[name + '_p99'] = percentile(latencies, 0.99)
+        results[name + '_max'] = max(latencies) if latencies else 0.0
+    return results
+
+
+def format_value(name, value):
+    if name.endswith('_calls'):
+        return '%10d' % value
+    if name.endswith('_per_s'):
+        return '%10.0f /s' % value
+    return '%10.2f us' % (value * 1e6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the v10 control hot path with simulated GPIO')
+    parser.add_argument('--save', metavar='NAME', help='save the results as results/NAME.json')
+    parser.add_argument('--compare', metavar='NAME', help='compare with the saved results/NAME.json')
+    parser.add_argument('--call-delay-us', type=float, default=0.0,
+                        help='simulated round trip time of every pigpio call in microseconds (default 0)')
+    parser.add_argument('--quick', action='store_true', help='fewer repetitions and messages')
+    args = parser.parse_args()
+    results = run_all(args.quick, args.call_delay_us / 1e6)
+    baseline = None
+    if args.compare:
+        with open(os.path.join(RESULTS_DIR, args.compare + '.json')) as f:
+            baseline = json.load(f)['results']
+    for name in sorted(results):
+        line = '%-32s %s' % (name, format_value(name, results[name]))
+        if baseline and baseline.get(name):
+            line += '  %+7.1f %%' % ((results[name] / baseline[name] - 1) * 100)
+        print(line)
+    if args.save:
+        if not os.path.isdir(RESULTS_DIR):
+            os.makedirs(RESULTS_DIR)
+        with open(os.path.join(RESULTS_DIR, args.save + '.json'), 'w') as f:
+            json.dump({'name': args.save, 'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+                       'python': platform.python_version(), 'machine': platform.machine(),
+                       'call_delay_us': args.call_delay_us, 'results': results}, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Compares the motor transitions of v10 made with pi.write calls against pigpio waveforms (drive_waveforms.py).
+
+Both run on the simulated pigpio backend (sim_pigpio.py), each call busy waiting --call-delay-us like a round trip
+to the pigpio daemon. For every transition (forward, left, backward, right, stop, ...):
+
+    writes     the v10 drive functions; the pin changes happen at the times the calls were made
+    waveform   one wave_send_once of the compiled transition; the pin changes are the ones the daemon would make
+
+are checked with drive_waveforms.check_timeline, and the time the motors are off during a transition (enable low
+until enable high) and the direction-to-enable gap are printed with the pigpio calls and the Python time per
+transition. Finally a maneuver, forward 300 ms then a left pivot 150 ms, is compiled into a wave chain and its
+executed timeline is verified.
+
+Usage: python drive_wave_benchmark.py [--transitions N] [--call-delay-us US]"""
+
+import argparse
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+import control_path_benchmark  # noqa: E402  (installs sim_pigpio and imports v10)
+import drive_waveforms  # noqa: E402
+from latency_stats import LogHistogram, monotonic  # noqa: E402
+
+car_program = control_path_benchmark.car_program
+sim_pigpio = control_path_benchmark.sim_pigpio
+PINS = {'enable_l': car_program.ENABLE_L_PIN, 'enable_r': car_program.ENABLE_R_PIN,
+        'dir_l': car_program.DIR_L_PIN, 'dir_r': car_program.DIR_R_PIN}
+LEVELS = car_program.PIN_MAP.levels()
+SEQUENCE = ('forward', 'left', 'backward', 'right', 'stop')
+
+
+def transition_times(timeline):
+    """Returns (motors off, direction to enable gap) in microseconds of one transition timeline, None for a stop"""
+    enables = (PINS['enable_l'], PINS['enable_r'])
+    directions = (PINS['dir_l'], PINS['dir_r'])
+    off = max(t for t, gpio, level in timeline if gpio in enables and not level)
+    on = [t for t, gpio, level in timeline if gpio in enables and level]
+    if not on:
+        return None
+    last_direction = max(t for t, gpio, level in timeline if gpio in directions)
+    return max(on) - off, max(on) - last_direction
+
+
+def run_writes(transitions, call_delay):
+    """The v10 drive functions with logged simulated calls"""
+    pi = car_program.pi
+    pi.call_delay = call_delay
+    pi.keep_log = True
+    times = []
+    calls = 0
+    timeline = []
+    off_times, gaps = LogHistogram(), LogHistogram()
+    for i in range(transitions):
+        pi.reset_counts()
+        start = monotonic()
+        car_program.write_driving_direction_list[SEQUENCE[i % len(SEQUENCE)]]()
+        times.append(monotonic() - start)
+        calls += pi.total_calls()
+        one = [((t - start) * 1e6, gpio, value) for t, name, gpio, value in pi.calls if name == 'write']
+        timeline += [(t + i * 1e6, gpio, value) for t, gpio, value in one]  # Transitions 1 s apart
+        result = transition_times(one)
+        if result:
+            off_times.record(result[0] / 1e6)
+            gaps.record(result[1] / 1e6)
+    pi.keep_log = False
+    pi.call_delay = 0.0
+    return times, calls, off_times, gaps, drive_waveforms.check_timeline(timeline, PINS)
+
+
+def run_waves(transitions, call_delay):
+    """One wave_send_once per transition"""
+    pi = sim_pigpio.pi(call_delay=call_delay)
+    waves = drive_waveforms.DriveWaves(pi, PINS, LEVELS)
+    times = []
+    calls = 0
+    timeline = []
+    off_times, gaps = LogHistogram(), LogHistogram()
+    for i in range(transitions):
+        pi.reset_counts()
+        start = monotonic()
+        waves.drive(SEQUENCE[i % len(SEQUENCE)])
+        times.append(monotonic() - start)
+        calls += pi.total_calls()
+        one = pi.wave_transmissions[-1][1]
+        timeline += [(t + i * 1e6, gpio, level) for t, gpio, level in one]
+        result = transition_times(one)
+        if result:
+            off_times.record(result[0] / 1e6)
+            gaps.record(result[1] / 1e6)
+    return times, calls, off_times, gaps, drive_waveforms.check_timeline(timeline, PINS)
+
+
+def run_maneuver():
+    pi = sim_pigpio.pi()
+    waves = drive_waveforms.DriveWaves(pi, PINS, LEVELS)
+    waves.maneuver([('forward', 0.3), ('left', 0.15)])
+    timeline = pi.wave_transmissions[-1][1]
+    enabled = [t for t, gpio, level in timeline if gpio == PINS['enable_l'] and level]
+    disabled = [t for t, gpio, level in timeline if gpio == PINS['enable_l'] and not level]
+    print('maneuver forward 300 ms, left 150 ms: %d chain bytes, enable_l high at %s us, low at %s us, %s' % (
+        len(waves.compile_maneuver([('forward', 0.3), ('left', 0.15)])), enabled, disabled,
+        '; '.join(drive_waveforms.check_timeline(timeline, PINS)) or 'safe'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Motor transitions with pi.write calls and with pigpio waveforms')
+    parser.add_argument('--transitions', type=int, default=5000, help='transitions per run')
+    parser.add_argument('--call-delay-us', type=float, default=60.0,
+                        help='simulated round trip of every pigpio call in microseconds')
+    args = parser.parse_args()
+    call_delay = args.call_delay_us / 1e6
+    print('%-9s %7s %11s %11s %11s %11s %11s %9s' % ('run', 'calls', 'python us', 'off p50 us', 'off max us',
+                                                      'gap p50 us', 'gap max us', 'problems'))
+    for name, run in (('writes', run_writes), ('waveform', run_waves)):
+        times, calls, off_times, gaps, problems = run(args.transitions, call_delay)
+        times.sort()
+        print('%-9s %7.1f %11.1f %11.1f %11.1f %11.1f %11.1f %9d' % (
+            name, float(calls) / len(times), times[len(times) // 2] * 1e6, off_times.percentile(0.5) * 1e6,
+            off_times.max * 1e6, gaps.percentile(0.5) * 1e6, gaps.max * 1e6, len(problems)))
+        for problem in problems[:3]:
+            print('    ' + problem)
+    run_maneuver()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Measures how fast v10 disables the motors when it is ended by a signal or fails, with and without the emergency
+stop (emergency_stop.py), on the simulated pigpio backend.
+
+Each trial starts v10 (run(), as from the command line) in a child process with every simulated pigpio call taking
+--call-delay-us, like the round trip to the daemon. A simulated phone keeps the car driving forward with keycode
+messages at --rate per second, then the program is ended by:
+
+    SIGTERM     os.kill, like systemctl stop
+    SIGINT      os.kill, like Ctrl-C
+    exception   a message that makes the control loop raise (an orientation without alpha)
+
+and the time until both enable pins are low is measured, on the common monotonic clock of both processes. Without
+the emergency stop the pins are written by stop_program(), or not at all.
+
+Usage: python emergency_stop_benchmark.py [--trials N] [--call-delay-us US] [--rate HZ]"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+from latency_stats import LogHistogram, monotonic  # noqa: E402
+
+SOCKET_PATH = '/tmp/uv4l.socket'  # Path used by setup_connection() in v10
+DRIVE_SECONDS = 0.3  # Seconds the car is driven before it is ended
+BOUND = 0.005  # Seconds, the target for the emergency stop
+MODES = ('SIGTERM', 'SIGINT', 'exception')
+FORWARD = json.dumps({'keycodes': [103]}).encode()
+FAILING = json.dumps({'do': {'gamma': 60.0}, 'dm': {'gx': 0, 'gy': 0}}).encode()  # float(None) raises TypeError
+
+
+def child(call_delay, emergency):
+    """Runs v10 on the simulated backend and prints the times both enable pins went low"""
+    import control_path_benchmark  # (installs sim_pigpio and imports v10)
+    car_program = control_path_benchmark.car_program
+    sim_pigpio = control_path_benchmark.sim_pigpio
+    enables = (car_program.ENABLE_L_PIN, car_program.ENABLE_R_PIN)
+    levels = dict((gpio, 0) for gpio in enables)  # The pins are shared by every pigpio connection
+    disabled = []
+    simulated_call = sim_pigpio.pi._call
+
+    def call(pi, name, gpio, value):
+        result = simulated_call(pi, name, gpio, value)  # Returns after the simulated round trip
+        if gpio in enables and name in ('write', 'set_PWM_dutycycle'):
+            enabled = any(levels.values())
+            levels[gpio] = value
+            if enabled and not any(levels.values()):
+                disabled.append(monotonic())
+        return result
+    sim_pigpio.pi._call = call
+    sim_pigpio.CALL_DELAY = call_delay  # For the connection of the emergency stop
+    car_program.pi.call_delay = call_delay
+    car_program.time = sim_pigpio.no_sleep_time()  # Skip the waits for the servos
+    car_program.EMERGENCY_STOP = emergency
+    try:
+        car_program.run()
+    finally:
+        print('DISABLED %s' % json.dumps(disabled))
+        sys.stdout.flush()
+
+
+def connect_client():
+    """Connect to the child like UV4L does, retrying until it listens"""
+    import socket
+    for _ in range(1000):
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        try:
+            client.connect(SOCKET_PATH)
+            return client
+        except socket.error:
+            client.close()
+            time.sleep(0.01)
+    raise RuntimeError('could not connect to ' + SOCKET_PATH)
+
+
+def trial(mode, emergency, call_delay_us, rate):
+    """Returns the seconds from ending the program to the enable pins being low, None if they stayed high"""
+    if os.path.exists(SOCKET_PATH):
+        os.unlink(SOCKET_PATH)  # So the client waits for the new child
+    arguments = [sys.executable, os.path.abspath(__file__), '--child', '--call-delay-us', str(call_delay_us)]
+    process = subprocess.Popen(arguments + ([] if emergency else ['--no-emergency']), stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, universal_newlines=True)
+    client = connect_client()
+    running = [True]
+
+    def drive():
+        while running[0]:
+            try:
+                client.send(FORWARD)
+            except (IOError, OSError):
+                return
+            time.sleep(1.0 / rate)
+    sender = threading.Thread(target=drive)
+    sender.start()
+    time.sleep(DRIVE_SECONDS)
+    ended = monotonic()
+    if mode == 'exception':
+        client.send(FAILING)
+    else:
+        os.kill(process.pid, signal.SIGTERM if mode == 'SIGTERM' else signal.SIGINT)
+    output = process.communicate()[0]
+    running[0] = False
+    sender.join()
+    client.close()
+    for line in output.splitlines():
+        if line.startswith('DISABLED '):
+            after = [t for t in json.loads(line[len('DISABLED '):]) if t >= ended]
+            return after[0] - ended if after else None
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time to disable the motors when v10 is ended or fails')
+    parser.add_argument('--trials', type=int, default=10, help='trials per mode')
+    parser.add_argument('--call-delay-us', type=float, default=100.0, help='simulated pigpio round trip')
+    parser.add_argument('--rate', type=float, default=60.0, help='keycode messages per second while driving')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--no-emergency', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.call_delay_us * 1e-6, not args.no_emergency)
+    print('%-10s %-15s %10s %10s %10s %12s' % ('ended by', 'emergency stop', 'p50 ms', 'max ms', 'bound ms',
+                                               'left enabled'))
+    for mode in MODES:
+        for emergency in (True, False):
+            latencies = LogHistogram()
+            left_enabled = 0
+            for i in range(args.trials):
+                seconds = trial(mode, emergency, args.call_delay_us, args.rate)
+                if seconds is None:
+                    left_enabled += 1
+                else:
+                    latencies.record(seconds)
+            print('%-10s %-15s %10.2f %10.2f %10.0f %9d/%d' % (
+                mode, 'on' if emergency else 'off', latencies.percentile(0.5) * 1e3 if latencies.count else 0.0,
+                latencies.max * 1e3 if latencies.count else 0.0, BOUND * 1e3, left_enabled, args.trials))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Compares the camera servo math of the scalar Car (car_model.py) with the declared gimbal axes (gimbal.py).
+
+--samples random head orientations go through Car.calculate_new_pulse_widths twice: without a gimbal, and with
+Gimbal(v10_axes(...)), which must give the same pulse widths to the bit. Then the time per sample is measured for:
+
+    scalar      the two servo code paths of Car
+    gimbal N    a Gimbal with N axes: the two servos of v10 and N - 2 more on pan, tilt and roll
+
+The gimbal walks the axes in a Python loop, one more axis costs a fraction of a microsecond.
+
+Usage: python gimbal_benchmark.py [--samples N] [--repeat N]"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+import gimbal  # noqa: E402
+from car_model import Car  # noqa: E402
+
+AXIS_COUNTS = (2, 4, 8, 16)
+
+
+def orientations(samples):
+    """Random (alpha, beta, gamma) head orientations around forward, and a few beyond the servo limits"""
+    random.seed(1)
+    return [(random.uniform(90, 270), random.uniform(-45, 45), random.uniform(0, 180)) for i in range(samples)]
+
+
+def make_car(axis_count):
+    """A Car with a gimbal of axis_count axes, or without one for axis_count None"""
+    car = Car()
+    if axis_count is not None:
+        extra = [gimbal.GimbalAxis('extra%d' % i, gimbal.SOURCES[i % 3], 100 + i, 1500, 750 / 90.0, 1000, 2000)
+                 for i in range(axis_count - 2)]
+        car.gimbal = gimbal.Gimbal(gimbal.v10_axes(19, 18) + extra)
+    return car
+
+
+def aim_all(car, samples):
+    for alpha, beta, gamma in samples:
+        car.alpha_degrees, car.beta_degrees, car.gamma_degrees = alpha, beta, gamma
+        car.calculate_new_pulse_widths()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scalar car servo math against the gimbal')
+    parser.add_argument('--samples', type=int, default=20000, help='random head orientations')
+    parser.add_argument('--repeat', type=int, default=5, help='timing runs, the best is shown')
+    args = parser.parse_args()
+    samples = orientations(args.samples)
+    scalar, vectorized = make_car(None), make_car(2)
+    mismatches = 0
+    for alpha, beta, gamma in samples:
+        for car in (scalar, vectorized):
+            car.alpha_degrees, car.beta_degrees, car.gamma_degrees = alpha, beta, gamma
+            car.calculate_new_pulse_widths()
+        if (scalar.cameraDirection_Z, scalar.cameraDirection_Elevation) != \
+                (vectorized.cameraDirection_Z, vectorized.cameraDirection_Elevation):
+            mismatches += 1
+    print('%d of %d samples differ between the scalar Car and Gimbal(v10_axes)' % (mismatches, len(samples)))
+    print('%-10s %6s %12s' % ('', 'axes', 'us/sample'))
+    for name, axis_count in [('scalar', None)] + [('gimbal', count) for count in AXIS_COUNTS]:
+        car = make_car(axis_count)
+        best = min(timeit.repeat(lambda: aim_all(car, samples), number=1, repeat=args.repeat))
+        print('%-10s %6d %12.2f' % (name, axis_count or 2, best / len(samples) * 1e6))
+
+
+if __name__ == "__main__":
+    main()
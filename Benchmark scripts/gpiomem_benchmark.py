@@ -0,0 +1,109 @@
+"""Checks and times the /dev/gpiomem motor pin backend (gpiomem.py) on a computer without a Raspberry Pi.
+
+A regular file of gpiomem.BLOCK_SIZE bytes is mapped in place of /dev/gpiomem. The v10 drive functions run on a
+GpioMemPi around the simulated pigpio backend, every register store is read back from the file and compared with
+the store the pi.write calls of the function ask for, and the function select registers are checked. Then the time
+per motor pin write is measured for:
+
+    pigpio    sim_pigpio with --call-delay-us per call, like the round trip to the daemon
+    gpiomem   a store to the mapped file (on the Pi: to the GPIO registers)
+
+Usage: python gpiomem_benchmark.py [--writes N] [--call-delay-us US]"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+import control_path_benchmark  # noqa: E402  (installs sim_pigpio and imports v10)
+import gpiomem  # noqa: E402
+from latency_stats import monotonic  # noqa: E402
+
+car_program = control_path_benchmark.car_program
+sim_pigpio = control_path_benchmark.sim_pigpio
+MOTOR_PINS = (car_program.ENABLE_L_PIN, car_program.ENABLE_R_PIN, car_program.DIR_L_PIN, car_program.DIR_R_PIN)
+
+
+class RecordingGpioMem(gpiomem.GpioMem):
+    """Reads every stored register word back from the mapping"""
+
+    def __init__(self, path):
+        gpiomem.GpioMem.__init__(self, path)
+        self.stores = []
+
+    def set_register(self, offset, value):
+        gpiomem.GpioMem.set_register(self, offset, value)
+        self.stores.append((offset, self.register(offset)))
+
+
+def expected_stores(function):
+    """The register stores asked for by the pi.write calls of a drive function, from a logged simulated run"""
+    pi = sim_pigpio.pi()
+    pi.keep_log = True
+    car_program.pi, saved = pi, car_program.pi
+    try:
+        function()
+    finally:
+        car_program.pi = saved
+    return [(gpiomem.GPSET0 if value else gpiomem.GPCLR0, 1 << gpio) for t, name, gpio, value in pi.calls
+            if name == 'write']
+
+
+def check(path):
+    """Returns a list of problems (String)"""
+    memory = RecordingGpioMem(path)
+    pi = gpiomem.GpioMemPi(sim_pigpio.pi(), memory, MOTOR_PINS)
+    problems = []
+    for gpio in MOTOR_PINS:
+        function = (memory.register(gpiomem.GPFSEL0 + 4 * (gpio // 10)) >> (3 * (gpio % 10))) & 7
+        if function != gpiomem.FUNCTION_OUTPUT:
+            problems.append('gpio %d: function %d, not output' % (gpio, function))
+    car_program.pi, saved = pi, car_program.pi
+    try:
+        for name, function in sorted(car_program.write_driving_direction_list.items()):
+            del memory.stores[:]
+            function()
+            expected = expected_stores(function)
+            if memory.stores != expected:
+                problems.append('%s: stores %r, expected %r' % (name, memory.stores, expected))
+            if pi.pi.total_calls():  # Nothing may reach the daemon
+                problems.append('%s: %d pigpio calls' % (name, pi.pi.total_calls()))
+    finally:
+        car_program.pi = saved
+    memory.close()
+    return problems
+
+
+def time_writes(pi, writes):
+    start = monotonic()
+    for i in range(writes):
+        pi.write(car_program.ENABLE_L_PIN, i & 1)
+    return (monotonic() - start) / writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Register stores and write time of the /dev/gpiomem backend')
+    parser.add_argument('--writes', type=int, default=20000, help='timed writes per backend')
+    parser.add_argument('--call-delay-us', type=float, default=60.0,
+                        help='simulated round trip of every pigpio call in microseconds')
+    args = parser.parse_args()
+    handle, path = tempfile.mkstemp(prefix='gpiomem')
+    os.write(handle, b'\0' * gpiomem.BLOCK_SIZE)
+    os.close(handle)
+    try:
+        problems = check(path)
+        print('register stores of the drive functions: %s' % ('; '.join(problems) or 'as expected'))
+        memory = gpiomem.GpioMem(path)
+        print('pigpio   %8.2f us per write' % (time_writes(sim_pigpio.pi(call_delay=args.call_delay_us / 1e6),
+                                                          args.writes) * 1e6))
+        print('gpiomem  %8.2f us per write' % (time_writes(gpiomem.GpioMemPi(sim_pigpio.pi(), memory, MOTOR_PINS),
+                                                          args.writes) * 1e6))
+        memory.close()
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Measures the time from a key event until the GPIO write that applies it, for the old sleep-polled pygame loop
+(v5: 20 ms sleep per loop and 50 ms sleep after every event) and for the event driven KeyboardInput.
+
+Bursts of key presses/releases are injected from a separate thread and the latency is measured from the last event
+of each burst until the drive function has written the resulting driving direction. No hardware is needed.
+
+Usage: python keyboard_latency_benchmark.py [number of bursts]"""
+
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from keyboard_input import HeldKeyTracker, KeyboardInput, QueueEventSource, monotonic  # noqa: E402
+
+BURST_SIZES = (1, 2, 4, 8)  # Number of key events in one burst
+BURST_GAP = 0.5  # Seconds between bursts, long enough for the old loop to drain a burst of 8 events
+
+
+class SimulatedGpio(object):
+    """Records the time of every drive function call instead of writing to the pins"""
+
+    def __init__(self):
+        self.writes = []
+
+    def drive(self, direction):
+        self.writes.append((monotonic(), direction))
+
+
+def make_bursts(count, seed=1):
+    """Random bursts of driving key events. Returns a list of event lists and the driving direction after each burst"""
+    rng = random.Random(seed)
+    tracker = HeldKeyTracker()
+    held = set()
+    bursts = []
+    for i in range(count):
+        events = []
+        for _ in range(BURST_SIZES[i % len(BURST_SIZES)]):
+            action = rng.choice(('forward', 'backward', 'left', 'right'))
+            pressed = action not in held
+            if pressed:
+                held.add(action)
+                tracker.press(action)
+            else:
+                held.discard(action)
+                tracker.release(action)
+            events.append((action, pressed))
+        bursts.append((events, tracker.get_driving_direction()))
+    return bursts
+
+
+def legacy_loop(source, gpio, stop_event):
+    """Replica of the v5 main loop timing: sleep 20 ms, then drive and sleep 50 ms after each event"""
+    tracker = HeldKeyTracker()
+    while not stop_event.is_set():
+        time.sleep(.02)
+        for action, pressed, _ in source.wait(0):
+            if pressed:
+                tracker.press(action)
+            else:
+                tracker.release(action)
+            gpio.drive(tracker.get_driving_direction())
+            time.sleep(0.05)
+
+
+def event_driven_loop(source, gpio, stop_event):
+    KeyboardInput(source, gpio.drive).run(stop_event)
+
+
+def run(loop, bursts):
+    """Inject the bursts and return the latency (s) from the last event of each burst to the GPIO write applying it,
+       together with the total number of drive function calls"""
+    source = QueueEventSource()
+    gpio = SimulatedGpio()
+    stop_event = threading.Event()
+    thread = threading.Thread(target=loop, args=(source, gpio, stop_event))
+    thread.start()
+    sent = []
+    for events, direction in bursts:
+        for action, pressed in events:
+            source.put(action, pressed)
+        sent.append((monotonic(), direction))
+        time.sleep(BURST_GAP)
+    stop_event.set()
+    thread.join()
+    latencies = []
+    previous = 'stop'
+    for i, (sent_time, direction) in enumerate(sent):
+        next_time = sent[i + 1][0] if i + 1 < len(sent) else float('inf')
+        applied = [t for t, d in gpio.writes if sent_time <= t < next_time and d == direction]
+        if direction != previous and applied:  # Only bursts that change the driving direction are measured
+            latencies.append(applied[-1] - sent_time)
+        previous = direction
+    return latencies, len(gpio.writes)
+
+
+def summary(latencies):
+    latencies = sorted(latencies)
+    n = len(latencies)
+    return 'p50 %7.2f ms  p99 %7.2f ms  max %7.2f ms' % (latencies[n // 2] * 1000,
+                                                          latencies[min(n - 1, int(n * 0.99))] * 1000,
+                                                          latencies[-1] * 1000)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    bursts = make_bursts(count)
+    for name, loop in (('sleep-polled (v5)', legacy_loop), ('event driven', event_driven_loop)):
+        latencies, writes = run(loop, bursts)
+        print('%-18s %s  GPIO drive calls: %d' % (name, summary(latencies), writes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Measures how fast v10 reacts when the phone goes silent, with the simulated pigpio backend (sim_pigpio.py).
+
+A simulated phone page holds the forward key (a keycode message every 20 ms, timestamped like phone_data_channel.js)
+and answers the heartbeats of the link monitor, then stops sending in the middle of the drive, like a stalled WebRTC
+data channel. The simulated pigpio calls show when the car
+
+    degraded  put the enable pins on DEGRADED_DUTY_CYCLE (link_monitor.DEGRADE_AFTER)
+    stopped   wrote the enable pins low (link_monitor.STOP_AFTER)
+    parked    moved the servos to the starting position (link_monitor.PARK_AFTER)
+
+The time from the last message to each of them is printed, with the reaction after the limit and its bound
+(link_monitor.CHECK_INTERVAL). A last run answers the heartbeats late, to show the round trip time limit.
+
+Usage: python link_loss_benchmark.py [--runs N]"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+import control_path_benchmark  # noqa: E402  (installs sim_pigpio and imports v10)
+import link_monitor  # noqa: E402
+from latency_stats import monotonic  # noqa: E402
+
+car_program = control_path_benchmark.car_program
+sim_pigpio = control_path_benchmark.sim_pigpio
+KEY_INTERVAL = 0.02  # Seconds between two keycode messages while the key is held
+DRIVE_SECONDS = 0.5  # Driving before the phone goes silent
+EVENTS = (('degraded', link_monitor.DEGRADE_AFTER), ('stopped', link_monitor.STOP_AFTER),
+          ('parked', link_monitor.PARK_AFTER))
+
+
+class Phone(object):
+    """Sends held key messages and answers heartbeats after pong_delay seconds"""
+
+    def __init__(self, client, pong_delay=0.0):
+        self.client = client
+        self.pong_delay = pong_delay
+        self.sequence = 0
+        self.lock = threading.Lock()
+        self.silent = False
+        self.last_sent = None
+        self.receiver = threading.Thread(target=self.receive)
+        self.receiver.daemon = True
+        self.receiver.start()
+
+    def send(self, data):
+        with self.lock:
+            self.client.send(data)
+            self.last_sent = monotonic()
+
+    def send_key(self):
+        self.sequence += 1
+        self.send(json.dumps({'keycodes': car_program.keycode_forward, 'seq': self.sequence,
+                              'ts': monotonic() * 1000.0}).encode('utf-8'))
+
+    def receive(self):
+        while True:
+            try:
+                message = json.loads(self.client.recv(256).decode('utf-8'))
+            except (ValueError, OSError):
+                return
+            if 'ping' in message and not self.silent:
+                if self.pong_delay:
+                    time.sleep(self.pong_delay)
+                self.send(json.dumps({'pong': message['ping']}).encode('utf-8'))
+
+
+def run(pong_delay=0.0, silence=True, drive_seconds=DRIVE_SECONDS):
+    """Drives for drive_seconds, goes silent and returns the times (seconds after the last message) of the first
+       degrade, stop and park"""
+    sim = car_program.pi
+    events = {}
+
+    def listener(now, name, gpio, value):
+        if gpio == car_program.ENABLE_L_PIN and name == 'set_PWM_dutycycle':
+            events.setdefault('degraded', now)
+        elif gpio == car_program.ENABLE_L_PIN and name == 'write' and not value and 'driving' in events:
+            events.setdefault('stopped', now)
+        elif gpio == car_program.ENABLE_L_PIN and name == 'write' and value:
+            events.setdefault('driving', now)
+        elif sim_pigpio.servo_pulse_width(name, value) is not None and gpio == car_program.SERVO_PIN_Z_AXIS \
+                and 'stopped' in events:
+            events.setdefault('parked', now)
+    thread = threading.Thread(target=car_program.main)
+    thread.start()
+    client = control_path_benchmark.connect_client()
+    phone = Phone(client, pong_delay)
+    time.sleep(0.1)  # initialize_servo
+    sim.listeners.append(listener)
+    end = monotonic() + drive_seconds
+    while monotonic() < end:
+        phone.send_key()
+        time.sleep(KEY_INTERVAL)
+    if silence:
+        phone.silent = True
+        time.sleep(link_monitor.PARK_AFTER + 0.3)
+    sim.listeners.remove(listener)
+    last = phone.last_sent
+    phone.silent = False
+    phone.send(car_program.quit_command)
+    thread.join()
+    client.close()
+    return dict((name, events[name] - last) for name, limit in EVENTS if name in events), car_program.monitor
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reaction of the link monitor to a silent phone')
+    parser.add_argument('--runs', type=int, default=5, help='silent phone runs')
+    args = parser.parse_args()
+    car_program.time = control_path_benchmark.sim_pigpio.no_sleep_time()
+    print('%-10s %10s %14s %14s %10s' % ('event', 'limit ms', 'after last ms', 'reaction ms', 'bound ms'))
+    worst = {}
+    for _ in range(args.runs):
+        times, monitor = run()
+        for name, limit in EVENTS:
+            if name in times:
+                worst[name] = max(worst.get(name, 0.0), times[name])
+    for name, limit in EVENTS:
+        if name in worst:
+            print('%-10s %10.0f %14.1f %14.1f %10.0f' % (name, limit * 1000, worst[name] * 1000,
+                                                       (worst[name] - limit) * 1000,
+                                                       link_monitor.CHECK_INTERVAL * 1000))
+        else:
+            print('%-10s %10.0f %14s' % (name, limit * 1000, 'missing'))
+    print(monitor.format_report())
+    times, monitor = run(link_monitor.MAX_RTT * 1.5, silence=False, drive_seconds=2.0)
+    print('late heartbeats (%.0f ms): %s, rtt %.0f ms' % (
+        link_monitor.MAX_RTT * 1500, 'degraded' if 'degraded' in times else 'not degraded', (monitor.rtt or 0) * 1000))
+
+
+if __name__ == "__main__":
+    main()
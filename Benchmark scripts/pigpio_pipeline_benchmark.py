@@ -0,0 +1,70 @@
+"""Commands per second to a pigpio daemon with and without waiting for every reply (pigpio_pipeline.py).
+
+The stand-in daemon (sim_pigpiod.py) runs in this process on the loopback interface, with every reply held back by
+the given delays to simulate a LAN round trip. Three clients send the same motor pin writes:
+
+    waiting    PipelinedPi waiting for the reply of every command, like pigpio.pi
+    pipelined  PipelinedPi sending every command at once and waiting for all replies at the end
+    batched    PipelinedPi(batch=True), one send per BATCH commands (one drive function is 6)
+
+At the end the replies are checked (none failed, all matched) and the pin levels of the daemon are compared with
+the last writes.
+
+Usage: python pigpio_pipeline_benchmark.py [--commands N] [--delays-ms MS ...]"""
+
+import argparse
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, '..'))
+import pigpio_pipeline  # noqa: E402
+import sim_pigpiod  # noqa: E402
+from latency_stats import monotonic  # noqa: E402
+
+PINS = (4, 17, 27, 22)  # Motor pins of v10
+BATCH = 6
+
+
+def run(daemon, mode, commands):
+    """Returns commands per second and the problems found (list of String)"""
+    pi = pigpio_pipeline.PipelinedPi('127.0.0.1', daemon.port, batch=mode == 'batched')
+    start = monotonic()
+    for i in range(commands):
+        reply = pi.write(PINS[i % len(PINS)], (i // len(PINS)) & 1)
+        if mode == 'waiting':
+            pi.result(reply)
+        elif mode == 'batched' and i % BATCH == BATCH - 1:
+            pi.flush()
+    failed = pi.sync(10.0)
+    elapsed = monotonic() - start
+    problems = []
+    if failed or pi.received_count != commands:
+        problems.append('%d failed, %d of %d answered: %s' % (failed, pi.received_count, commands, pi.last_error))
+    for i in range(max(0, commands - len(PINS)), commands):
+        if daemon.pi.levels.get(PINS[i % len(PINS)]) != (i // len(PINS)) & 1:
+            problems.append('gpio %d has the wrong level' % PINS[i % len(PINS)])
+    pi.stop()
+    return commands / elapsed, problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='pigpio commands per second, waiting and pipelined')
+    parser.add_argument('--commands', type=int, default=20000, help='commands per pipelined run')
+    parser.add_argument('--delays-ms', type=float, nargs='+', default=[0.0, 0.2, 1.0],
+                        help='simulated round trips in milliseconds')
+    args = parser.parse_args()
+    print('%-9s %9s %14s %s' % ('delay ms', 'client', 'commands/s', 'problems'))
+    for delay in args.delays_ms:
+        daemon = sim_pigpiod.StandInDaemon(port=0, delay=delay / 1000.0).start()
+        for mode in ('waiting', 'pipelined', 'batched'):
+            commands = args.commands
+            if mode == 'waiting' and delay:
+                commands = min(commands, int(1.0 / (delay / 1000.0)))  # About a second
+            rate, problems = run(daemon, mode, commands)
+            print('%-9.1f %9s %14.0f %s' % (delay, mode, rate, '; '.join(problems) or 'none'))
+        daemon.close()
+
+
+if __name__ == "__main__":
+    main()
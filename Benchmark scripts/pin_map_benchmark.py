@@ -0,0 +1,118 @@
+"""Checks the pin maps of pin_map.py and compares the v10 drive functions with the compiled bank operations.
+
+For every car in pin_map.CARS the gpios and the bank operations per direction are printed, and a few broken maps
+are checked to be refused. Then every transition between two directions runs on the simulated pigpio backend, once
+with the v10 pi.write drive functions and once with pin_map.BankDriver:
+
+    levels     the motor pins must end the same
+    order      drive_waveforms.check_timeline: no direction pin changes while a motor is enabled
+
+and the pigpio calls and the time per transition are measured with --call-delay-us per call, like the round trip to
+the pigpio daemon.
+
+Usage: python pin_map_benchmark.py [--transitions N] [--call-delay-us US]"""
+
+import argparse
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+import control_path_benchmark  # noqa: E402  (installs sim_pigpio and imports v10)
+import pin_map  # noqa: E402
+from drive_waveforms import check_timeline  # noqa: E402
+from latency_stats import monotonic  # noqa: E402
+
+car_program = control_path_benchmark.car_program
+sim_pigpio = control_path_benchmark.sim_pigpio
+PIN_MAP = car_program.PIN_MAP
+BROKEN_MAPS = (  # (what is wrong, arguments of PinMap)
+    ('shared pin', dict(numbering='BCM', enable_l=4, enable_r=17, dir_l=27, dir_r=22, servo_z=4)),
+    ('power pin', dict(numbering='BOARD', enable_l=1, enable_r=11, dir_l=13, dir_r=15)),
+    ('no gpio 30', dict(numbering='BCM', enable_l=4, enable_r=17, dir_l=27, dir_r=30)),
+    ('missing pin', dict(numbering='BCM', enable_l=4, enable_r=17, dir_l=27, dir_r=None)),
+    ('numbering', dict(numbering='WIRINGPI', enable_l=7, enable_r=0, dir_l=2, dir_r=3)),
+)
+
+
+def print_maps():
+    for car, pins in sorted(pin_map.CARS.items()):
+        print('%-4s %-8s %s' % (car, pins.name, ', '.join('%s %d' % item for item in sorted(pins.pins().items()))))
+        for direction in pin_map.DIRECTIONS:
+            print('       %-9s %s' % (direction, ', '.join('%s 0x%07x' % operation
+                                                          for operation in pins.operations[direction])))
+    for problem, arguments in BROKEN_MAPS:
+        try:
+            pin_map.PinMap(**arguments)
+            print('%-12s accepted!' % problem)
+        except ValueError as e:
+            print('%-12s refused: %s' % (problem, e))
+
+
+def timeline(calls, start):
+    """The pin changes of logged write and bank calls, (microseconds, gpio, level); the enables first in a store"""
+    changes = []
+    order = (PIN_MAP.enable_l, PIN_MAP.enable_r)
+    for t, name, gpio, value in calls:
+        t = (t - start) * 1e6
+        if name == 'write':
+            changes.append((t, gpio, value))
+        elif name in ('set_bank_1', 'clear_bank_1'):
+            gpios = sorted((g for g in range(32) if value & (1 << g)), key=lambda g: g not in order)
+            changes.extend((t, g, int(name == 'set_bank_1')) for g in gpios)
+    return changes
+
+
+def run(functions, pi, previous, direction):
+    """Runs one transition, returns (problems, calls, seconds, motor levels)"""
+    functions[previous]()
+    pi.reset_counts()
+    start = monotonic()
+    functions[direction]()
+    seconds = monotonic() - start
+    levels = tuple(pi.levels.get(gpio, 0) for gpio in (PIN_MAP.enable_l, PIN_MAP.enable_r, PIN_MAP.dir_l,
+                                                      PIN_MAP.dir_r))
+    problems = check_timeline(timeline(pi.calls, start), PIN_MAP.pins(), 0)
+    return problems, pi.total_calls(), seconds, levels
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pin maps and the drive functions compiled into bank operations')
+    parser.add_argument('--transitions', type=int, default=200, help='timed runs of every transition')
+    parser.add_argument('--call-delay-us', type=float, default=60.0,
+                        help='simulated round trip of every pigpio call in microseconds')
+    args = parser.parse_args()
+    print_maps()
+    saved = car_program.pi
+    write_pi = car_program.pi = sim_pigpio.pi(call_delay=args.call_delay_us / 1e6)
+    bank_pi = sim_pigpio.pi(call_delay=args.call_delay_us / 1e6)
+    write_pi.keep_log = bank_pi.keep_log = True
+    backends = (('writes', car_program.write_driving_direction_list, write_pi),
+                ('bank', pin_map.BankDriver(bank_pi, PIN_MAP).functions(), bank_pi))
+    totals = dict((name, [0, 0.0, 0]) for name, functions, pi in backends)  # calls, seconds, problems
+    mismatches = []
+    try:
+        for previous in pin_map.DIRECTIONS:
+            for direction in pin_map.DIRECTIONS:
+                levels = []
+                for name, functions, pi in backends:
+                    for i in range(args.transitions):
+                        problems, calls, seconds, end = run(functions, pi, previous, direction)
+                        totals[name][0] += calls
+                        totals[name][1] += seconds
+                        totals[name][2] += len(problems)
+                    levels.append(end)
+                if levels[0] != levels[1]:
+                    mismatches.append('%s -> %s: writes %r, bank %r' % (previous, direction, levels[0], levels[1]))
+    finally:
+        car_program.pi = saved
+    runs = args.transitions * len(pin_map.DIRECTIONS) ** 2
+    print('motor levels after every transition: %s' % ('; '.join(mismatches) or 'the same'))
+    print('backend  calls/transition  us/transition  order problems')
+    for name, functions, pi in backends:
+        calls, seconds, problems = totals[name]
+        print('%-8s %16.2f %14.1f %15d' % (name, calls / float(runs), seconds / runs * 1e6, problems))
+
+
+if __name__ == "__main__":
+    main()
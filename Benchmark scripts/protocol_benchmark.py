@@ -0,0 +1,73 @@
+"""Compares the json orientation messages of the UV4L page with the binary messages of binary_protocol.py:
+bytes per message and the time to decode a message into the Car object. No hardware is needed.
+
+Usage: python protocol_benchmark.py [number of messages]"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import binary_protocol  # noqa: E402
+from car_model import Car  # noqa: E402
+
+
+def json_messages(count):
+    """Orientation messages like the UV4L page sends them"""
+    messages = []
+    for i in range(count):
+        messages.append(json.dumps({'do': {'alpha': (i * 7.37) % 360, 'beta': 12.3456789, 'gamma': (i * 3.13) % 180 - 90,
+                                           'absolute': False},
+                                    'dm': {'gx': (i * 1.71) % 20 - 10, 'gy': -((i * 1.71) % 20 - 10), 'gz': 9.81,
+                                           'x': 0.01, 'y': 0.02, 'z': 0.03}}).encode('utf-8'))
+    return messages
+
+
+def binary_messages(messages):
+    result = []
+    for i, message in enumerate(messages):
+        data = json.loads(message)
+        result.append(binary_protocol.encode(i, i * 16, data['do']['alpha'], data['do']['gamma'], data['dm']['gx'],
+                                             data['dm']['gy'], beta=data['do']['beta']))
+    return result
+
+
+def decode_json(the_car, message):
+    the_car.extract_json_data(json.loads(message))
+
+
+def decode_binary(the_car, message):
+    flags, sequence, timestamp, alpha, beta, gamma, gx, gy, keycodes = binary_protocol.decode(message)
+    the_car.set_orientation(alpha, gamma, gx, gy, beta)
+
+
+def best_time(function, the_car, messages, repeat=7):
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        for message in messages:
+            function(the_car, message)
+        elapsed = (time.time() - start) / len(messages)
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    json_data = json_messages(count)
+    binary_data = binary_messages(json_data)
+    the_car = Car()
+    json_time = best_time(decode_json, the_car, json_data)
+    binary_time = best_time(decode_binary, the_car, binary_data)
+    json_bytes = sum(len(message) for message in json_data) / float(count)
+    binary_bytes = sum(len(message) for message in binary_data) / float(count)
+    print('%-8s %8s %12s' % ('format', 'bytes', 'decode us'))
+    print('%-8s %8.1f %12.2f' % ('json', json_bytes, json_time * 1e6))
+    print('%-8s %8.1f %12.2f' % ('binary', binary_bytes, binary_time * 1e6))
+    print('binary is %.1fx smaller and decodes %.1fx faster' % (json_bytes / binary_bytes, json_time / binary_time))
+
+
+if __name__ == "__main__":
+    main()
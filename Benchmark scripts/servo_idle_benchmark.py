@@ -0,0 +1,100 @@
+"""Measures the servo idle manager of v10 (servo_idle.py) with the simulated pigpio backend (sim_pigpio.py).
+
+A simulated phone sends orientation messages at --rate per second in cycles of:
+
+    move    the head turns, every message moves the z servo
+    still   the head is held still with sensor noise of +/- 1 degree, within servo_idle.DEADBAND_US
+    turn    one message turns the head 20 degrees
+
+v10 runs with SERVO_IDLE_AFTER = --idle-after. The z servo calls on the simulated backend show when the servo was
+detached after the last movement, how long after the turn message it was attached again (the servo gets its first
+pulse at most one 20 ms frame later), and how many pulse widths were sent while the head was still.
+
+Usage: python servo_idle_benchmark.py [--cycles N] [--idle-after S] [--still-seconds S] [--rate HZ]"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+import control_path_benchmark  # noqa: E402  (installs sim_pigpio and imports v10)
+from latency_stats import LogHistogram, monotonic  # noqa: E402
+
+car_program = control_path_benchmark.car_program
+sim_pigpio = control_path_benchmark.sim_pigpio
+MOVE_SECONDS = 0.5
+FRAME = 0.02  # Seconds between two servo pulses at 50 Hz
+
+
+def send_for(client, seconds, rate, alpha):
+    """Sends orientation messages with alpha(i) for seconds"""
+    end = monotonic() + seconds
+    i = 0
+    while monotonic() < end:
+        client.send(control_path_benchmark.orientation_message(alpha(i)))
+        i += 1
+        time.sleep(1.0 / rate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Detach and reattach of idle servos in v10')
+    parser.add_argument('--cycles', type=int, default=5, help='move, still and turn cycles')
+    parser.add_argument('--idle-after', type=float, default=0.5, help='SERVO_IDLE_AFTER in seconds')
+    parser.add_argument('--still-seconds', type=float, default=1.5, help='seconds the head is held still')
+    parser.add_argument('--rate', type=float, default=60.0, help='messages per second')
+    args = parser.parse_args()
+    car_program.time = sim_pigpio.no_sleep_time()
+    car_program.servo_idle.idle_after = args.idle_after
+    sim = car_program.pi
+    calls = []  # (time, pulse width) of the z servo
+
+    def listener(now, name, gpio, value):
+        pulse_width = sim_pigpio.servo_pulse_width(name, value)
+        if pulse_width is not None and gpio == car_program.SERVO_PIN_Z_AXIS:
+            calls.append((now, pulse_width))
+    thread = threading.Thread(target=car_program.main)
+    thread.start()
+    client = control_path_benchmark.connect_client()
+    time.sleep(0.1)  # initialize_servo
+    sim.listeners.append(listener)
+    random.seed(1)
+    detach_delays, reattach_latencies = LogHistogram(), LogHistogram()
+    still_writes = 0
+    still_time = 0.0
+    for cycle in range(args.cycles):
+        send_for(client, MOVE_SECONDS, args.rate, lambda i: 150.0 + i)
+        still_start = len(calls)
+        send_for(client, args.still_seconds, args.rate, lambda i: 180.0 + random.uniform(-1.0, 1.0))
+        detaches = [t for t, pulse_width in calls[still_start:] if pulse_width == 0]
+        if detaches:  # The last movement is the last target beyond the deadband, it may be a noisy still one
+            detach_delays.record(detaches[0] - car_program.servo_idle.axes['z'].last_move)
+            still_writes += len([t for t, pulse_width in calls[still_start:] if t > detaches[0]])
+            still_time += monotonic() - detaches[0]
+        turn_start = len(calls)
+        client.send(control_path_benchmark.orientation_message(200.0))
+        turned = monotonic()
+        while len(calls) == turn_start and monotonic() < turned + 1.0:
+            time.sleep(0.0005)
+        reattaches = [t for t, pulse_width in calls[turn_start:] if pulse_width]
+        if reattaches:
+            reattach_latencies.record(reattaches[0] - turned)
+    sim.listeners.remove(listener)
+    client.send(car_program.quit_command)
+    thread.join()
+    client.close()
+    print('%-32s %10s %10s %10s' % ('', 'p50 ms', 'max ms', 'bound ms'))
+    print('%-32s %10.1f %10.1f %10.0f' % ('detach after the last movement', detach_delays.percentile(0.5) * 1e3,
+                                          detach_delays.max * 1e3, (args.idle_after + 1.0 / args.rate) * 1e3))
+    print('%-32s %10.2f %10.2f %10.0f' % ('reattach after the turn message', reattach_latencies.percentile(0.5) * 1e3,
+                                          reattach_latencies.max * 1e3, FRAME * 1e3))
+    print('%d of %d cycles detached, %d of %d reattached; %d z pulse widths sent in %.1f s detached and still' % (
+        detach_delays.count, args.cycles, reattach_latencies.count, args.cycles, still_writes, still_time))
+    print(car_program.servo_idle.format_report())
+
+
+if __name__ == "__main__":
+    main()
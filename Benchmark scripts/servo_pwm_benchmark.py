@@ -0,0 +1,99 @@
+"""Compares the camera servo pulse widths of set_servo_pulsewidth with hardware PWM (servo_output.py).
+
+The car math of car_model.py turns --samples random head orientations into the pulse width the servos should get.
+Each is sent the way v10 sends it:
+
+    servo      rounded to tens of microseconds (Car.digits_z = -1), pi.set_servo_pulsewidth
+    hardware   rounded to tenths (servo_output.HARDWARE_DIGITS), pi.hardware_PWM at 50 Hz in millionths
+
+and the pulse width that reaches the servo is compared with the wanted one, in microseconds and in degrees of the
+z-axis servo. Then v10 runs on the simulated pigpio backend with a few orientation messages, to check which servo
+gpios got hardware PWM and that no other servo call was made for them.
+
+Usage: python servo_pwm_benchmark.py [--samples N]"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+import control_path_benchmark  # noqa: E402  (installs sim_pigpio and imports v10)
+import servo_output  # noqa: E402
+from car_model import Car, DEG2PW_FACTOR_Z  # noqa: E402
+
+car_program = control_path_benchmark.car_program
+sim_pigpio = control_path_benchmark.sim_pigpio
+
+
+def errors(samples, hardware):
+    """Returns the errors (microseconds) between the wanted and the sent z-axis pulse widths"""
+    exact = Car()
+    exact.digits_z = 6
+    car = Car()
+    if hardware:
+        car.digits_z = servo_output.HARDWARE_DIGITS
+    pi = sim_pigpio.pi()
+    gpio = 18 if hardware else 23
+    result = []
+    random.seed(1)
+    for i in range(samples):
+        alpha, gamma = random.uniform(120, 240), random.uniform(30, 150)
+        for the_car in (exact, car):
+            the_car.set_orientation(alpha, gamma, 0, 0)
+            the_car.calculate_new_pulse_widths()
+        servo_output.set_pulse_width(pi, gpio, car.cameraDirection_Z, hardware)
+        if hardware:
+            sent = sim_pigpio.servo_pulse_width('hardware_PWM', pi.hardware_pwm[gpio])
+        else:
+            sent = pi.servo_pulsewidths[gpio]
+        result.append(abs(sent - exact.cameraDirection_Z))
+    return result
+
+
+def run_v10():
+    """Returns the hardware PWM and servo calls per servo gpio of a short v10 session"""
+    car_program.time = sim_pigpio.no_sleep_time()
+    sim = car_program.pi
+    calls = {}
+
+    def listener(now, name, gpio, value):
+        if name in ('hardware_PWM', 'set_servo_pulsewidth'):
+            calls[gpio, name] = calls.get((gpio, name), 0) + 1
+    sim.listeners.append(listener)
+    thread = threading.Thread(target=car_program.main)
+    thread.start()
+    client = control_path_benchmark.connect_client()
+    for alpha in range(150, 210, 5):
+        client.send(json.dumps({'do': {'alpha': alpha, 'gamma': 60}, 'dm': {'gx': 0, 'gy': 0}}).encode())
+        time.sleep(0.005)
+    client.send(car_program.quit_command)
+    thread.join()
+    client.close()
+    sim.listeners.remove(listener)
+    return calls, sim.hardware_pwm
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pulse width resolution of set_servo_pulsewidth and hardware PWM')
+    parser.add_argument('--samples', type=int, default=20000, help='random head orientations')
+    args = parser.parse_args()
+    print('output    mean error  max error  max error')
+    for name, hardware in (('servo', False), ('hardware', True)):
+        result = errors(args.samples, hardware)
+        print('%-8s %8.3f us %8.3f us %7.3f deg' % (name, sum(result) / len(result), max(result),
+                                                    max(result) / DEG2PW_FACTOR_Z))
+    print('v10 servo gpios on hardware PWM: %s' % sorted(car_program.hardware_servo_pins))
+    calls, hardware_pwm = run_v10()
+    for (gpio, name), count in sorted(calls.items()):
+        print('gpio %d: %d %s calls' % (gpio, count, name))
+    print('hardware PWM after stop_servos: %s' % ', '.join('gpio %d %r' % item
+                                                           for item in sorted(hardware_pwm.items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Daemon round trips and time per control loop message: one pigpio call per pin against one stored script run.
+
+Runs on the simulated pigpio backend (sim_pigpio.py), every call busy waiting --call-delay-us like a round trip to
+the pigpio daemon. The same messages are applied twice, with only the changed pins sent as in v10:
+
+    per_pin   the drive functions of v10 and one set_servo_pulsewidth per changed servo
+    script    one run_script of pigpio_scripts.TickScript for every message that changes anything
+
+The z-axis servo moves with every message, the elevation servo with every second one and the driving direction
+changes every DRIVE_EVERY messages. The pin states after both runs are compared.
+
+Usage: python stored_script_benchmark.py [--messages N] [--call-delay-us US]"""
+
+import argparse
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+import control_path_benchmark  # noqa: E402  (installs sim_pigpio and imports v10)
+import pigpio_scripts  # noqa: E402
+from latency_stats import LogHistogram, monotonic  # noqa: E402
+
+car_program = control_path_benchmark.car_program
+sim_pigpio = control_path_benchmark.sim_pigpio
+PINS = {'enable_l': car_program.ENABLE_L_PIN, 'enable_r': car_program.ENABLE_R_PIN, 'dir_l': car_program.DIR_L_PIN,
+        'dir_r': car_program.DIR_R_PIN, 'servo_z': car_program.SERVO_PIN_Z_AXIS,
+        'servo_elevation': car_program.SERVO_PIN_ELEVATION}
+LEVELS = car_program.PIN_MAP.levels()
+DIRECTIONS = ('forward', 'left', 'backward', 'right', 'stop')
+DRIVE_EVERY = 20  # Messages between two driving direction changes
+
+
+def commands(count):
+    """(direction, pulse width z, pulse width elevation) of every message"""
+    return [(DIRECTIONS[(i // DRIVE_EVERY) % len(DIRECTIONS)], 1100 + (i % 70) * 10, 1000 + (i // 2 % 100) * 10)
+            for i in range(count)]
+
+
+def per_pin(pi):
+    """Applies a command like the v10 loop without STORED_SCRIPTS"""
+    state = {'direction': 'stop', 'z': None, 'elevation': None}
+
+    def apply(direction, pulse_width_z, pulse_width_elevation):
+        if direction != state['direction']:
+            car_program.write_driving_direction_list[direction]()
+            state['direction'] = direction
+        if pulse_width_z != state['z']:
+            pi.set_servo_pulsewidth(PINS['servo_z'], pulse_width_z)
+            state['z'] = pulse_width_z
+        if pulse_width_elevation != state['elevation']:
+            pi.set_servo_pulsewidth(PINS['servo_elevation'], pulse_width_elevation)
+            state['elevation'] = pulse_width_elevation
+    return apply
+
+
+def script(pi):
+    """Applies a command like the v10 loop with STORED_SCRIPTS"""
+    tick_script = pigpio_scripts.TickScript(pi, PINS, LEVELS)
+    state = {'direction': 'stop', 'z': None, 'elevation': None}
+
+    def apply(direction, pulse_width_z, pulse_width_elevation):
+        new_direction = direction if direction != state['direction'] else None
+        if new_direction is not None or pulse_width_z != state['z'] or pulse_width_elevation != state['elevation']:
+            tick_script.run(new_direction, pulse_width_z, pulse_width_elevation)
+            state['direction'], state['z'], state['elevation'] = direction, pulse_width_z, pulse_width_elevation
+    return apply
+
+
+def run(make_apply, pi, messages):
+    apply = make_apply(pi)
+    pi.reset_counts()
+    times = LogHistogram()
+    for command in messages:
+        start = monotonic()
+        apply(*command)
+        times.record(monotonic() - start)
+    pins = dict((gpio, pi.levels.get(gpio, 0)) for gpio in (PINS['enable_l'], PINS['enable_r'], PINS['dir_l'],
+                                                            PINS['dir_r']))
+    pins.update((gpio, pi.servo_pulsewidths.get(gpio)) for gpio in (PINS['servo_z'], PINS['servo_elevation']))
+    return float(pi.total_calls()) / len(messages), times, pins
+
+
+def main():
+    parser = argparse.ArgumentParser(description='pigpio calls per pin against one stored script run per message')
+    parser.add_argument('--messages', type=int, default=20000, help='messages applied per run')
+    parser.add_argument('--call-delay-us', type=float, default=60.0,
+                        help='simulated round trip of every pigpio call in microseconds')
+    args = parser.parse_args()
+    messages = commands(args.messages)
+    print('%-8s %14s %10s %10s %10s %10s' % ('run', 'trips/message', 'mean us', 'p50 us', 'p99 us', 'max us'))
+    results = []
+    for name, make_apply in (('per_pin', per_pin), ('script', script)):
+        pi = car_program.pi if make_apply is per_pin else sim_pigpio.pi()
+        pi.call_delay = args.call_delay_us / 1e6
+        trips, times, pins = run(make_apply, pi, messages)
+        pi.call_delay = 0.0
+        results.append(pins)
+        print('%-8s %14.2f %10.1f %10.1f %10.1f %10.1f' % (name, trips, times.mean() * 1e6,
+                                                          times.percentile(0.5) * 1e6, times.percentile(0.99) * 1e6,
+                                                          times.max * 1e6))
+    print('final pin states %s' % ('equal' if results[0] == results[1] else 'differ: %r' % results))
+
+
+if __name__ == "__main__":
+    main()
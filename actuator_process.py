@@ -0,0 +1,213 @@
+"""Actuator process: the only process talking to pigpio when the control program runs split in two processes.
+
+The network process (v10 with SPLIT_PROCESSES) receives and parses the phone messages, calculates the pulse widths
+and publishes the resulting command in a CommandSlot (shared_command.py). The actuator process wakes up every
+TICK_PERIOD, reads the latest command and only sends pigpio the pins and pulse widths that changed. It has its own
+interpreter and garbage collector, so json parsing, printing and collections in the network process do not delay a
+motor stop. If no new command arrives for COMMAND_TIMEOUT, the motors are stopped.
+
+The lateness of every tick (wake up time - planned time) is measured and printed when the process ends, see also
+Benchmark scripts/actuator_jitter_benchmark.py. Needs Python 3.8+ (multiprocessing.shared_memory)."""
+
+import multiprocessing
+import signal
+import time
+from time import monotonic
+
+from latency_stats import LogHistogram
+from rt_tuning import GcControl
+from servo_output import hardware_servos, set_pulse_width
+from shared_command import CommandSlot, DIRECTIONS, FLAG_QUIT
+
+# -------------------- Variables -----------------------------
+TICK_PERIOD = 0.005  # Seconds between two reads of the command slot (200 Hz)
+COMMAND_TIMEOUT = 0.5  # Seconds without a new command before the motors are stopped
+QUIT_TIMEOUT = 2.0  # Seconds the network process waits for the actuator process to exit
+# ------------------- END Variables --------------------------
+
+
+class Actuator(object):
+    """Applies the commands of a CommandSlot to the pins. pins is a dict with the gpio numbers 'enable_l',
+       'enable_r', 'dir_l', 'dir_r', 'servo_z' and 'servo_elevation', levels the direction pin levels (left, right)
+       per driving direction (PinMap.levels() of pin_map.py). With hardware_pwm the servos on gpios with a hardware
+       PWM channel use it (servo_output.py)."""
+
+    def __init__(self, pi, slot, pins, levels, tick_period=TICK_PERIOD, command_timeout=COMMAND_TIMEOUT,
+                 gc_control=None, hardware_pwm=False):
+        self.pi = pi
+        self.slot = slot
+        self.pins = pins
+        self.levels = levels
+        self.hardware = hardware_servos((pins['servo_z'], pins['servo_elevation'])) if hardware_pwm else set()
+        self.tick_period = tick_period
+        self.command_timeout = command_timeout
+        self.gc_control = GcControl(False) if gc_control is None else gc_control
+        self.direction = 'stop'  # State last sent to pigpio
+        self.pulse_width_z = None
+        self.pulse_width_elevation = None
+        self.command_number = None
+        self.last_command = monotonic()  # Time the latest new command was seen
+        self.lateness = LogHistogram()  # Wake up time - planned tick time
+        self.tick_time = LogHistogram()  # Time spent in one tick
+        self.command_age = LogHistogram()  # Time from publishing a command until it is applied
+        self.missed_ticks = 0  # Ticks skipped since the previous one ended after their planned time
+        self.busy_reads = 0  # Ticks where the slot stayed busy
+        self.timeout_stops = 0  # Motor stops caused by COMMAND_TIMEOUT
+        for name in ('enable_l', 'enable_r', 'dir_l', 'dir_r', 'servo_z', 'servo_elevation'):
+            pi.set_mode(pins[name], 1)  # pigpio.OUTPUT
+
+    def drive(self, direction):
+        """Sets the motor pins for a driving direction. The motors are disabled before the directions change."""
+        pi = self.pi
+        pins = self.pins
+        pi.write(pins['enable_l'], False)
+        pi.write(pins['enable_r'], False)
+        if direction == 'stop':
+            pi.write(pins['dir_l'], False)
+            pi.write(pins['dir_r'], False)
+        else:
+            left, right = self.levels[direction]
+            pi.write(pins['dir_l'], left)
+            pi.write(pins['dir_r'], right)
+            pi.write(pins['enable_l'], True)
+            pi.write(pins['enable_r'], True)
+        self.direction = direction
+
+    def apply(self, direction, pulse_width_z, pulse_width_elevation):
+        """Sends the parts of the command that differ from the current state"""
+        if direction != self.direction:
+            self.drive(direction)
+        if pulse_width_z != self.pulse_width_z:
+            set_pulse_width(self.pi, self.pins['servo_z'], pulse_width_z, self.pins['servo_z'] in self.hardware)
+            self.pulse_width_z = pulse_width_z
+        if pulse_width_elevation != self.pulse_width_elevation:
+            gpio = self.pins['servo_elevation']
+            set_pulse_width(self.pi, gpio, pulse_width_elevation, gpio in self.hardware)
+            self.pulse_width_elevation = pulse_width_elevation
+
+    def tick(self, now):
+        """Reads and applies the latest command. Returns False when the network process asked to quit."""
+        command = self.slot.read()
+        if command is None:
+            self.busy_reads += 1
+        else:
+            written, number, direction, flags, pulse_width_z, pulse_width_elevation = command
+            if number != self.command_number:
+                self.command_number = number
+                self.last_command = now
+                self.apply(DIRECTIONS[direction], pulse_width_z, pulse_width_elevation)
+                self.command_age.record(max(monotonic() - written, 0.0))
+            if flags & FLAG_QUIT:
+                self.drive('stop')
+                return False
+        if self.direction != 'stop' and now - self.last_command > self.command_timeout:
+            self.drive('stop')  # The network process has stopped sending, do not keep driving
+            self.timeout_stops += 1
+        self.gc_control.set_driving(self.direction != 'stop')
+        return True
+
+    def run(self):
+        """Ticks every tick_period until the network process asks to quit"""
+        deadline = monotonic()
+        while True:
+            now = monotonic()
+            if deadline > now:
+                time.sleep(deadline - now)
+                now = monotonic()
+            self.lateness.record(now - deadline)
+            if not self.tick(now):
+                break
+            self.tick_time.record(monotonic() - now)
+            deadline += self.tick_period
+            if monotonic() > deadline:  # Fell behind, skip the ticks instead of running them back to back
+                missed = int((monotonic() - deadline) / self.tick_period) + 1
+                self.missed_ticks += missed
+                deadline += missed * self.tick_period
+
+    def summary(self):
+        """Returns the jitter statistics (dict, seconds)"""
+        return {'ticks': self.lateness.count,
+                'lateness_p50': self.lateness.percentile(0.5), 'lateness_p99': self.lateness.percentile(0.99),
+                'lateness_max': self.lateness.max, 'tick_p99': self.tick_time.percentile(0.99),
+                'command_age_p50': self.command_age.percentile(0.5),
+                'command_age_p99': self.command_age.percentile(0.99),
+                'missed_ticks': self.missed_ticks, 'busy_reads': self.busy_reads,
+                'timeout_stops': self.timeout_stops}
+
+    def format_report(self):
+        summary = self.summary()
+        return ('actuator: %d ticks, lateness p50 %.0f us p99 %.0f us max %.0f us, command age p50 %.0f us p99 %.0f '
+                'us, %d missed ticks, %d busy reads, %d timeout stops' % (
+                    summary['ticks'], summary['lateness_p50'] * 1e6, summary['lateness_p99'] * 1e6,
+                    summary['lateness_max'] * 1e6, summary['command_age_p50'] * 1e6,
+                    summary['command_age_p99'] * 1e6, summary['missed_ticks'], summary['busy_reads'],
+                    summary['timeout_stops']))
+
+
+def _exit_on_signal(signal_number, frame):
+    raise SystemExit(128 + signal_number)
+
+
+def run_actuator(slot_name, pins, levels, tick_period=TICK_PERIOD, results=None, realtime=None, hardware_pwm=False,
+                 host='localhost'):
+    """Entry point of the actuator process: connects to the pigpio daemon on host, ticks until asked to quit, prints
+       the jitter report and puts the summary on the results queue if one is given. realtime is a RealTimeMode
+       (rt_tuning.py) to apply before the first tick, or None."""
+    import pigpio
+    # Forked with the signal handlers of the network process, whose emergency stop (emergency_stop.py) writes over a
+    # connection of that process. Here SIGTERM and SIGINT end the run, and the motors are stopped below
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    pi = pigpio.pi(host)
+    slot = CommandSlot(slot_name)
+    actuator = Actuator(pi, slot, pins, levels, tick_period, gc_control=GcControl(realtime is not None),
+                        hardware_pwm=hardware_pwm)
+    if realtime is not None:
+        print(realtime.apply().format_report())
+    try:
+        actuator.run()
+    finally:
+        actuator.drive('stop')
+        print(actuator.format_report())
+        if results is not None:
+            results.put(actuator.summary())
+        slot.close()
+        pi.stop()
+
+
+class ActuatorProcess(object):
+    """Network process side: starts the actuator process and publishes the commands. The last published state is
+       kept, so the driving direction and the servos can be changed separately."""
+
+    def __init__(self, pins, levels, pulse_width_z, pulse_width_elevation, tick_period=TICK_PERIOD, results=None,
+                 realtime=None, hardware_pwm=False, host='localhost'):
+        self.slot = CommandSlot(create=True)
+        self.direction = 'stop'
+        self.pulse_width_z = pulse_width_z
+        self.pulse_width_elevation = pulse_width_elevation
+        self.publish()
+        context = multiprocessing.get_context('fork')  # The child inherits sys.modules, including sim_pigpio
+        self.process = context.Process(target=run_actuator, name='actuator',
+                                       args=(self.slot.name, pins, levels, tick_period, results, realtime,
+                                             hardware_pwm, host))
+        self.process.daemon = True
+        self.process.start()
+
+    def publish(self, direction=None, pulse_width_z=None, pulse_width_elevation=None, flags=0):
+        """Publish a new command, arguments left out keep their last value"""
+        if direction is not None:
+            self.direction = direction
+        if pulse_width_z is not None:
+            self.pulse_width_z = pulse_width_z
+        if pulse_width_elevation is not None:
+            self.pulse_width_elevation = pulse_width_elevation
+        self.slot.write(monotonic(), DIRECTIONS.index(self.direction), self.pulse_width_z,
+                        self.pulse_width_elevation, flags)
+
+    def quit(self):
+        """Stops the motors, ends the actuator process and removes the command slot"""
+        self.publish('stop', flags=FLAG_QUIT)
+        self.process.join(QUIT_TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.slot.close(unlink=True)
@@ -0,0 +1,148 @@
+"""Batch evaluation of the camera orientation math with NumPy, for offline analysis of recorded sessions.
+
+batch_pulse_widths() takes arrays of alpha, gamma, gx and gy (one element per orientation message) and returns the
+pulse widths Car.calculate_new_pulse_widths() would have produced for the same sequence of messages, bit for bit,
+including the upside-down hysteresis that depends on the earlier messages and the rounding of the Car (digits_z,
+digits_elevation). Run the module to check this against the
+scalar Car on random samples and to compare the speed:
+
+    python batch_orientation.py [number of samples]"""
+
+import sys
+import time
+
+import numpy as np
+
+from car_model import Car, MAX_PW_ELEVATION, MIN_PW_ELEVATION, FORWARD_PW_ELEVATION, DEG2PW_FACTOR_ELEVATION, \
+    MAX_PW_Z, MIN_PW_Z, FORWARD_PW_Z, DEG2PW_FACTOR_Z
+
+# -------------------- Variables -----------------------------
+ROUND_HALF_EVEN = round(0.5) == 0  # Python 3 rounds ties to even, Python 2 rounds ties away from zero
+NEAR_TIE = 1e-6  # Scaled values this close to a tie are rounded one by one with round(), for ndigits > 0
+DIGITS = ((-1, 0), (1, 1))  # (digits_z, digits_elevation) checked by main(): software PWM and hardware PWM
+# ------------------- END Variables --------------------------
+
+
+def round_like_python(values, ndigits):
+    """Rounds an array of floats exactly like the built in round(value, ndigits) does for each element. ndigits is
+       a number or an array of them. numpy.round divides by the step first, which can move values lying just below
+       a tie onto it. For ndigits > 0 round() rounds the exact decimal value of the float, the few values that come
+       out near a tie once scaled are left to it."""
+    step = 10.0 ** -ndigits
+    rounded = np.rint(values / step) * step
+    difference = values - rounded  # Exact as long as the values are of the same magnitude as the rounded ones
+    half = step / 2
+    rounded = np.where(difference > half, rounded + step, rounded)
+    rounded = np.where(difference < -half, rounded - step, rounded)
+    difference = values - rounded
+    ties = np.abs(difference) == half
+    if ties.any():
+        lower = values - half
+        upper = values + half
+        if ROUND_HALF_EVEN:
+            lower_is_even = np.fmod(np.abs(lower) / step, 2) == 0
+            rounded = np.where(ties, np.where(lower_is_even, lower, upper), rounded)
+        else:
+            rounded = np.where(ties, np.where(values < 0, lower, upper), rounded)
+    fine = np.asarray(ndigits) > 0
+    if fine.any():
+        scale = 10.0 ** np.maximum(ndigits, 0)
+        scaled = values * scale
+        rounded = np.where(fine, np.rint(scaled) / scale, rounded)  # The division by an exact power of ten is exact
+        near_ties = fine & (np.abs(scaled - np.floor(scaled) - 0.5) < NEAR_TIE)
+        if near_ties.any():
+            values, ndigits = np.broadcast_arrays(values, ndigits)
+            for index in zip(*np.nonzero(near_ties)):
+                rounded[index] = round(float(values[index]), int(ndigits[index]))
+    return rounded
+
+
+def upside_down_states(gx, gy, upside_down=False):
+    """Returns the upside down state (bool array) after each message, starting from the given state, following
+       Car.check_upside_down: set when gx or gy > 7, cleared when gx or gy < -7, otherwise unchanged"""
+    set_state = (gx > 7) | (gy > 7)
+    clear_state = ~set_state & ((gx < -7) | (gy < -7))
+    changed = set_state | clear_state
+    last_change = np.maximum.accumulate(np.where(changed, np.arange(len(gx)), -1))
+    return np.where(last_change >= 0, set_state[np.maximum(last_change, 0)], upside_down)
+
+
+def batch_pulse_widths(alpha, gamma, gx, gy, camera_forward=180.0, upside_down=False, digits_z=-1,
+                       digits_elevation=0):
+    """Calculates the servo pulse widths for a sequence of orientation messages (array like alpha, gamma, gx, gy in
+       the order they were received). camera_forward, upside_down, digits_z and digits_elevation are the Car state
+       before the first message, the digits are finer for hardware PWM (servo_output.py).
+       Returns the arrays (pulse width z, pulse width elevation, upside down state after each message)."""
+    alpha = np.asarray(alpha, dtype=np.float64)
+    gamma = np.asarray(gamma, dtype=np.float64)
+    gx = np.asarray(gx, dtype=np.float64)
+    gy = np.asarray(gy, dtype=np.float64)
+    pointed_down = gamma < 0  # All angles change 180 degrees when the phone passes from pointing up to down
+    alpha = np.where(pointed_down, alpha - 180, alpha)
+    gamma = np.where(pointed_down, gamma + 180, gamma)
+    alpha = np.where(pointed_down & (alpha < 0), alpha + 360, alpha)
+    upside_down = upside_down_states(gx, gy, upside_down)
+    gamma = np.where(upside_down, 180 - gamma, gamma)
+    alpha_forward_diff1 = alpha - camera_forward
+    gamma_diff = 90 - gamma
+    alpha_forward_diff2 = np.where(alpha_forward_diff1 < 0, 360.0 + alpha - camera_forward,
+                                   -360.0 + alpha - camera_forward)
+    alpha_forward_diff = np.where(np.abs(alpha_forward_diff1) <= np.abs(alpha_forward_diff2), alpha_forward_diff1,
+                                  alpha_forward_diff2)
+    pulse_width_z = FORWARD_PW_Z - alpha_forward_diff * DEG2PW_FACTOR_Z
+    pulse_width_elevation = FORWARD_PW_ELEVATION - gamma_diff * DEG2PW_FACTOR_ELEVATION
+    pulse_width_z = np.where(pulse_width_z < MIN_PW_Z, MIN_PW_Z,
+                             np.where(pulse_width_z > MAX_PW_Z, MAX_PW_Z, round_like_python(pulse_width_z, digits_z)))
+    pulse_width_elevation = np.where(pulse_width_elevation < MIN_PW_ELEVATION, MIN_PW_ELEVATION,
+                                     np.where(pulse_width_elevation > MAX_PW_ELEVATION, MAX_PW_ELEVATION,
+                                              round_like_python(pulse_width_elevation, digits_elevation)))
+    return pulse_width_z, pulse_width_elevation, upside_down
+
+
+def scalar_pulse_widths(alpha, gamma, gx, gy, camera_forward=180.0, upside_down=False, digits_z=-1,
+                        digits_elevation=0):
+    """Reference implementation running the samples one by one through Car.calculate_new_pulse_widths"""
+    the_car = Car()
+    the_car.cameraForward = camera_forward
+    the_car.upside_down = upside_down
+    the_car.digits_z = digits_z
+    the_car.digits_elevation = digits_elevation
+    pulse_width_z = []
+    pulse_width_elevation = []
+    for i in range(len(alpha)):
+        the_car.alpha_degrees = float(alpha[i])
+        the_car.gamma_degrees = float(gamma[i])
+        the_car.gx = float(gx[i])
+        the_car.gy = float(gy[i])
+        the_car.calculate_new_pulse_widths()
+        pulse_width_z.append(the_car.get_camera_direction_z())
+        pulse_width_elevation.append(the_car.get_camera_direction_elevation())
+    return np.array(pulse_width_z, dtype=np.float64), np.array(pulse_width_elevation, dtype=np.float64)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    rng = np.random.RandomState(1)
+    alpha = rng.uniform(0, 360, count)
+    gamma = rng.uniform(-90, 90, count)
+    gx = rng.uniform(-10, 10, count)
+    gy = rng.uniform(-10, 10, count)
+    alpha[::7] = np.round(alpha[::7], 1)  # Phones send few decimals, which gives exact ties in the rounding
+    gamma[::5] = np.round(gamma[::5], 2)
+    for digits_z, digits_elevation in DIGITS:
+        start = time.time()
+        expected_z, expected_elevation = scalar_pulse_widths(alpha, gamma, gx, gy, digits_z=digits_z,
+                                                             digits_elevation=digits_elevation)
+        scalar_time = time.time() - start
+        start = time.time()
+        pulse_width_z, pulse_width_elevation, _ = batch_pulse_widths(alpha, gamma, gx, gy, digits_z=digits_z,
+                                                                     digits_elevation=digits_elevation)
+        batch_time = time.time() - start
+        mismatches = np.count_nonzero(pulse_width_z != expected_z) + \
+            np.count_nonzero(pulse_width_elevation != expected_elevation)
+        print('%d samples, digits %d/%d: scalar %.3f s, batch %.3f s (%.0fx), %d mismatches' % (
+            count, digits_z, digits_elevation, scalar_time, batch_time, scalar_time / batch_time, mismatches))
+
+
+if __name__ == "__main__":
+    main()
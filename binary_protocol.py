@@ -0,0 +1,121 @@
+"""Compact binary data channel messages, used instead of json when the phone page supports them.
+
+A binary message is one fixed layout struct of 22 bytes (little endian):
+
+    tag         uint8   TAG (0xB1), json messages start with '{' and the commands are plain text
+    flags       uint8   FLAG_ORIENTATION and/or FLAG_KEYCODES, tells which fields are valid
+    sequence    uint32  message counter of the phone
+    timestamp   uint32  phone clock in milliseconds (wraps around)
+    alpha       uint16  alpha in 1/100 degrees (0-36000)
+    beta        int16   beta in 1/100 degrees (-18000-18000), the roll of the head for the gimbal (gimbal.py)
+    gamma       int16   gamma in 1/100 degrees (-9000-9000)
+    gx, gy      int16   accelerations including gravity in 1/1000 m/s^2
+    keycodes    uint16  one bit per key in KEYCODES, set while the key is pressed
+
+The protocol is negotiated per connection: the phone page sends the json message {"protocol": PROTOCOL_NAME} and only
+switches to binary messages when the car answers with ACCEPT_MESSAGE. A car that does not know the protocol ignores
+the request and the page keeps sending json. The page side is implemented in phone_data_channel.js.
+
+binary1, the layout without beta, is no longer accepted: its pages keep sending json, which carries beta."""
+
+import json
+import struct
+
+# -------------------- Variables -----------------------------
+PROTOCOL_NAME = 'binary2'
+TAG = b'\xb1'  # First byte of every binary message
+TAG_VALUE = 0xb1  # The same as a number, for checking a bytearray receive buffer
+MESSAGE = struct.Struct('<BBIIHhhhhH')
+MESSAGE_SIZE = MESSAGE.size  # 22 bytes
+FLAG_ORIENTATION = 1  # alpha, beta, gamma, gx and gy are valid
+FLAG_KEYCODES = 2  # keycodes is valid
+ANGLE_SCALE = 100.0  # 1/100 degrees
+ACCELERATION_SCALE = 1000.0  # 1/1000 m/s^2
+KEYCODES = (103, 108, 105, 106, 28)  # Keycodes of bit 0, 1, 2, ... : up, down, left, right, enter
+ACCEPT_MESSAGE = json.dumps({'protocol': PROTOCOL_NAME, 'accepted': True}).encode('utf-8')  # Answer to the request
+# Keycode lists for every bit mask, so decoding does not build new lists
+KEYCODE_LISTS = [[code for bit, code in enumerate(KEYCODES) if mask & (1 << bit)] for mask in range(1 << len(KEYCODES))]
+# ------------------- END Variables --------------------------
+
+
+def is_binary(data):
+    """Returns True if the received data (bytes) is a binary message"""
+    return data[:1] == TAG
+
+
+def is_protocol_request(json_data):
+    """Returns True if a json message asks to switch to this binary protocol"""
+    return json_data.get('protocol') == PROTOCOL_NAME and not json_data.get('accepted')
+
+
+def decode(data):
+    """Decodes a binary message. Returns (flags, sequence, timestamp ms, alpha, beta, gamma, gx, gy, keycodes
+       list). Raises ValueError if the message has the wrong size or tag."""
+    if len(data) != MESSAGE_SIZE:
+        raise ValueError('binary message of %d bytes, expected %d' % (len(data), MESSAGE_SIZE))
+    tag, flags, sequence, timestamp, alpha, beta, gamma, gx, gy, keycodes = MESSAGE.unpack(data)
+    if tag != TAG_VALUE:
+        raise ValueError('not a binary message')
+    return (flags, sequence, timestamp, alpha / ANGLE_SCALE, beta / ANGLE_SCALE, gamma / ANGLE_SCALE,
+            gx / ACCELERATION_SCALE, gy / ACCELERATION_SCALE, KEYCODE_LISTS[keycodes & (len(KEYCODE_LISTS) - 1)])
+
+
+class Message(object):
+    """Decoded binary message, allocated once and filled in place by decode_into for every message"""
+    __slots__ = ('flags', 'sequence', 'timestamp', 'alpha', 'beta', 'gamma', 'gx', 'gy', 'keycodes')
+
+    def __init__(self):
+        self.flags = 0
+        self.sequence = 0
+        self.timestamp = 0
+        self.alpha = 0.0
+        self.beta = 0.0
+        self.gamma = 0.0
+        self.gx = 0.0
+        self.gy = 0.0
+        self.keycodes = KEYCODE_LISTS[0]
+
+
+def decode_into(buffer, size, message):
+    """Decodes the binary message in the first size bytes of buffer (bytearray, memoryview or bytes) into message
+       (Message), reading the buffer in place. Raises ValueError like decode()."""
+    if size != MESSAGE_SIZE:
+        raise ValueError('binary message of %d bytes, expected %d' % (size, MESSAGE_SIZE))
+    tag, flags, sequence, timestamp, alpha, beta, gamma, gx, gy, keycodes = MESSAGE.unpack_from(buffer)
+    if tag != TAG_VALUE:
+        raise ValueError('not a binary message')
+    message.flags = flags
+    message.sequence = sequence
+    message.timestamp = timestamp
+    message.alpha = alpha / ANGLE_SCALE
+    message.beta = beta / ANGLE_SCALE
+    message.gamma = gamma / ANGLE_SCALE
+    message.gx = gx / ACCELERATION_SCALE
+    message.gy = gy / ACCELERATION_SCALE
+    message.keycodes = KEYCODE_LISTS[keycodes & (len(KEYCODE_LISTS) - 1)]
+
+
+def clamp(value, low, high):
+    return low if value < low else high if value > high else value
+
+
+def encode(sequence, timestamp, alpha=None, gamma=0.0, gx=0.0, gy=0.0, keycodes=None, beta=0.0):
+    """Encodes a binary message like the phone page does. Orientation (with beta) is included when alpha is given,
+       keycodes (list) when keycodes is given. Used by benchmarks and simulated phones."""
+    flags = 0
+    mask = 0
+    if alpha is not None:
+        flags |= FLAG_ORIENTATION
+    else:
+        alpha = 0.0
+    if keycodes is not None:
+        flags |= FLAG_KEYCODES
+        for code in keycodes:
+            if code in KEYCODES:
+                mask |= 1 << KEYCODES.index(code)
+    return MESSAGE.pack(TAG_VALUE, flags, sequence & 0xffffffff, int(timestamp) & 0xffffffff,
+                        clamp(int(round(alpha * ANGLE_SCALE)), 0, 36000),
+                        clamp(int(round(beta * ANGLE_SCALE)), -18000, 18000),
+                        clamp(int(round(gamma * ANGLE_SCALE)), -9000, 9000),
+                        clamp(int(round(gx * ACCELERATION_SCALE)), -32768, 32767),
+                        clamp(int(round(gy * ACCELERATION_SCALE)), -32768, 32767), mask)
@@ -0,0 +1,165 @@
+"""Car state and camera orientation math of the WebRTC controlled car (v10).
+
+Kept free of any GPIO code, so the pulse width calculations can be used by offline analysis tools and benchmarks on
+a computer without the Raspberry Pi hardware."""
+
+# -------------------- Variables -----------------------------
+"""Servo limits and conversion factors used by the Car class"""
+MAX_PW_ELEVATION = 2100  # set the maximum pulse width of the pulse width modulation
+                         # for the Servo controlling elevation angle. Larger pulse width points the cameras downward
+                         # for maximum possible rotation without cameras = 2200
+MIN_PW_ELEVATION = 900  # set the minimum pulse width of the pulse width modulation
+                        # for the Servo controlling elevation angle. Lower pulse width points the cameras upwards
+START_PW_ELEVATION = 900  # initialization value for the z-axis servo
+FORWARD_PW_ELEVATION = 1900  # pulse width to make the cameras face forward
+DEG2PW_FACTOR_ELEVATION = 1000.0/90.0  # Factor to change from degrees into pulse width.
+MAX_PW_Z = 1850  # set the maximum pulse width of the pulse width modulation
+                 # for the Servo controlling rotation around Z-axis
+                 # for maximum possible rotation without cameras = 2250
+MIN_PW_Z = 1050  # set the minimum pulse width of the pulse width modulation
+                # for the Servo controlling rotation around Z-axis
+                # for maximum possible rotation without cameras = 750
+START_PW_Z = 1500  # initialization value for the z-axis servo
+FORWARD_PW_Z = 1500  # pulse width to make the cameras face forward
+DEG2PW_FACTOR_Z = 750/90.0  # Factor to change from degrees into pulse width.
+# ------------------- END Variables --------------------------
+# ------------------- Start Car Class ------------------------
+"""The Car class is used to keep track of the car settings. 
+   The car is initialized as standing still with camera direction forward"""
+
+
+class Car(object):
+    # Fixed set of fields: no per-instance dict, and the control loop can read the fields directly
+    __slots__ = ('drivingDirection', 'cameraDirection_Z', 'cameraDirection_Elevation', 'cameraForward',
+                 'alpha_degrees', 'gamma_degrees', 'gx', 'gy', 'upside_down', 'predictor', 'sample_time',
+                 'digits_z', 'digits_elevation', 'beta_degrees', 'gimbal')
+
+    def __init__(self):
+        """The car is initialized as standing still with camera direction forward"""
+        self.drivingDirection = "stop"
+        self.cameraDirection_Z = START_PW_Z
+        self.cameraDirection_Elevation = START_PW_ELEVATION
+        self.cameraForward = 180.0
+        self.alpha_degrees = 90
+        self.gamma_degrees = 90
+        self.gx = 0
+        self.gy = 0
+        self.upside_down = False
+        self.predictor = None  # HeadPredictor (head_prediction.py) aiming the camera ahead, None to follow directly
+        self.sample_time = None  # Time (monotonic, seconds) the phone read the current sample, None for now
+        self.digits_z = -1  # Decimal digits the pulse widths are rounded to, finer for hardware PWM (servo_output.py)
+        self.digits_elevation = 0
+        self.beta_degrees = 0.0  # Roll of the head, from the json and the binary orientation messages
+        self.gimbal = None  # Gimbal (gimbal.py) computing all servo axes at once, None for the two servos below
+
+    def get_driving_direction(self):
+        """Returns the driving direction (String)"""
+        return self.drivingDirection
+
+    def set_driving_direction(self, driving_direction):
+        """Set the driving direction (String): possible values: forward, backward, left, right and stop."""
+        self.drivingDirection = driving_direction
+
+    def get_camera_direction_z(self):
+        """Returns the pulse width of the PWM signal that controls the servo rotating around the z-axis."""
+        return self.cameraDirection_Z
+
+    def get_camera_direction_elevation(self):
+        """Returns the pulse width of the PWM signal that controls the servo controlling the elevation angle."""
+        return self.cameraDirection_Elevation
+
+    def set_camera_direction_z(self, camera_direction_z):
+        """Set the pulse width of the PWM signal that controls the servo rotating around the z-axis (float).
+           Checks if the pulse width is within the allowed pulse width length and otherwise sets it to the upper or
+           lower limit. If within the allowed pulse width it rounds the number to the closest tens, since the RPI can
+           only handle this resolution with set_servo_pulsewidth (digits_z)"""
+        if camera_direction_z < MIN_PW_Z:
+            self.cameraDirection_Z = MIN_PW_Z
+        elif camera_direction_z > MAX_PW_Z:
+            self.cameraDirection_Z = MAX_PW_Z
+        else:
+            self.cameraDirection_Z = round(camera_direction_z, self.digits_z)
+
+    def set_camera_direction_elevation(self, camera_direction_elevation):
+        """Set the pulse width of the PWM signal that controls the servo rotating around the z-axis. 
+           Checks if the pulse width is within the allowed pulse width length and otherwise sets it to the upper or
+           lower limit. If within the allowed pulse width it rounds the number to the closest tens, since the RPI can
+           only handle this resolution"""
+        if camera_direction_elevation < MIN_PW_ELEVATION:
+            self.cameraDirection_Elevation = MIN_PW_ELEVATION
+        elif camera_direction_elevation > MAX_PW_ELEVATION:
+            self.cameraDirection_Elevation = MAX_PW_ELEVATION
+        else:
+            self.cameraDirection_Elevation = round(camera_direction_elevation, self.digits_elevation)
+
+    def set_camera_forward(self):
+        """Recalibrates which angle is considered forward around the z axis (float)."""
+        self.cameraForward = self.alpha_degrees
+        if self.predictor is not None:  # The pan angle jumps, it is not a head movement
+            self.predictor.reset()
+        if self.gimbal is not None:
+            self.gimbal.reset()
+
+    def get_camera_forward(self):
+        """Returns which angle is considered forward (float)"""
+        return self.cameraForward
+
+    def calculate_new_pulse_widths(self):
+        """Calculates and sets the pulse width of the servos. All angles changes with 180 degrees when the phone passes
+        from being pointed upward to downward and vice versa. First check if the phone is pointed up or down and change
+        the degrees accordingly."""
+        if self.gamma_degrees < 0:
+            self.alpha_degrees -= 180
+            self.gamma_degrees += 180
+            if self.alpha_degrees < 0:
+                self.alpha_degrees += 360
+        self.check_upside_down()
+        if self.upside_down:
+            self.gamma_degrees = 180 - self.gamma_degrees
+        alpha_forward_diff1 = self.alpha_degrees - self.cameraForward
+        gamma_diff = 90 - self.gamma_degrees
+        if alpha_forward_diff1 < 0:
+            alpha_forward_diff2 = 360.0 + self.alpha_degrees - self.cameraForward
+        else:
+            alpha_forward_diff2 = -360.0 + self.alpha_degrees - self.cameraForward
+
+        if abs(alpha_forward_diff1) <= abs(alpha_forward_diff2):
+            alpha_forward_diff = alpha_forward_diff1
+        else:
+            alpha_forward_diff = alpha_forward_diff2
+        if self.predictor is not None:  # Aim where the head will be when the servos get there
+            alpha_forward_diff, gamma_diff = self.predictor.predict(self.sample_time, alpha_forward_diff, gamma_diff)
+        if self.gimbal is not None:  # Every axis in one pass, the first two are the servos of v10
+            pulse_widths = self.gimbal.aim(alpha_forward_diff, gamma_diff, self.beta_degrees)
+            self.cameraDirection_Z = float(pulse_widths[0])
+            self.cameraDirection_Elevation = float(pulse_widths[1])
+            return
+
+        self.set_camera_direction_z(FORWARD_PW_Z-alpha_forward_diff*DEG2PW_FACTOR_Z)
+        self.set_camera_direction_elevation(FORWARD_PW_ELEVATION-gamma_diff*DEG2PW_FACTOR_ELEVATION)
+
+    def extract_json_data(self, json_data):
+        """Extracts the relevant orientation data sent from phone and save them to class variables"""
+        self.alpha_degrees = float(json_data.get('do').get('alpha'))
+        self.gamma_degrees = float(json_data.get('do').get('gamma'))
+        self.beta_degrees = float(json_data.get('do').get('beta', 0.0))
+        self.gx = float(json_data.get('dm').get('gx'))
+        self.gy = float(json_data.get('dm').get('gy'))
+
+    def set_orientation(self, alpha_degrees, gamma_degrees, gx, gy, beta_degrees=0.0):
+        """Save orientation data decoded from a binary message (float) to class variables"""
+        self.alpha_degrees = alpha_degrees
+        self.beta_degrees = beta_degrees
+        self.gamma_degrees = gamma_degrees
+        self.gx = gx
+        self.gy = gy
+
+    def check_upside_down(self):
+        """ Check if the phone has turned 180 degrees around the phone's y-axis. upside down will change if the up down
+        tilt of the phone is between +/- 30 degrees"""
+        if self.gx > 7 or self.gy > 7:
+            self.upside_down = True
+        elif self.gx < -7 or self.gy < -7:
+            self.upside_down = False
+
+# ------------------- End Car Class------------------------------
@@ -0,0 +1,167 @@
+"""Structured log of the control loop, written by a background thread so a slow console never holds up the loop.
+
+v9 prints every message it receives; over a serial console (115200 baud, ~11 kB/s) or a slow SSH session a print
+blocks until the line is out, and the motors and servos wait for it. Here log() only checks the rate limit of the
+kind of record and puts it on a bounded queue. The writer thread formats the records, one JSON object per line:
+
+    {"direction": "forward", "kind": "direction", "time": 1700000000.123}
+
+and writes them to the stream, flushing once per batch. A full queue drops the record instead of waiting.
+
+Every kind of record has its own RateLimit: of the records offered only one in sample_every is kept, and of those at
+most rate per second pass, with bursts of up to burst. Kinds without a limit get DEFAULT_LIMIT. What was written,
+sampled out, rate limited and lost to a full queue is counted for format_report().
+
+See Benchmark scripts/control_log_benchmark.py."""
+
+import atexit
+import json
+import sys
+import threading
+import time
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+from latency_stats import monotonic
+
+# -------------------- Variables -----------------------------
+QUEUE_SIZE = 1024  # Records waiting for the writer thread, more are dropped
+DEFAULT_LIMIT = (20.0, 50, 1)  # Records per second, burst and sample_every of kinds without their own limit
+CLOSE_TIMEOUT = 2.0  # Seconds close() waits for the writer thread to write what is queued
+# ------------------- END Variables --------------------------
+
+
+class RateLimit(object):
+    """Sampling and token bucket of one kind of record, rate None for no rate limit"""
+    __slots__ = ('rate', 'burst', 'sample_every', 'tokens', 'updated', 'offered', 'sampled_out', 'limited')
+
+    def __init__(self, rate, burst, sample_every=1):
+        if sample_every < 1:
+            raise ValueError('sample_every must be at least 1, not %r' % sample_every)
+        self.rate = rate
+        self.burst = burst
+        self.sample_every = sample_every
+        self.tokens = float(burst)
+        self.updated = monotonic()
+        self.offered = 0
+        self.sampled_out = 0
+        self.limited = 0
+
+    def allow(self):
+        """Returns True when the next record of this kind is to be logged"""
+        self.offered += 1
+        if self.offered % self.sample_every:
+            self.sampled_out += 1
+            return False
+        if self.rate is None:
+            return True
+        now = monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1.0:
+            self.limited += 1
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+def format_record(wall_time, kind, fields):
+    """One log line: a JSON object with the fields, the kind and the time of the record"""
+    record = dict(fields)
+    record['kind'] = kind
+    record['time'] = round(wall_time, 3)
+    return json.dumps(record, sort_keys=True, default=repr)
+
+
+class ControlLog(object):
+    """Rate limited log, written by a background thread once started. limits maps a kind to (rate, burst,
+       sample_every). stream None writes to sys.stdout. Until start() (or with background False) log() writes the
+       record itself, like print."""
+
+    def __init__(self, limits=None, stream=None, queue_size=QUEUE_SIZE, background=True, enabled=True):
+        self.limits = dict((kind, RateLimit(*limit)) for kind, limit in (limits or {}).items())
+        self.stream = stream
+        self.queue = queue.Queue(queue_size)
+        self.background = background
+        self.enabled = enabled
+        self.thread = None
+        self.written = 0
+        self.overflows = 0  # Records dropped because the queue was full
+        self.lock = threading.Lock()  # One writer at a time, log() writes itself until start()
+        atexit.register(self.close)  # What is still queued at exit is written, the writer thread is a daemon
+
+    def start(self):
+        """Starts the writer thread, from now on log() only queues the records"""
+        if self.background and self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='control-log')
+            self.thread.daemon = True  # Never keeps the program alive
+            self.thread.start()
+        return self
+
+    def log(self, kind, **fields):
+        """Logs a record of kind with fields (JSON values, anything else is written with repr). Returns True when
+           it was written or queued"""
+        if not self.enabled:
+            return False
+        limit = self.limits.get(kind)
+        if limit is None:
+            limit = self.limits[kind] = RateLimit(*DEFAULT_LIMIT)
+        if not limit.allow():
+            return False
+        record = (time.time(), kind, fields)
+        if self.thread is None:
+            self._write((record,))
+            return True
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.overflows += 1
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            records = [self.queue.get()]
+            try:
+                while True:  # Everything queued meanwhile goes out with one flush
+                    records.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            done = None in records  # Queued by close()
+            self._write([record for record in records if record is not None])
+            if done:
+                return
+
+    def _write(self, records):
+        stream = self.stream if self.stream is not None else sys.stdout
+        with self.lock:
+            try:
+                for wall_time, kind, fields in records:
+                    stream.write(format_record(wall_time, kind, fields) + '\n')
+                stream.flush()
+            except (IOError, OSError, ValueError):  # The console went away, or the stream was closed
+                return
+            self.written += len(records)
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """Writes what is queued and stops the writer thread, waiting at most timeout seconds. log() writes the
+           records itself afterwards"""
+        thread = self.thread
+        if thread is None:
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        thread.join(timeout)
+        if not thread.is_alive():
+            self.thread = None
+
+    def format_report(self):
+        limits = sorted(self.limits.items())
+        return 'log: %d records written, %d lost to a full queue; %s' % (
+            self.written, self.overflows, ', '.join('%s %d offered, %d sampled out, %d rate limited' % (
+                kind, limit.offered, limit.sampled_out, limit.limited) for kind, limit in limits))
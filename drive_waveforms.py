@@ -0,0 +1,120 @@
+"""Hardware timed drive transitions and maneuvers with pigpio waveforms.
+
+A drive function of v10 is six pi.write calls, each a round trip to the pigpio daemon, so the time between disabling
+the motors, switching the H-bridge directions and enabling the motors again depends on Python and the socket. Here
+every transition is compiled once into a pigpio waveform (wave_add_generic + wave_create):
+
+    enable pins low, wait DEAD_TIME_US
+    direction pins set, wait DIRECTION_SETTLE_US
+    enable pins high (not for 'stop', which also sets the direction pins low like stop_motors)
+
+and is sent with a single wave_send_once, the daemon then sets the pins with microsecond timing. Timed maneuvers,
+e.g. [('forward', 0.3), ('left', 0.15)], are compiled into one wave_chain of the transition waves and chain delays,
+and always end with 'stop'.
+
+check_timeline() verifies a transmitted pin sequence; sim_pigpio.py executes waveforms and chains into such a
+timeline, see Benchmark scripts/drive_wave_benchmark.py."""
+
+import pigpio
+
+# -------------------- Variables -----------------------------
+DEAD_TIME_US = 100  # Microseconds the motors are disabled before the directions change
+DIRECTION_SETTLE_US = 100  # Microseconds between setting the directions and enabling the motors
+MAX_CHAIN_DELAY_US = 65535  # Longest delay of one wave_chain delay command
+MAX_CHAIN_BYTES = 600  # Longest wave_chain accepted by the daemon
+DIRECTIONS = ('stop', 'forward', 'backward', 'left', 'right')
+# ------------------- END Variables --------------------------
+
+
+def transition_pulses(pins, levels, direction, dead_time_us=DEAD_TIME_US, settle_us=DIRECTION_SETTLE_US):
+    """Returns the pigpio.pulse list of the transition to a driving direction. pins is a dict with the gpio numbers
+       'enable_l', 'enable_r', 'dir_l' and 'dir_r', levels the direction pin levels (left, right) per driving
+       direction (PinMap.levels() of pin_map.py)."""
+    enable_mask = (1 << pins['enable_l']) | (1 << pins['enable_r'])
+    direction_mask = (1 << pins['dir_l']) | (1 << pins['dir_r'])
+    if direction == 'stop':
+        return [pigpio.pulse(0, enable_mask, dead_time_us), pigpio.pulse(0, direction_mask, 0)]
+    left, right = levels[direction]
+    high = (1 << pins['dir_l'] if left else 0) | (1 << pins['dir_r'] if right else 0)
+    return [pigpio.pulse(0, enable_mask, dead_time_us),
+            pigpio.pulse(high, direction_mask & ~high, settle_us),
+            pigpio.pulse(enable_mask, 0, 0)]
+
+
+def chain_delay(microseconds):
+    """wave_chain commands waiting the given number of microseconds"""
+    commands = []
+    while microseconds > 0:
+        step = min(microseconds, MAX_CHAIN_DELAY_US)
+        commands += [255, 2, step & 0xff, step >> 8]
+        microseconds -= step
+    return commands
+
+
+class DriveWaves(object):
+    """The transition waveforms of one pigpio connection. Create them after the pins are set to output mode, the
+       daemon keeps them until wave_clear."""
+
+    def __init__(self, pi, pins, levels, dead_time_us=DEAD_TIME_US, settle_us=DIRECTION_SETTLE_US):
+        self.pi = pi
+        self.pins = pins
+        self.wave_ids = {}
+        pi.wave_clear()
+        for direction in DIRECTIONS:
+            pi.wave_add_generic(transition_pulses(pins, levels, direction, dead_time_us, settle_us))
+            self.wave_ids[direction] = pi.wave_create()
+
+    def drive(self, direction):
+        """Starts the transition to a driving direction, it replaces a transition or maneuver still running"""
+        self.pi.wave_send_once(self.wave_ids[direction])
+
+    def functions(self):
+        """Drive functions per direction, to replace the driving_direction_list of v10"""
+        return dict((direction, lambda direction=direction: self.drive(direction)) for direction in DIRECTIONS)
+
+    def compile_maneuver(self, steps):
+        """Returns the wave_chain commands (list of int) of a maneuver: (direction, seconds) steps, then 'stop'"""
+        chain = []
+        for direction, seconds in steps:
+            chain.append(self.wave_ids[direction])
+            chain += chain_delay(int(round(seconds * 1e6)))
+        chain.append(self.wave_ids['stop'])
+        if len(chain) > MAX_CHAIN_BYTES:
+            raise ValueError('maneuver too long: %d chain bytes' % len(chain))
+        return chain
+
+    def maneuver(self, steps):
+        """Runs a maneuver in the daemon, the call returns at once. wave_tx_busy() tells when it is done."""
+        self.pi.wave_chain(self.compile_maneuver(steps))
+
+    def stop(self):
+        """Aborts a running maneuver and stops the motors"""
+        self.pi.wave_tx_stop()
+        self.drive('stop')
+
+    def close(self):
+        for wave_id in self.wave_ids.values():
+            self.pi.wave_delete(wave_id)
+        self.wave_ids = {}
+
+
+def check_timeline(timeline, pins, min_gap_us=DEAD_TIME_US):
+    """Checks a transmitted pin sequence, a list of (microseconds, gpio, level) in time order, against the H-bridge
+       rules: the direction pins only change while both motors are disabled, and the motors are only enabled
+       min_gap_us after they were disabled. Returns a list of problems (String), empty when the sequence is safe."""
+    enables = (pins['enable_l'], pins['enable_r'])
+    directions = (pins['dir_l'], pins['dir_r'])
+    levels = {}
+    disabled_at = None  # Time both motors were disabled
+    problems = []
+    for t, gpio, level in timeline:
+        if gpio in directions and level != levels.get(gpio, 0) and any(levels.get(pin, 0) for pin in enables):
+            problems.append('%.0f us: direction gpio %d changed with the motors enabled' % (t, gpio))
+        if gpio in enables and level and not levels.get(gpio, 0) and disabled_at is not None \
+                and t - disabled_at < min_gap_us:
+            problems.append('%.0f us: gpio %d enabled %.0f us after the motors were disabled' % (
+                t, gpio, t - disabled_at))
+        levels[gpio] = level
+        if gpio in enables and not any(levels.get(pin, 0) for pin in enables):
+            disabled_at = t
+    return problems
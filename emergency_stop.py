@@ -0,0 +1,91 @@
+"""Emergency stop: the motors are disabled first when the control program is ended by a signal, fails or exits.
+
+stop_program() in v10 stops the motors and parks the cameras, which takes over a second, and only runs once main()
+has unwound; a SIGTERM used to end the program without it. An installed EmergencyStop writes the enable pins of the
+motors low right away when:
+
+    SIGTERM (systemctl stop) or SIGINT (Ctrl-C) arrives   in the signal handler, which then raises SystemExit or
+                                                          KeyboardInterrupt as before, so stop_program() follows
+    an exception is not caught                            sys.excepthook, threading.excepthook (Python 3.8+)
+    the interpreter exits                                 atexit
+
+The pins are written over a pigpio connection of its own: a signal handler runs between two bytecodes of the main
+thread, which may be in the middle of a call on the connection of the control loop, holding its lock. pigpio's
+write also ends PWM on the pin (the degraded link speed limit). Only the enable pins are written, the direction pins
+and the servos are left to stop_program().
+
+The time from the trigger to the last pin written is kept for every stop. See
+Benchmark scripts/emergency_stop_benchmark.py."""
+
+import atexit
+import signal
+import sys
+import threading
+
+from latency_stats import monotonic
+
+# -------------------- Variables -----------------------------
+SIGNALS = (signal.SIGTERM, signal.SIGINT)  # Signals that stop the motors before ending the program
+SIGNAL_NAMES = {signal.SIGTERM: 'SIGTERM', signal.SIGINT: 'SIGINT'}
+# ------------------- END Variables --------------------------
+
+
+class EmergencyStop(object):
+    """Writes pins (the enable pins of the motors) low on pi, a pigpio connection only used for this"""
+
+    def __init__(self, pi, pins):
+        self.pi = pi
+        self.pins = tuple(pins)
+        self.stops = []  # (reason, seconds from the trigger until the pins were written)
+        self.failures = 0  # Pin writes that raised, the other pins are still written
+        self.previous_handlers = {}
+        self.previous_excepthook = None
+        self.previous_thread_excepthook = None
+
+    def trigger(self, reason, started=None):
+        """Writes the pins low now, returns the seconds it took since started (default now)"""
+        started = monotonic() if started is None else started
+        for gpio in self.pins:
+            try:
+                self.pi.write(gpio, 0)
+            except Exception:  # The daemon is gone, try the next pin anyway
+                self.failures += 1
+        elapsed = monotonic() - started
+        self.stops.append((reason, elapsed))
+        return elapsed
+
+    def install(self, signals=SIGNALS):
+        """Triggers on signals, uncaught exceptions and exit. Has to be called from the main thread"""
+        for signal_number in signals:
+            self.previous_handlers[signal_number] = signal.signal(signal_number, self._on_signal)
+        self.previous_excepthook = sys.excepthook
+        sys.excepthook = self._on_exception
+        if hasattr(threading, 'excepthook'):  # Python 3.8+
+            self.previous_thread_excepthook = threading.excepthook
+            threading.excepthook = self._on_thread_exception
+        atexit.register(self.trigger, 'exit')
+        return self
+
+    def _on_signal(self, signal_number, frame):
+        started = monotonic()
+        self.trigger(SIGNAL_NAMES.get(signal_number, 'signal %d' % signal_number), started)
+        previous = self.previous_handlers.get(signal_number)
+        if callable(previous):  # signal.default_int_handler raises KeyboardInterrupt
+            previous(signal_number, frame)
+        elif previous != signal.SIG_IGN:  # Ends the program like the default action, but unwinding main()
+            raise SystemExit(128 + signal_number)
+
+    def _on_exception(self, exc_type, value, traceback):
+        self.trigger('exception')
+        self.previous_excepthook(exc_type, value, traceback)
+
+    def _on_thread_exception(self, args):
+        if args.exc_type is not SystemExit:
+            self.trigger('exception in %s' % (args.thread.name if args.thread is not None else 'a thread'))
+        self.previous_thread_excepthook(args)
+
+    def format_report(self):
+        if not self.stops:
+            return 'emergency stop: not triggered'
+        return 'emergency stop: %s, %d failed writes' % (
+            ', '.join('%s %.2f ms' % (reason, seconds * 1e3) for reason, seconds in self.stops), self.failures)
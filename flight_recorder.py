@@ -0,0 +1,127 @@
+"""Flight recorder for the control loop.
+
+Every handled message is written as a fixed size binary record into a ring file mapped into memory with mmap. The
+records are packed directly into the mapping, so recording a message creates no buffers, and since the mapping is
+shared with the file the last records survive a crash of the program. Read the file back with:
+
+    python flight_recorder.py flight_recorder.bin [--last SECONDS]
+
+which prints the records oldest first as comma separated values."""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+
+# -------------------- Variables -----------------------------
+MAGIC = b'VRFR'  # Identifies a flight recorder file
+VERSION = 2  # 2: the keycodes, publish and script stages
+HEADER = struct.Struct('<4sIIIQ')  # magic, version, record size, number of records, next sequence number
+HEADER_SIZE = 64  # Bytes reserved for the header, the records start after it
+# Stages of v10 in the order of the control loop. A message only goes through some of them: gpio_drive, servo_z and
+# servo_elevation when v10 calls pigpio itself, publish with SPLIT_PROCESSES, script with STORED_SCRIPTS
+STAGES = ('parse', 'extract', 'calculate', 'keycodes', 'gpio_drive', 'servo_z', 'servo_elevation', 'publish', 'script',
+          'total')
+# sequence number, wall clock time, message type, driving direction, alpha, gamma, gx, gy, pulse width z and
+# elevation, then the latency in seconds of each stage in STAGES
+RECORD = struct.Struct('<QdBBxx' + 'f' * (6 + len(STAGES)))
+DEFAULT_RECORDS = 65536  # 65536 records of 84 bytes = 5.5 MB, about 18 minutes at 60 messages per second
+# Message types
+ORIENTATION = 1  # json with 'do'
+KEYCODES = 2  # json with 'keycodes'
+OTHER_JSON = 3  # Any other json message
+COMMAND = 4  # quit or stop command
+INVALID = 5  # Neither json nor a command
+MESSAGE_TYPE_NAMES = {ORIENTATION: 'orientation', KEYCODES: 'keycodes', OTHER_JSON: 'json', COMMAND: 'command',
+                      INVALID: 'invalid'}
+DRIVING_DIRECTIONS = ('stop', 'forward', 'backward', 'left', 'right')
+DIRECTION_INDEX = dict((direction, index) for index, direction in enumerate(DRIVING_DIRECTIONS))
+FIELDS = ('sequence', 'time', 'message_type', 'driving_direction', 'alpha', 'gamma', 'gx', 'gy', 'pulse_width_z',
+          'pulse_width_elevation') + STAGES
+# ------------------- END Variables --------------------------
+
+
+class FlightRecorder(object):
+    """Ring buffer of control loop records in a memory mapped file. If the file exists with the same layout the
+       recording continues after its last record, otherwise it is recreated."""
+
+    def __init__(self, path, records=DEFAULT_RECORDS, latency_stats=None):
+        self.path = path
+        self.records = records
+        self.latency_stats = latency_stats  # Stage latencies of the current message are taken from here
+        size = HEADER_SIZE + records * RECORD.size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+            self.mm = mmap.mmap(fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+        magic, version, record_size, count, sequence = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size or count != records:
+            sequence = 0
+            HEADER.pack_into(self.mm, 0, MAGIC, VERSION, RECORD.size, records, sequence)
+        self.sequence = sequence
+        self.no_latency = {}
+
+    def record(self, message_type, car, pulse_width_z, pulse_width_elevation):
+        """Write one record with the state of the car (Car object) after handling a message"""
+        current = self.latency_stats.current if self.latency_stats is not None else self.no_latency
+        sequence = self.sequence
+        RECORD.pack_into(self.mm, HEADER_SIZE + (sequence % self.records) * RECORD.size,
+                         sequence, time.time(), message_type, DIRECTION_INDEX.get(car.drivingDirection, 255),
+                         car.alpha_degrees, car.gamma_degrees, car.gx, car.gy, pulse_width_z, pulse_width_elevation,
+                         current.get('parse', 0.0), current.get('extract', 0.0), current.get('calculate', 0.0),
+                         current.get('keycodes', 0.0), current.get('gpio_drive', 0.0), current.get('servo_z', 0.0),
+                         current.get('servo_elevation', 0.0), current.get('publish', 0.0),
+                         current.get('script', 0.0), current.get('total', 0.0))
+        self.sequence = sequence + 1
+        struct.pack_into('<Q', self.mm, 16, sequence + 1)  # Next sequence number in the header
+
+    def close(self):
+        self.mm.flush()
+        self.mm.close()
+
+
+def read_records(path):
+    """Returns all records in a flight recorder file as tuples (see FIELDS), oldest first"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, record_size, count, sequence = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+        raise ValueError('%s is not a flight recorder file of version %d' % (path, VERSION))
+    first = max(0, sequence - count)
+    records = []
+    for number in range(first, sequence):
+        record = RECORD.unpack_from(data, HEADER_SIZE + (number % count) * RECORD.size)
+        if record[0] == number:  # Skip slots that were not completely written
+            records.append(record)
+    return records
+
+
+def format_record(record):
+    values = list(record)
+    values[2] = MESSAGE_TYPE_NAMES.get(values[2], str(values[2]))
+    values[3] = DRIVING_DIRECTIONS[values[3]] if values[3] < len(DRIVING_DIRECTIONS) else '?'
+    values[1] = '%.6f' % values[1]
+    return ','.join(str(value) if i < 4 else '%.6g' % value for i, value in enumerate(values))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Print the records of a flight recorder file as CSV')
+    parser.add_argument('path', help='flight recorder file')
+    parser.add_argument('--last', type=float, default=None, help='only print the last SECONDS of the recording')
+    args = parser.parse_args(argv)
+    records = read_records(args.path)
+    if args.last is not None and records:
+        records = [record for record in records if record[1] >= records[-1][1] - args.last]
+    sys.stdout.write(','.join(FIELDS) + '\n')
+    for record in records:
+        sys.stdout.write(format_record(record) + '\n')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Camera gimbal with any number of servo axes, all computed in one pass over precomputed parameters per sample.
+
+Car.calculate_new_pulse_widths works out how far the head has turned from forward: pan (alpha - camera forward),
+tilt (90 - gamma) and roll (beta), in degrees. Without a gimbal it has a code path per servo, with its own constants
+in car_model.py. A Gimbal is declared as a list of GimbalAxis instead, each with:
+
+    source      the head angle it follows, one of SOURCES
+    gpio        the output pin of its servo
+    forward     pulse width (microseconds) pointing the camera forward
+    factor      microseconds per degree, negative to turn the other way
+    minimum     pulse width limits of the servo
+    maximum
+    digits      decimal digits the pulse width is rounded to, as for round()
+    smoothing   weight of a new sample in an exponential filter, 1.0 for no filtering
+
+and aim() maps the head angles to the pulse widths of all axes, so one more axis (a roll servo, a second camera on its
+own pan servo) is one more entry in the list instead of another code path. The parameters of the axes are packed into
+tuples once, and aim() walks them in a plain Python loop: NumPy arrays would cost ~25 us per sample in call overhead
+for a handful of axes, over ten times the scalar Car. v10_axes() declares the two servos of v10; with them, and
+without smoothing, aim() gives exactly the pulse widths of the scalar Car. See Benchmark scripts/gimbal_benchmark.py."""
+
+from car_model import MAX_PW_ELEVATION, MIN_PW_ELEVATION, FORWARD_PW_ELEVATION, DEG2PW_FACTOR_ELEVATION, \
+    MAX_PW_Z, MIN_PW_Z, FORWARD_PW_Z, DEG2PW_FACTOR_Z
+
+# -------------------- Variables -----------------------------
+SOURCES = ('pan', 'tilt', 'roll')  # Head angles (degrees from forward) an axis can follow
+# ------------------- END Variables --------------------------
+
+
+class GimbalAxis(object):
+    """One servo of a gimbal, see the module documentation for the fields"""
+
+    def __init__(self, name, source, gpio, forward, factor, minimum, maximum, digits=0, smoothing=1.0):
+        if source not in SOURCES:
+            raise ValueError('%s: source must be one of %s, not %r' % (name, ', '.join(SOURCES), source))
+        if not minimum <= forward <= maximum:
+            raise ValueError('%s: forward %r is outside %r-%r' % (name, forward, minimum, maximum))
+        if not 0.0 < smoothing <= 1.0:
+            raise ValueError('%s: smoothing must be in (0, 1], not %r' % (name, smoothing))
+        self.name = name
+        self.source = source
+        self.gpio = gpio
+        self.forward = forward
+        self.factor = factor
+        self.minimum = minimum
+        self.maximum = maximum
+        self.digits = digits
+        self.smoothing = smoothing
+
+
+def v10_axes(gpio_z, gpio_elevation, digits_z=-1, digits_elevation=0):
+    """The z-axis (pan) and elevation (tilt) servos of v10, with the limits and rounding of car_model.py"""
+    return [GimbalAxis('z', 'pan', gpio_z, FORWARD_PW_Z, DEG2PW_FACTOR_Z, MIN_PW_Z, MAX_PW_Z, digits_z),
+            GimbalAxis('elevation', 'tilt', gpio_elevation, FORWARD_PW_ELEVATION, DEG2PW_FACTOR_ELEVATION,
+                       MIN_PW_ELEVATION, MAX_PW_ELEVATION, digits_elevation)]
+
+
+def axis_parameters(axis, digits):
+    """The fields of an axis as read by Gimbal.aim for every sample"""
+    return (SOURCES.index(axis.source), float(axis.forward), float(axis.factor), float(axis.minimum),
+            float(axis.maximum), int(digits), float(axis.smoothing))
+
+
+class Gimbal(object):
+    """The axes of a gimbal, with their parameters packed into one tuple per axis"""
+
+    def __init__(self, axes):
+        names = [axis.name for axis in axes]
+        gpios = [axis.gpio for axis in axes]
+        if len(set(names)) != len(names) or len(set(gpios)) != len(gpios):
+            raise ValueError('every gimbal axis needs its own name and gpio: %r, %r' % (names, gpios))
+        self.axes = list(axes)
+        self.names = names
+        self.gpios = gpios
+        self.parameters = [axis_parameters(axis, axis.digits) for axis in axes]
+        self.smoothed = any(axis.smoothing != 1.0 for axis in axes)
+        self.filtered = None  # Filter state, the unrounded pulse widths of the previous sample
+        self.pulse_widths = [float(axis.forward) for axis in axes]
+        self.sent = [None] * len(axes)  # Pulse widths last returned by changes(), None for unknown
+
+    def set_digits(self, name, digits):
+        """Changes the rounding of an axis, e.g. for a servo on hardware PWM (servo_output.py)"""
+        index = self.names.index(name)
+        self.parameters[index] = axis_parameters(self.axes[index], digits)
+
+    def reset(self):
+        """Forgets the filter state, the next sample is followed at once"""
+        self.filtered = None
+
+    def forget_sent(self):
+        """The servos were set by someone else, changes() returns every axis again"""
+        self.sent = [None] * len(self.axes)
+
+    def aim(self, pan, tilt, roll=0.0):
+        """Returns the pulse widths of all axes (list) for the head angles of one sample, also kept in
+           pulse_widths"""
+        angles = (pan, tilt, roll)
+        previous = self.filtered if self.smoothed else None
+        targets = []
+        pulse_widths = []
+        for index, (source, forward, factor, minimum, maximum, digits, smoothing) in enumerate(self.parameters):
+            target = forward - angles[source] * factor
+            if previous is not None:
+                target = previous[index] + smoothing * (target - previous[index])
+            targets.append(target)
+            if target < minimum:
+                pulse_widths.append(minimum)
+            elif target > maximum:
+                pulse_widths.append(maximum)
+            else:
+                pulse_widths.append(round(target, digits))
+        self.filtered = targets
+        self.pulse_widths = pulse_widths
+        return pulse_widths
+
+    def changes(self, first=0):
+        """Returns (gpio, pulse width) of the axes from index first on whose pulse width differs from the one last
+           returned, and takes them as sent"""
+        changed = []
+        for index in range(first, len(self.pulse_widths)):
+            pulse_width = self.pulse_widths[index]
+            if pulse_width != self.sent[index]:
+                self.sent[index] = pulse_width
+                changed.append((self.gpios[index], pulse_width))
+        return changed
@@ -0,0 +1,110 @@
+"""Motor pin writes straight to the GPIO registers through /dev/gpiomem, without the pigpio daemon.
+
+Every pi.write is a round trip over the socket to pigpiod, tens of microseconds. GpioMem maps the GPIO register block
+of the BCM2835/2836/2837/2711 (Raspberry Pi 1-4, not the RP1 of the Pi 5) and a write is a single store to GPSET0
+(high) or GPCLR0 (low). /dev/gpiomem only exposes the GPIO block and needs the gpio group, not root.
+
+GpioMemPi wraps a pigpio.pi: write and read of the given pins use the registers, everything else (servos, PWM,
+waveforms, scripts) goes to pigpio. A pin given to set_PWM_dutycycle stays with pigpio until it is written again,
+since only a pigpio write ends the PWM. set_bank_1 and clear_bank_1 (pin_map.BankDriver) are single stores too, as
+long as they only have the given pins and none of them is on PWM.
+
+Any file of BLOCK_SIZE bytes can be mapped in place of the device, then the register words can be read back to check
+what would have been written; see Benchmark scripts/gpiomem_benchmark.py."""
+
+import mmap
+import os
+import struct
+
+# -------------------- Variables -----------------------------
+DEVICE = '/dev/gpiomem'
+BLOCK_SIZE = 4096  # Size of the GPIO register block
+GPFSEL0 = 0x00  # Function select registers, 3 bits per gpio, 10 gpios per register
+GPSET0 = 0x1c  # Writing 1 bits sets gpios 0-31 high
+GPCLR0 = 0x28  # Writing 1 bits sets gpios 0-31 low
+GPLEV0 = 0x34  # Levels of gpios 0-31
+FUNCTION_OUTPUT = 1
+REGISTER = struct.Struct('<I')
+# ------------------- END Variables --------------------------
+
+
+class GpioMem(object):
+    """The mapped GPIO registers. Only gpios 0-31 (bank 0), which has all gpios of the 40 pin header."""
+
+    def __init__(self, path=DEVICE):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | getattr(os, 'O_SYNC', 0))
+        try:
+            self.memory = mmap.mmap(fd, BLOCK_SIZE, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)  # The mapping stays valid
+
+    def register(self, offset):
+        return REGISTER.unpack_from(self.memory, offset)[0]
+
+    def set_register(self, offset, value):
+        REGISTER.pack_into(self.memory, offset, value)
+
+    def set_output(self, gpio):
+        """Selects the output function for a gpio"""
+        offset = GPFSEL0 + 4 * (gpio // 10)
+        shift = 3 * (gpio % 10)
+        self.set_register(offset, (self.register(offset) & ~(7 << shift)) | (FUNCTION_OUTPUT << shift))
+
+    def write(self, gpio, level):
+        self.set_register(GPSET0 if level else GPCLR0, 1 << gpio)
+
+    def set_clear(self, set_mask, clear_mask):
+        """Sets the gpios of set_mask high and those of clear_mask low, as two single register stores"""
+        if clear_mask:
+            self.set_register(GPCLR0, clear_mask)
+        if set_mask:
+            self.set_register(GPSET0, set_mask)
+
+    def read(self, gpio):
+        return (self.register(GPLEV0) >> gpio) & 1
+
+    def close(self):
+        self.memory.close()
+
+
+class GpioMemPi(object):
+    """A pigpio.pi whose write and read of pins go through a GpioMem"""
+
+    def __init__(self, pi, memory, pins):
+        self.pi = pi
+        self.memory = memory
+        self.pins = set(pins)
+        self.mask = sum(1 << gpio for gpio in self.pins)  # Bank operations within it use the registers
+        self.pwm_pins = set()  # Pins on pigpio PWM, written through pigpio until the PWM has ended
+        for gpio in self.pins:
+            memory.set_output(gpio)
+
+    def __getattr__(self, name):
+        return getattr(self.pi, name)
+
+    def write(self, gpio, level):
+        if gpio in self.pins and gpio not in self.pwm_pins:
+            return self.memory.write(gpio, level)
+        self.pwm_pins.discard(gpio)
+        return self.pi.write(gpio, level)
+
+    def read(self, gpio):
+        if gpio in self.pins:
+            return self.memory.read(gpio)
+        return self.pi.read(gpio)
+
+    def set_bank_1(self, bits):
+        if bits & ~self.mask or self.pwm_pins:
+            return self.pi.set_bank_1(bits)
+        return self.memory.set_register(GPSET0, bits)
+
+    def clear_bank_1(self, bits):
+        if bits & ~self.mask or self.pwm_pins:
+            return self.pi.clear_bank_1(bits)
+        return self.memory.set_register(GPCLR0, bits)
+
+    def set_PWM_dutycycle(self, user_gpio, dutycycle):
+        if user_gpio in self.pins:
+            self.pwm_pins.add(user_gpio)
+        return self.pi.set_PWM_dutycycle(user_gpio, dutycycle)
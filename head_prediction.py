@@ -0,0 +1,219 @@
+"""Predicts where the head will be by the time the servos get there.
+
+The camera follows the phone with the network delay plus the time the servos need to move, which makes the VR view
+lag behind the head. HeadPredictor estimates the angular velocity of the pan angle (around the z-axis, relative to
+forward) and the tilt angle (elevation) with a constant velocity Kalman filter per axis and aims the camera at
+angle + velocity * lookahead. The lookahead is either fixed or, in v10, the measured age of the samples plus
+SERVO_LAG. A simpler finite difference predictor is kept for comparison.
+
+Run the module to evaluate the prediction offline, on a flight recorder file (flight_recorder.py) or on a synthetic
+head movement. The tracking error is the difference between the commanded angle and the angle of the head lookahead
+seconds later, with and without prediction:
+
+    python head_prediction.py [flight_recorder.bin] [--lookahead SECONDS ...]"""
+
+import argparse
+import math
+
+from latency_stats import monotonic
+
+# -------------------- Variables -----------------------------
+LOOKAHEAD = 0.1  # Default time (seconds) the camera is aimed ahead of the latest sample
+SERVO_LAG = 0.06  # Mechanical delay of the servos (seconds), added to the measured sample age in automatic mode
+MAX_LOOKAHEAD = 0.25  # Longer predictions overshoot more than they help
+PROCESS_NOISE = 5000.0  # Angular acceleration noise of the head (deg^2/s^3), higher follows changes faster
+MEASUREMENT_NOISE = 0.25  # Variance of the phone angles (deg^2)
+MAX_GAP = 0.3  # Seconds without samples after which a filter starts over
+# ------------------- END Variables --------------------------
+
+
+def angle_difference(a, b):
+    """a - b in degrees, wrapped to -180..180"""
+    return (a - b + 180.0) % 360.0 - 180.0
+
+
+class KalmanAxis(object):
+    """Constant velocity Kalman filter for one angle. State: angle (deg) and angular velocity (deg/s)."""
+
+    def __init__(self, wrap=False, process_noise=PROCESS_NOISE, measurement_noise=MEASUREMENT_NOISE):
+        self.wrap = wrap  # Angles wrap around at 360 degrees
+        self.q = process_noise
+        self.r = measurement_noise
+        self.reset()
+
+    def reset(self):
+        self.time = None
+        self.angle = 0.0
+        self.velocity = 0.0
+        self.p00 = self.p01 = self.p11 = 0.0  # Covariance of the state
+
+    def update(self, t, angle):
+        """Add a measured angle (deg) at time t (seconds)"""
+        if self.time is None or t - self.time > MAX_GAP or t < self.time:
+            self.time = t
+            self.angle = angle
+            self.velocity = 0.0
+            self.p00 = self.r
+            self.p01 = 0.0
+            self.p11 = 1e4  # Velocity unknown
+            return
+        dt = t - self.time
+        self.time = t
+        if dt > 0:  # Predict the state to time t
+            self.angle += self.velocity * dt
+            q = self.q
+            self.p00 += dt * (2 * self.p01 + dt * self.p11) + q * dt * dt * dt / 3
+            self.p01 += dt * self.p11 + q * dt * dt / 2
+            self.p11 += q * dt
+        innovation = angle_difference(angle, self.angle) if self.wrap else angle - self.angle
+        s = self.p00 + self.r
+        k0 = self.p00 / s
+        k1 = self.p01 / s
+        self.angle += k0 * innovation
+        if self.wrap:
+            self.angle = angle_difference(self.angle, 0.0)
+        self.velocity += k1 * innovation
+        self.p11 -= k1 * self.p01
+        self.p01 -= k0 * self.p01
+        self.p00 -= k0 * self.p00
+
+    def predict(self, lookahead):
+        """Angle expected lookahead seconds after the latest sample"""
+        angle = self.angle + self.velocity * lookahead
+        return angle_difference(angle, 0.0) if self.wrap else angle
+
+
+class DifferenceAxis(object):
+    """Constant velocity from the last two samples, no filtering"""
+
+    def __init__(self, wrap=False):
+        self.wrap = wrap
+        self.reset()
+
+    def reset(self):
+        self.time = None
+        self.angle = 0.0
+        self.velocity = 0.0
+
+    def update(self, t, angle):
+        if self.time is not None and 0 < t - self.time <= MAX_GAP:
+            change = angle_difference(angle, self.angle) if self.wrap else angle - self.angle
+            self.velocity = change / (t - self.time)
+        else:
+            self.velocity = 0.0
+        self.time = t
+        self.angle = angle
+
+    def predict(self, lookahead):
+        angle = self.angle + self.velocity * lookahead
+        return angle_difference(angle, 0.0) if self.wrap else angle
+
+
+class HeadPredictor(object):
+    """Predicts the pan and tilt angles (degrees) of the camera, used by Car.calculate_new_pulse_widths"""
+
+    def __init__(self, lookahead=LOOKAHEAD, kind='kalman'):
+        axis = KalmanAxis if kind == 'kalman' else DifferenceAxis
+        self.pan = axis(wrap=True)
+        self.tilt = axis()
+        self.lookahead = 0.0
+        self.set_lookahead(lookahead)
+
+    def set_lookahead(self, seconds):
+        self.lookahead = max(0.0, min(MAX_LOOKAHEAD, seconds))
+
+    def reset(self):
+        """Forget the movement so far, after a recalibration or a new connection"""
+        self.pan.reset()
+        self.tilt.reset()
+
+    def predict(self, t, pan, tilt):
+        """Add the angles of a sample taken at time t (seconds, None for now) and return the predicted
+           (pan, tilt)"""
+        if t is None:
+            t = monotonic()
+        self.pan.update(t, pan)
+        self.tilt.update(t, tilt)
+        return self.pan.predict(self.lookahead), self.tilt.predict(self.lookahead)
+
+
+# ------------------------ Offline evaluation ------------------------
+
+
+def recorded_session(path):
+    """Times (s), pan and tilt angles (deg) of the orientation messages in a flight recorder file"""
+    import flight_recorder
+    times, pan, tilt = [], [], []
+    for record in flight_recorder.read_records(path):
+        if record[2] == flight_recorder.ORIENTATION:
+            times.append(record[1])
+            pan.append(record[4])  # alpha after Car.calculate_new_pulse_widths, forward only adds an offset
+            tilt.append(90.0 - record[5])
+    return times, pan, tilt
+
+
+def synthetic_session(seconds=120.0, rate=60.0, seed=1):
+    """A head looking around: a sum of slow sines for pan and tilt, phone event timing jitter and sensor noise"""
+    import numpy as np
+    rng = np.random.RandomState(seed)
+    times = np.cumsum(rng.uniform(0.5, 1.5, int(seconds * rate)) / rate)
+    pan = np.zeros(len(times))
+    tilt = np.zeros(len(times))
+    for frequency, amplitude in ((0.11, 35.0), (0.37, 20.0), (0.9, 8.0), (1.7, 3.0)):
+        pan += amplitude * np.sin(2 * math.pi * frequency * times + rng.uniform(0, 2 * math.pi))
+        tilt += amplitude / 2.5 * np.sin(2 * math.pi * frequency * 1.3 * times + rng.uniform(0, 2 * math.pi))
+    pan = (pan + rng.normal(0, 0.3, len(times)) + 180.0) % 360.0
+    tilt += rng.normal(0, 0.3, len(times))
+    return list(times), list(pan), list(tilt)
+
+
+def evaluate(times, pan, tilt, lookahead, kind='kalman'):
+    """Replays a session through a HeadPredictor. Returns the RMS tracking error in degrees (without prediction,
+       with prediction) over both axes, against the head angle lookahead seconds after each sample."""
+    import numpy as np
+    times = np.asarray(times, dtype=np.float64)
+    pan_unwrapped = np.degrees(np.unwrap(np.radians(pan)))
+    tilt = np.asarray(tilt, dtype=np.float64)
+    predictor = HeadPredictor(lookahead, kind)
+    predictor.lookahead = lookahead  # Not limited to MAX_LOOKAHEAD here, to show why the limit is there
+    predicted_pan = np.empty(len(times))
+    predicted_tilt = np.empty(len(times))
+    for i in range(len(times)):
+        predicted_pan[i], predicted_tilt[i] = predictor.predict(times[i], pan_unwrapped[i], tilt[i])
+    valid = times + lookahead <= times[-1]
+    future_pan = np.interp(times + lookahead, times, pan_unwrapped)
+    future_tilt = np.interp(times + lookahead, times, tilt)
+    unpredicted = np.concatenate([(pan_unwrapped - future_pan)[valid], (tilt - future_tilt)[valid]])
+    # The unwrapped pan can pass 180, the predictor works wrapped, so compare wrapped differences
+    predicted = np.concatenate([((predicted_pan - future_pan + 180.0) % 360.0 - 180.0)[valid],
+                                (predicted_tilt - future_tilt)[valid]])
+    return math.sqrt(np.mean(unpredicted ** 2)), math.sqrt(np.mean(predicted ** 2))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Tracking error of the camera with and without head prediction')
+    parser.add_argument('path', nargs='?', help='flight recorder file, a synthetic session is used without it')
+    parser.add_argument('--lookahead', type=float, nargs='+', default=[0.05, 0.1, 0.15, 0.2, 0.3],
+                        help='lookahead times in seconds')
+    args = parser.parse_args(argv)
+    if args.path:
+        times, pan, tilt = recorded_session(args.path)
+        print('%s: %d orientation samples' % (args.path, len(times)))
+    else:
+        times, pan, tilt = synthetic_session()
+        print('synthetic session: %d samples' % len(times))
+    if len(times) < 10:
+        print('not enough orientation samples')
+        return
+    print('%-10s %14s %14s %14s' % ('lookahead', 'unpredicted', 'kalman', 'difference'))
+    for lookahead in args.lookahead:
+        if times[-1] - times[0] <= 2 * lookahead:
+            print('%7.0f ms    session too short' % (lookahead * 1000))
+            continue
+        unpredicted, kalman = evaluate(times, pan, tilt, lookahead, 'kalman')
+        difference = evaluate(times, pan, tilt, lookahead, 'difference')[1]
+        print('%7.0f ms %10.2f deg %10.2f deg %10.2f deg' % (lookahead * 1000, unpredicted, kalman, difference))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""Event driven keyboard/joystick input for the keyboard controlled car versions.
+
+Instead of sleeping a fixed time per loop and after every event, the input source blocks until an event arrives
+(or a timeout expires), drains every pending event at once, keeps track of which driving keys are held down and only
+calls the drive function when the resulting driving direction changes."""
+
+import select
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+try:
+    from time import monotonic
+except ImportError:  # Python 2
+    from time import time as monotonic
+
+# -------------------- Variables -----------------------------
+DRIVING_ACTIONS = ('forward', 'backward', 'left', 'right')  # Actions that drive the car while the key is held
+DEFAULT_TIMEOUT = 0.1  # Longest time in seconds a wait blocks before the loop gets a chance to check if it should stop
+# Pygame key constants mapped to actions, looked up in the pygame module as the codes of the arrow keys differ
+# between pygame 1.9 (273-276) and pygame 2 (1073741903-1073741906)
+PYGAME_KEY_NAMES = {'K_w': 'forward', 'K_s': 'backward', 'K_a': 'left', 'K_d': 'right',
+                    'K_UP': 'forward', 'K_DOWN': 'backward', 'K_LEFT': 'left', 'K_RIGHT': 'right',
+                    'K_SPACE': 'brake', 'K_ESCAPE': 'quit',
+                    'K_q': 'servo_left', 'K_r': 'servo_right', 'K_e': 'servo_forward',
+                    'K_c': 'servo_step_left', 'K_v': 'servo_step_right'}
+# Linux input key codes (evdev.ecodes KEY_W, KEY_S, ...) mapped to actions
+EVDEV_KEY_MAP = {17: 'forward', 31: 'backward', 30: 'left', 32: 'right',  # <W> <S> <A> <D>
+                 103: 'forward', 108: 'backward', 105: 'left', 106: 'right',  # Arrow keys
+                 57: 'brake', 1: 'quit',  # <SPACE> <ESC>
+                 16: 'servo_left', 19: 'servo_right', 18: 'servo_forward',  # <Q> <R> <E>
+                 46: 'servo_step_left', 47: 'servo_step_right'}  # <C> <V>
+JOYSTICK_DEADZONE = 0.5  # Axis values inside +/- this value are treated as a released direction
+# ------------------- END Variables --------------------------
+
+
+def pygame_key_map(pygame_module):
+    """The pygame key codes of PYGAME_KEY_NAMES, mapped to actions"""
+    return dict((getattr(pygame_module, name), action) for name, action in PYGAME_KEY_NAMES.items())
+# ------------------- Held key tracking ----------------------
+
+
+class HeldKeyTracker(object):
+    """Keeps track of the driving keys that are held down. The most recently pressed key that is still held decides
+       the driving direction, so releasing it falls back to the key pressed before it and releasing all keys stops."""
+
+    def __init__(self):
+        self.held = []
+
+    def press(self, action):
+        """Register a pressed driving key"""
+        if action in self.held:
+            self.held.remove(action)
+        self.held.append(action)
+
+    def release(self, action):
+        """Register a released driving key"""
+        if action in self.held:
+            self.held.remove(action)
+
+    def clear(self):
+        """Forget all held keys, used by the brake key"""
+        del self.held[:]
+
+    def get_driving_direction(self):
+        """Returns the driving direction (String) decided by the held keys"""
+        if self.held:
+            return self.held[-1]
+        return 'stop'
+
+# ----------------- End held key tracking --------------------
+# ---------------------- Event sources -----------------------
+"""An event source has a wait(timeout) method that blocks until at least one event is available or the timeout expires
+and then returns every pending event as a list of (action, pressed, timestamp) tuples. The timestamp is taken with
+monotonic() when the event was read, or earlier if the source knows when the event was generated."""
+
+
+class QueueEventSource(object):
+    """Event source fed from another thread, used for benchmarks and for injecting commands from the network"""
+
+    def __init__(self):
+        self.events = queue.Queue()
+
+    def put(self, action, pressed, timestamp=None):
+        """Add an event, thread safe"""
+        if timestamp is None:
+            timestamp = monotonic()
+        self.events.put((action, pressed, timestamp))
+
+    def wait(self, timeout):
+        try:
+            pending = [self.events.get(True, timeout)]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                pending.append(self.events.get_nowait())
+            except queue.Empty:
+                return pending
+
+
+class PygameEventSource(object):
+    """Event source reading keyboard and joystick events from pygame. Works with a hidden or dummy video driver
+       (SDL_VIDEODRIVER=dummy) as long as pygame.init() and pygame.display.set_mode() have been called."""
+
+    def __init__(self, pygame_module, key_map=None, use_joystick=True):
+        self.pygame = pygame_module
+        self.key_map = pygame_key_map(pygame_module) if key_map is None else key_map
+        self.axis_actions = {}  # Last action reported for each joystick axis, to generate release events
+        self.joystick = None
+        if use_joystick and pygame_module.joystick.get_count() > 0:
+            self.joystick = pygame_module.joystick.Joystick(0)
+            self.joystick.init()
+        self.timer_event = pygame_module.USEREVENT + 1
+        self.has_wait_timeout = True  # pygame >= 2 takes a timeout argument to event.wait
+        self.pygame.event.set_blocked(None)  # Every event type, then only the ones below are let through
+        self.pygame.event.set_allowed([pygame_module.KEYDOWN, pygame_module.KEYUP, pygame_module.QUIT,
+                                       pygame_module.JOYAXISMOTION, pygame_module.JOYHATMOTION,
+                                       pygame_module.JOYBUTTONDOWN, pygame_module.JOYBUTTONUP, self.timer_event])
+
+    def wait(self, timeout):
+        pygame = self.pygame
+        first = None
+        if self.has_wait_timeout:
+            try:
+                first = pygame.event.wait(int(timeout * 1000))
+            except TypeError:
+                self.has_wait_timeout = False
+        if not self.has_wait_timeout:
+            pygame.time.set_timer(self.timer_event, max(1, int(timeout * 1000)))  # Wakes up wait() at the timeout
+            first = pygame.event.wait()
+            pygame.time.set_timer(self.timer_event, 0)
+        now = monotonic()
+        pending = []
+        for event in [first] + pygame.event.get():
+            self.translate(event, now, pending)
+        return pending
+
+    def translate(self, event, now, pending):
+        """Translate one pygame event into zero or more (action, pressed, timestamp) tuples"""
+        pygame = self.pygame
+        if event.type == pygame.KEYDOWN or event.type == pygame.KEYUP:
+            action = self.key_map.get(event.key)
+            if action is not None:
+                pending.append((action, event.type == pygame.KEYDOWN, now))
+        elif event.type == pygame.QUIT:
+            pending.append(('quit', True, now))
+        elif event.type == pygame.JOYHATMOTION:
+            x, y = event.value
+            self.set_axis_action('hat_x', {-1: 'left', 1: 'right'}.get(x), now, pending)
+            self.set_axis_action('hat_y', {-1: 'backward', 1: 'forward'}.get(y), now, pending)
+        elif event.type == pygame.JOYAXISMOTION and event.axis < 2:
+            action = None
+            if event.value < -JOYSTICK_DEADZONE:
+                action = ('left', 'forward')[event.axis]
+            elif event.value > JOYSTICK_DEADZONE:
+                action = ('right', 'backward')[event.axis]
+            self.set_axis_action(event.axis, action, now, pending)
+        elif event.type == pygame.JOYBUTTONDOWN or event.type == pygame.JOYBUTTONUP:
+            if event.button == 0:
+                pending.append(('brake', event.type == pygame.JOYBUTTONDOWN, now))
+
+    def set_axis_action(self, axis, action, now, pending):
+        """Turn an analog axis or hat position into press/release events of the driving actions"""
+        previous = self.axis_actions.get(axis)
+        if previous == action:
+            return
+        if previous is not None:
+            pending.append((previous, False, now))
+        if action is not None:
+            pending.append((action, True, now))
+        self.axis_actions[axis] = action
+
+
+class EvdevEventSource(object):
+    """Event source reading a keyboard or joystick directly from /dev/input with python-evdev, which needs no display
+       at all. Key repeat events are ignored since the held key state already covers them."""
+
+    def __init__(self, device_path, key_map=None, grab=False):
+        import evdev
+        self.evdev = evdev
+        self.device = evdev.InputDevice(device_path)
+        self.key_map = EVDEV_KEY_MAP if key_map is None else key_map
+        if grab:
+            self.device.grab()  # Keep the key presses from also reaching the console
+
+    def wait(self, timeout):
+        readable, _, _ = select.select([self.device.fd], [], [], timeout)
+        if not readable:
+            return []
+        now = monotonic()
+        pending = []
+        ecodes = self.evdev.ecodes
+        try:
+            for event in self.device.read():
+                if event.type == ecodes.EV_KEY and event.value != 2:  # value 2 is key repeat
+                    action = self.key_map.get(event.code)
+                    if action is not None:
+                        pending.append((action, event.value == 1, now))
+        except (IOError, OSError):
+            pass  # Nothing more to read
+        return pending
+
+# -------------------- End event sources ---------------------
+# ---------------------- Keyboard input ----------------------
+
+
+class KeyboardInput(object):
+    """Connects an event source to the car. drive_callback(direction) is called as soon as the held keys give a new
+       driving direction, and action_callbacks maps other actions (servo keys etc.) to functions called on key press."""
+
+    def __init__(self, source, drive_callback, action_callbacks=None, timeout=DEFAULT_TIMEOUT):
+        self.source = source
+        self.drive_callback = drive_callback
+        self.action_callbacks = action_callbacks or {}
+        self.timeout = timeout
+        self.tracker = HeldKeyTracker()
+        self.driving_direction = 'stop'
+        self.running = True
+        self.last_event_time = None  # Timestamp of the newest event handled, used for latency measurements
+
+    def handle_events(self, events):
+        """Apply a batch of events to the held key state and call the drive function once if the direction changed"""
+        for action, pressed, timestamp in events:
+            self.last_event_time = timestamp
+            if action in DRIVING_ACTIONS:
+                if pressed:
+                    self.tracker.press(action)
+                else:
+                    self.tracker.release(action)
+            elif not pressed:
+                continue
+            elif action == 'brake':
+                self.tracker.clear()
+            elif action == 'quit':
+                self.running = False
+                self.tracker.clear()
+            elif action in self.action_callbacks:
+                self.action_callbacks[action]()
+        direction = self.tracker.get_driving_direction()
+        if direction != self.driving_direction:
+            self.driving_direction = direction
+            self.drive_callback(direction)
+
+    def poll(self, timeout=None):
+        """Wait for and handle the pending events. Returns False when the quit key has been pressed"""
+        if timeout is None:
+            timeout = self.timeout
+        events = self.source.wait(timeout)
+        if events:
+            self.handle_events(events)
+        return self.running
+
+    def run(self, stop_event=None):
+        """Handle events until the quit key is pressed or stop_event (threading.Event) is set"""
+        while self.poll():
+            if stop_event is not None and stop_event.is_set():
+                break
+
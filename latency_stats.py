@@ -0,0 +1,151 @@
+"""Per-stage latency measurements for the control loop.
+
+Every stage of the loop (recv, parse, calculate, gpio calls, ...) gets a fixed-size histogram with log-linear
+buckets (every doubling split into equal parts), so the memory use does not grow with the running time and p50/p99/max can be printed at any moment.
+When disabled, the measuring methods are replaced with a function that does nothing."""
+
+import math
+import signal
+
+try:
+    from time import monotonic
+except ImportError:  # Python 2
+    from time import time as monotonic
+
+# -------------------- Variables -----------------------------
+BUCKETS_PER_OCTAVE = 8  # Resolution of the histogram, 8 buckets per doubling gives at most 12.5 % error
+MIN_VALUE_US = 1.0  # Everything below 1 microsecond ends up in the first bucket
+OCTAVES = 24  # 1 us * 2^24 = ~16.8 s, everything above ends up in the last bucket
+# ------------------- END Variables --------------------------
+
+
+class LogHistogram(object):
+    """Histogram of durations in seconds, starting at MIN_VALUE_US. Every doubling of the duration (octave) is split
+       into BUCKETS_PER_OCTAVE buckets of equal width"""
+
+    def __init__(self):
+        self.counts = [0] * (BUCKETS_PER_OCTAVE * OCTAVES + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """Add one duration (float, seconds) to the histogram"""
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        mantissa, exponent = math.frexp(seconds * 1e6 / MIN_VALUE_US)  # value = mantissa * 2^exponent, 0.5 <= m < 1
+        index = (exponent - 1) * BUCKETS_PER_OCTAVE + int((mantissa - 0.5) * 2 * BUCKETS_PER_OCTAVE)
+        if index < 0:
+            index = 0
+        elif index >= len(self.counts):
+            index = len(self.counts) - 1
+        self.counts[index] += 1
+
+    @staticmethod
+    def bucket_upper_bound(index):
+        """Returns the largest duration (seconds) counted in the bucket with the given index"""
+        octave, step = divmod(index, BUCKETS_PER_OCTAVE)
+        return MIN_VALUE_US * 2.0 ** octave * (1.0 + float(step + 1) / BUCKETS_PER_OCTAVE) / 1e6
+
+    def percentile(self, fraction):
+        """Returns the upper bound of the bucket holding the given fraction (0.0-1.0) of the samples, never more
+           than the largest recorded value"""
+        if self.count == 0:
+            return 0.0
+        wanted = max(1, int(math.ceil(fraction * self.count)))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= wanted:
+                return min(self.bucket_upper_bound(index), self.max)
+        return self.max
+
+    def mean(self):
+        if self.count == 0:
+            return 0.0
+        return self.total / self.count
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+
+def _do_nothing(*args):
+    pass
+
+
+class LatencyStats(object):
+    """Collects the time spent in each stage of the control loop. Call start() before waiting for a message,
+       received() when it arrives, mark(stage) after each following stage and finish() when the message has been
+       fully handled. The time of a stage is the time since the previous call."""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.histograms = {}
+        self.stage_order = []  # Stages in the order they were first seen, used for printing
+        self.current = {}  # Time of each stage for the message being handled, used by the flight recorder
+        self.last = 0.0
+        self.origin = 0.0
+        if not enabled:
+            self.start = self.received = self.mark = self.finish = _do_nothing
+
+    def histogram(self, stage):
+        """Returns the histogram for a stage (String), creating it the first time"""
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = LogHistogram()
+            self.stage_order.append(stage)
+        return histogram
+
+    def start(self):
+        """Start of the wait for a new message"""
+        self.last = monotonic()
+
+    def received(self):
+        """A message has been received, records the time spent waiting in the stage 'recv'"""
+        now = monotonic()
+        self.current.clear()
+        self.current['recv'] = now - self.last
+        self.histogram('recv').record(now - self.last)
+        self.last = self.origin = now
+
+    def mark(self, stage):
+        """Records the time since the previous call in the given stage (String)"""
+        now = monotonic()
+        self.current[stage] = now - self.last
+        self.histogram(stage).record(now - self.last)
+        self.last = now
+
+    def finish(self):
+        """Records the time from received() until now in the stage 'total'"""
+        now = monotonic()
+        self.current['total'] = now - self.origin
+        self.histogram('total').record(now - self.origin)
+        self.last = now
+
+    def format_report(self):
+        """Returns a table (String) with count, mean, p50, p99 and max in microseconds for every stage"""
+        lines = ['%-16s %9s %10s %10s %10s %10s' % ('stage', 'count', 'mean us', 'p50 us', 'p99 us', 'max us')]
+        for stage in self.stage_order:
+            histogram = self.histograms[stage]
+            lines.append('%-16s %9d %10.1f %10.1f %10.1f %10.1f' % (
+                stage, histogram.count, histogram.mean() * 1e6, histogram.percentile(0.5) * 1e6,
+                histogram.percentile(0.99) * 1e6, histogram.max * 1e6))
+        return '\n'.join(lines)
+
+    def print_report(self, *args):
+        """Prints the report, can be used directly as a signal handler"""
+        if self.enabled:
+            print(self.format_report())
+
+    def install_signal_handler(self, signal_number=signal.SIGUSR1):
+        """Print the report when the signal is received (kill -USR1 <pid>). Interrupted system calls like
+           connection.recv are restarted instead of failing."""
+        if not self.enabled:
+            return
+        signal.signal(signal_number, self.print_report)
+        signal.siginterrupt(signal_number, False)
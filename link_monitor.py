@@ -0,0 +1,152 @@
+"""Link quality monitor for the data channel between the phone and the car.
+
+Without it, connection.recv blocks for as long as the WebRTC data channel is silent and the car keeps doing whatever
+it did last. With the monitor, v10 waits at most CHECK_INTERVAL for a message and then checks how long the phone has
+been silent. The car also sends a heartbeat {"ping": {"id": n}} every HEARTBEAT_INTERVAL to phone pages that
+answer {"pong": {"id": n}} (phone_data_channel.js), which gives the round trip time and the heartbeat loss and keeps
+the link alive while the phone sends nothing else.
+
+As the link gets worse, the monitor moves through the levels
+
+    GOOD
+    DEGRADED    silent for DEGRADE_AFTER, round trip time above MAX_RTT or heartbeat loss above MAX_LOSS
+    STOPPED     silent for STOP_AFTER
+    PARKED      silent for PARK_AFTER
+
+and calls the policies registered for each level (in v10: reduce the motor speed, stop the motors, park the camera)
+once when the level is reached, and their release functions when the link is better again. For the silence levels,
+the time from the moment the threshold was passed until the policy has run is measured; it is bounded by
+CHECK_INTERVAL plus the time to handle one message."""
+
+import json
+
+from latency_stats import LogHistogram, monotonic
+
+# -------------------- Variables -----------------------------
+CHECK_INTERVAL = 0.05  # Longest wait for a message before the link is checked (seconds)
+HEARTBEAT_INTERVAL = 0.25  # Seconds between two heartbeats
+PING_TIMEOUT = 1.0  # A heartbeat without answer after this time is counted as lost
+LOSS_WINDOW = 20  # Number of latest heartbeats the loss is computed from
+DEGRADE_AFTER = 0.3  # Seconds of silence before the link counts as degraded
+STOP_AFTER = 0.6  # Seconds of silence before the motors are stopped
+PARK_AFTER = 2.0  # Seconds of silence before the camera is parked
+MAX_RTT = 0.3  # Round trip time (seconds) above which the link counts as degraded
+MAX_LOSS = 0.2  # Part of the heartbeats lost above which the link counts as degraded
+GOOD, DEGRADED, STOPPED, PARKED = range(4)
+LEVEL_NAMES = ('good', 'degraded', 'stopped', 'parked')
+SILENCE_LIMITS = ((PARKED, PARK_AFTER), (STOPPED, STOP_AFTER), (DEGRADED, DEGRADE_AFTER))
+# ------------------- END Variables --------------------------
+
+
+class LinkMonitor(object):
+    """Keeps track of the link of the current connection and runs the policies when its level changes"""
+
+    def __init__(self, log=None):
+        self.log = log  # log(kind, **fields) of a ControlLog (control_log.py) for the level changes, None prints them
+        self.policies = []  # (level, engage function, release function or None)
+        self.reaction_times = dict((level, LogHistogram()) for level in (DEGRADED, STOPPED, PARKED))
+        self.level_changes = dict((level, 0) for level in range(len(LEVEL_NAMES)))
+        self.level = GOOD
+        self.reset()
+
+    def add_policy(self, level, engage, release=None):
+        """engage() is called when the link reaches level or worse, release() when it is better again"""
+        self.policies.append((level, engage, release))
+
+    def reset(self, now=None):
+        """Start over for a new connection, releasing the policies still engaged"""
+        if now is None:
+            now = monotonic()
+        if self.level != GOOD:
+            self.change_level(GOOD, now, None)
+        self.last_heard = now
+        self.heartbeat = False  # Set when the phone page has answered a heartbeat
+        self.next_id = 0
+        self.last_ping = now
+        self.pending = {}  # id -> send time of the heartbeats not answered yet
+        self.answered = []  # True/False for the latest LOSS_WINDOW heartbeats that were answered or timed out
+        self.rtt = None  # Round trip time of the latest answer (seconds)
+        self.lost = 0
+
+    def heard(self, now):
+        """Any message was received from the phone"""
+        self.last_heard = now
+
+    def heartbeat_due(self, now):
+        return now - self.last_ping >= HEARTBEAT_INTERVAL
+
+    def ping(self, now):
+        """Returns the heartbeat message (bytes) to send now"""
+        self.last_ping = now
+        self.next_id += 1
+        self.pending[self.next_id] = now
+        return json.dumps({'ping': {'id': self.next_id}}).encode('utf-8')
+
+    def pong(self, answer, now):
+        """Handle the answer (dict with the id) to a heartbeat"""
+        sent = self.pending.pop(answer.get('id'), None)
+        self.heartbeat = True
+        if sent is not None:
+            self.rtt = now - sent
+            self.add_answered(True)
+
+    def add_answered(self, answered):
+        self.answered.append(answered)
+        if len(self.answered) > LOSS_WINDOW:
+            self.answered.pop(0)
+
+    def loss(self):
+        """Part of the latest heartbeats that got no answer"""
+        if not self.answered:
+            return 0.0
+        return self.answered.count(False) / float(len(self.answered))
+
+    def check(self, now):
+        """Updates the level, runs the policies of a changed level and returns the level"""
+        for sent_id, sent in list(self.pending.items()):
+            if now - sent > PING_TIMEOUT:
+                del self.pending[sent_id]
+                self.lost += 1
+                self.add_answered(False)
+        silence = now - self.last_heard
+        level = GOOD
+        passed = None  # Time the silence limit of the level was passed
+        for silence_level, limit in SILENCE_LIMITS:
+            if silence >= limit:
+                level = silence_level
+                passed = self.last_heard + limit
+                break
+        if level == GOOD and ((self.rtt is not None and self.rtt > MAX_RTT) or self.loss() > MAX_LOSS):
+            level = DEGRADED
+        if level != self.level:
+            self.change_level(level, now, passed)
+        return level
+
+    def change_level(self, level, now, passed):
+        old_level = self.level
+        self.level = level
+        self.level_changes[level] += 1
+        if level > old_level:
+            for policy_level, engage, release in self.policies:
+                if old_level < policy_level <= level:
+                    engage()
+            if passed is not None:
+                self.reaction_times[level].record(max(monotonic() - passed, 0.0))
+        else:
+            for policy_level, engage, release in reversed(self.policies):
+                if level < policy_level <= old_level and release is not None:
+                    release()
+        if self.log is not None:
+            self.log('link', level=LEVEL_NAMES[level])
+        else:
+            print('Link %s' % LEVEL_NAMES[level])
+
+    def format_report(self):
+        lines = ['link: rtt %s ms, %d heartbeats lost, loss %.0f %%' % (
+            '%.1f' % (self.rtt * 1000) if self.rtt is not None else '?', self.lost, self.loss() * 100)]
+        for level, limit in reversed(SILENCE_LIMITS):
+            histogram = self.reaction_times[level]
+            lines.append('    %-9s %4d times, after %.0f ms silence + reaction max %.1f ms (bound %.0f ms)' % (
+                LEVEL_NAMES[level], self.level_changes[level], limit * 1000, histogram.max * 1000,
+                CHECK_INTERVAL * 1000))
+        return '\n'.join(lines)
@@ -0,0 +1,153 @@
+"""Age, loss and reordering of the samples sent from the phone.
+
+The phone page puts a sequence number and its own clock (performance.now(), milliseconds) in every message. To turn
+the phone time into car time, the car regularly sends an echo request {"echo": {"t0": car time}} and the page answers
+{"echo": {"t0": ..., "t1": phone receive time, "t2": phone send time}}. As in NTP, the answer with the lowest round
+trip time among the latest ones gives the best estimate of the clock offset. With the offset, the age of every sample
+(time from the phone reading the sensor until the car handles it) can be measured."""
+
+import json
+
+from latency_stats import LogHistogram, monotonic
+
+# -------------------- Variables -----------------------------
+ECHO_INTERVAL = 1.0  # Seconds between two echo requests
+OFFSET_SAMPLES = 8  # Number of echo answers the clock offset is chosen from
+SEQUENCE_MODULO = 2 ** 32  # Sequence numbers wrap around at 32 bits
+AGE_ALARM = 0.15  # A sample older than this (seconds) when handled raises an alarm
+ALARM_INTERVAL = 5.0  # Seconds between two printed alarms
+# ------------------- END Variables --------------------------
+
+
+def car_time_ms():
+    """Car clock used in the echo messages (float, milliseconds)"""
+    return monotonic() * 1000.0
+
+
+class ClockOffsetEstimator(object):
+    """Estimates phone clock - car clock (ms) and the round trip time from echo answers"""
+
+    def __init__(self, samples=OFFSET_SAMPLES):
+        self.samples = []  # (round trip time, offset) of the latest answers
+        self.max_samples = samples
+        self.offset = None  # Phone clock - car clock in ms, None until the first answer
+        self.rtt = None  # Round trip time in ms of the answer the offset is taken from
+        self.last_rtt = None  # Round trip time in ms of the latest answer
+
+    def echo_request(self):
+        """Returns the echo request (bytes) to send to the phone"""
+        return json.dumps({'echo': {'t0': car_time_ms()}}).encode('utf-8')
+
+    def echo_answer(self, echo, t3=None):
+        """Handle an echo answer (dict with t0, t1, t2) received at car time t3 (ms)"""
+        if t3 is None:
+            t3 = car_time_ms()
+        t0 = float(echo['t0'])
+        t1 = float(echo['t1'])
+        t2 = float(echo['t2'])
+        rtt = (t3 - t0) - (t2 - t1)
+        offset = ((t1 - t0) + (t2 - t3)) / 2.0
+        self.last_rtt = rtt
+        self.samples.append((rtt, offset))
+        if len(self.samples) > self.max_samples:
+            self.samples.pop(0)
+        self.rtt, self.offset = min(self.samples)
+
+    def to_car_time(self, phone_time):
+        """Converts a phone timestamp (ms) into car time (ms), None while the offset is unknown"""
+        if self.offset is None:
+            return None
+        return phone_time - self.offset
+
+
+class SequenceTracker(object):
+    """Counts lost, reordered and duplicated messages from their sequence numbers. A message arriving after a newer
+       one is counted as reordered and no longer as lost."""
+
+    def __init__(self):
+        self.highest = None
+        self.received = 0
+        self.lost = 0
+        self.reordered = 0
+        self.duplicates = 0
+
+    def update(self, sequence):
+        """Register a received sequence number. Returns True if it is the newest message so far"""
+        self.received += 1
+        if self.highest is None:
+            self.highest = sequence
+            return True
+        difference = (sequence - self.highest) % SEQUENCE_MODULO
+        if difference == 0:
+            self.duplicates += 1
+            return False
+        if difference < SEQUENCE_MODULO // 2:  # Newer than everything seen so far
+            self.lost += difference - 1
+            self.highest = sequence
+            return True
+        self.reordered += 1
+        if self.lost > 0:
+            self.lost -= 1
+        return False
+
+
+class LinkTiming(object):
+    """Keeps the clock offset and the sequence statistics of the current connection and a histogram of the sample
+       ages. Call reset() when a new phone connects."""
+
+    def __init__(self, ages=None, age_alarm=AGE_ALARM, log=None):
+        self.ages = LogHistogram() if ages is None else ages
+        self.age_alarm = age_alarm
+        self.log = log  # log(kind, **fields) of a ControlLog (control_log.py) for the alarms, None prints them
+        self.old_samples = 0  # Samples older than age_alarm
+        self.last_alarm = 0.0
+        self.reset()
+
+    def reset(self):
+        """Forget the clock offset and sequence numbers of the previous connection"""
+        self.clock = ClockOffsetEstimator()
+        self.sequences = SequenceTracker()
+        self.last_age = None  # Age (seconds) of the latest sample
+        self.last_echo = 0.0
+
+    def echo_due(self, now):
+        """Returns True when it is time to send a new echo request"""
+        if now - self.last_echo >= ECHO_INTERVAL:
+            self.last_echo = now
+            return True
+        return False
+
+    def sample(self, sequence, phone_time, now=None):
+        """Register a sample with its sequence number and phone timestamp (ms) handled at car time now (seconds).
+           Returns True if it is the newest sample, False if it arrived late or twice."""
+        newest = self.sequences.update(sequence) if sequence is not None else True
+        if phone_time is None:
+            return newest
+        car_time = self.clock.to_car_time(phone_time)
+        if car_time is None:
+            return newest
+        if now is None:
+            now = monotonic()
+        age = now - car_time / 1000.0
+        self.last_age = age
+        self.ages.record(max(age, 0.0))
+        if age > self.age_alarm:
+            self.old_samples += 1
+            if now - self.last_alarm >= ALARM_INTERVAL:
+                self.last_alarm = now
+                if self.log is not None:
+                    self.log('sample_age', age_ms=round(age * 1000), p99_ms=round(self.ages.percentile(0.99) * 1000),
+                             old_samples=self.old_samples, lost=self.sequences.lost, rtt_ms=round(self.clock.rtt or 0))
+                else:
+                    print('Warning: sample age %.0f ms (p99 %.0f ms, %d old samples, %d lost, rtt %.0f ms)' % (
+                        age * 1000, self.ages.percentile(0.99) * 1000, self.old_samples, self.sequences.lost,
+                        self.clock.rtt or 0))
+        return newest
+
+    def format_report(self):
+        return ('sample age p50 %.1f ms p99 %.1f ms max %.1f ms, clock offset %s ms, rtt %s ms, %d received, '
+                '%d lost, %d reordered, %d duplicates' % (
+                    self.ages.percentile(0.5) * 1000, self.ages.percentile(0.99) * 1000, self.ages.max * 1000,
+                    '%.1f' % self.clock.offset if self.clock.offset is not None else '?',
+                    '%.1f' % self.clock.rtt if self.clock.rtt is not None else '?', self.sequences.received,
+                    self.sequences.lost, self.sequences.reordered, self.sequences.duplicates))
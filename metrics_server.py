@@ -0,0 +1,178 @@
+"""Counters, gauges and latency histograms of the control loop, served in the Prometheus text format.
+
+The control loop only increments plain attributes (counter.value += 1), all formatting happens in a separate
+daemon thread when the metrics are scraped, e.g:
+    curl http://127.0.0.1:9101/metrics
+    curl --unix-socket /tmp/vrcar_metrics.socket http://localhost/metrics"""
+
+import os
+import threading
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn, UnixStreamServer
+except ImportError:  # Python 3
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn, UnixStreamServer
+
+from latency_stats import LogHistogram
+
+# -------------------- Variables -----------------------------
+METRIC_PREFIX = 'vrcar_'  # Prefix of all metric names
+QUANTILES = (0.5, 0.9, 0.99)  # Quantiles exported for every histogram
+# ------------------- END Variables --------------------------
+
+
+class Counter(object):
+    """Value that only increases, incremented directly by the control loop: counter.value += 1"""
+    kind = 'counter'
+
+    def __init__(self, help_text):
+        self.help = help_text
+        self.value = 0
+
+
+class Gauge(object):
+    """Value that can go up and down, set directly by the control loop: gauge.value = x"""
+    kind = 'gauge'
+
+    def __init__(self, help_text):
+        self.help = help_text
+        self.value = 0
+
+
+class CallbackMetric(object):
+    """Gauge or counter whose value is read from a function when the metrics are scraped"""
+
+    def __init__(self, kind, help_text, function):
+        self.kind = kind
+        self.help = help_text
+        self.function = function
+
+    @property
+    def value(self):
+        return self.function()
+
+
+class Metrics(object):
+    """Registry of all metrics. Histograms can be added one by one or taken from a LatencyStats object."""
+
+    def __init__(self):
+        self.metrics = []  # (name, metric) in registration order
+        self.histograms = []  # (name, label, histogram getter, help)
+        self.lock = threading.Lock()  # Only used for registration and scraping, never by the control loop
+
+    def counter(self, name, help_text):
+        """Creates and returns a Counter, name gets METRIC_PREFIX and the suffix _total"""
+        return self.add(name + '_total', Counter(help_text))
+
+    def gauge(self, name, help_text):
+        """Creates and returns a Gauge, name gets METRIC_PREFIX"""
+        return self.add(name, Gauge(help_text))
+
+    def callback(self, name, help_text, function, kind='gauge'):
+        """Adds a metric whose value is returned by function() at scrape time, for values owned by other objects"""
+        if kind == 'counter':
+            name += '_total'
+        return self.add(name, CallbackMetric(kind, help_text, function))
+
+    def add(self, name, metric):
+        with self.lock:
+            self.metrics.append((METRIC_PREFIX + name, metric))
+        return metric
+
+    def histogram(self, name, help_text):
+        """Creates and returns a LogHistogram exported as a summary in seconds"""
+        histogram = LogHistogram()
+        with self.lock:
+            self.histograms.append((METRIC_PREFIX + name, None, lambda: [(None, histogram)], help_text))
+        return histogram
+
+    def add_latency_stats(self, name, latency_stats, help_text):
+        """Exports every stage of a LatencyStats object as one summary with the label stage"""
+        def stages():
+            return [(stage, latency_stats.histograms[stage]) for stage in list(latency_stats.stage_order)]
+        with self.lock:
+            self.histograms.append((METRIC_PREFIX + name, 'stage', stages, help_text))
+
+    def format_text(self):
+        """Returns all metrics in the Prometheus text exposition format (String)"""
+        lines = []
+        with self.lock:
+            for name, metric in self.metrics:
+                lines.append('# HELP %s %s' % (name, metric.help))
+                lines.append('# TYPE %s %s' % (name, metric.kind))
+                lines.append('%s %s' % (name, format_value(metric.value)))
+            for name, label, get_histograms, help_text in self.histograms:
+                lines.append('# HELP %s %s' % (name, help_text))
+                lines.append('# TYPE %s summary' % name)
+                for label_value, histogram in get_histograms():
+                    labels = '%s="%s",' % (label, label_value) if label else ''
+                    for quantile in QUANTILES:
+                        lines.append('%s{%squantile="%s"} %s' % (name, labels, quantile,
+                                                                 format_value(histogram.percentile(quantile))))
+                    lines.append('%s_sum%s %s' % (name, '{%s}' % labels.rstrip(',') if labels else '',
+                                                  format_value(histogram.total)))
+                    lines.append('%s_count%s %d' % (name, '{%s}' % labels.rstrip(',') if labels else '',
+                                                    histogram.count))
+        return '\n'.join(lines) + '\n'
+
+
+def format_value(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+# ------------------------- Server ---------------------------
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Answers every GET with the metrics, the Metrics object is set on the server"""
+
+    def do_GET(self):
+        body = self.server.metrics.format_text().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass  # Keep stdout free for the control loop
+
+    def address_string(self):
+        return 'local'
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        UnixStreamServer.server_bind(self)
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+
+def start_metrics_server(metrics, port=9101, unix_socket_path=None, host='127.0.0.1'):
+    """Serve the metrics from a daemon thread, either on a local TCP port or on a Unix socket if a path is given.
+       Returns the server, server.shutdown() stops it."""
+    if unix_socket_path:
+        try:
+            os.unlink(unix_socket_path)
+        except OSError:
+            if os.path.exists(unix_socket_path):
+                raise
+        server = ThreadingUnixHTTPServer(unix_socket_path, MetricsHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.metrics = metrics
+    thread = threading.Thread(target=server.serve_forever, name='metrics-server')
+    thread.daemon = True
+    thread.start()
+    return server
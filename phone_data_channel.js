@@ -0,0 +1,160 @@
+/*
+ * Sends the phone orientation and key presses to the car over the UV4L WebRTC data channel.
+ *
+ * Include this file in the UV4L WebRTC page and call
+ *     var sender = new VRCarSender(dataChannel);
+ * once the data channel is open. The sender first asks the car for the compact binary message format
+ * (binary_protocol.py); until the car accepts, and with cars that do not know it, the same json messages as the
+ * standard UV4L page are sent: {"do": {...}, "dm": {...}} and {"keycodes": [...]}.
+ *
+ * Every message carries a sequence number and the phone clock (performance.now(), ms): "seq" and "ts" in json, the
+ * sequence and timestamp fields in binary messages. Echo requests from the car are answered with the phone receive
+ * and send times, so the car can estimate the clock offset and the age of each sample (link_timing.py).
+ *
+ * The car regularly tells how many orientation messages per second it wants, {"rate": {"desired": ...}}
+ * (rate_control.py). Faster orientation events are held back and only the latest one is sent when the interval has
+ * passed. Key presses are always sent at once.
+ *
+ * Heartbeats from the car, {"ping": {"id": n}}, are answered at once with {"pong": {"id": n}}, so the car can measure
+ * the round trip time and notice a stalled link (link_monitor.py).
+ */
+
+var VRCAR_PROTOCOL_NAME = 'binary2';
+var VRCAR_TAG = 0xb1;
+var VRCAR_MESSAGE_SIZE = 22;
+var VRCAR_FLAG_ORIENTATION = 1;
+var VRCAR_FLAG_KEYCODES = 2;
+var VRCAR_KEYCODES = [103, 108, 105, 106, 28];  // Bit 0, 1, 2, ... of the keycode mask: up, down, left, right, enter
+var VRCAR_BROWSER_KEYS = {38: 103, 40: 108, 37: 105, 39: 106, 13: 28};  // Browser keyCode -> Linux keycode
+
+function vrcarClamp(value, low, high) {
+    return Math.max(low, Math.min(high, Math.round(value)));
+}
+
+function VRCarSender(dataChannel) {
+    this.channel = dataChannel;
+    this.channel.binaryType = 'arraybuffer';
+    this.binary = false;  // Set when the car has accepted binary messages
+    this.sequence = 0;
+    this.buffer = new ArrayBuffer(VRCAR_MESSAGE_SIZE);  // Reused for every binary message
+    this.view = new DataView(this.buffer);
+    this.gx = 0;
+    this.gy = 0;
+    this.minInterval = 0;  // Milliseconds between two orientation messages, from the rate the car asks for
+    this.lastOrientation = -Infinity;  // performance.now() of the last orientation message sent
+    this.pendingOrientation = null;  // Latest [alpha, beta, gamma] held back by the rate limit
+    this.timer = null;
+    var self = this;
+    var previousOnMessage = this.channel.onmessage;
+    this.channel.onmessage = function (event) {
+        var received = performance.now();
+        if (typeof event.data === 'string' && event.data.charAt(0) === '{') {
+            try {
+                var message = JSON.parse(event.data);
+                if (message.protocol === VRCAR_PROTOCOL_NAME && message.accepted) {
+                    self.binary = true;
+                    return;
+                }
+                if (message.rate && message.rate.desired > 0) {
+                    self.minInterval = 1000 / message.rate.desired;
+                    return;
+                }
+                if (message.ping) {  // Heartbeat of the car's link monitor (link_monitor.py)
+                    self.channel.send(JSON.stringify({pong: {id: message.ping.id}}));
+                    return;
+                }
+                if (message.echo && message.echo.t1 === undefined) {
+                    self.channel.send(JSON.stringify({echo: {t0: message.echo.t0, t1: received,
+                                                             t2: performance.now()}}));
+                    return;
+                }
+            } catch (e) {
+                // Not for us
+            }
+        }
+        if (previousOnMessage) {
+            previousOnMessage.call(self.channel, event);
+        }
+    };
+    this.channel.send(JSON.stringify({protocol: VRCAR_PROTOCOL_NAME}));
+    window.addEventListener('devicemotion', function (event) {
+        var g = event.accelerationIncludingGravity;
+        if (g) {
+            self.gx = g.x || 0;
+            self.gy = g.y || 0;
+        }
+    });
+    window.addEventListener('deviceorientation', function (event) {
+        self.sendOrientation(event.alpha || 0, event.beta || 0, event.gamma || 0);
+    });
+    window.addEventListener('keydown', function (event) {
+        var code = VRCAR_BROWSER_KEYS[event.keyCode];
+        if (code !== undefined) {
+            self.sendKeycodes([code]);
+        }
+    });
+}
+
+VRCarSender.prototype.sendBinary = function (flags, alpha, beta, gamma, keycodes) {
+    var view = this.view;
+    var mask = 0;
+    for (var i = 0; i < keycodes.length; i++) {
+        var bit = VRCAR_KEYCODES.indexOf(keycodes[i]);
+        if (bit >= 0) {
+            mask |= 1 << bit;
+        }
+    }
+    view.setUint8(0, VRCAR_TAG);
+    view.setUint8(1, flags);
+    view.setUint32(2, this.sequence, true);
+    view.setUint32(6, Math.floor(performance.now()) >>> 0, true);
+    view.setUint16(10, vrcarClamp(alpha * 100, 0, 36000), true);
+    view.setInt16(12, vrcarClamp(beta * 100, -18000, 18000), true);
+    view.setInt16(14, vrcarClamp(gamma * 100, -9000, 9000), true);
+    view.setInt16(16, vrcarClamp(this.gx * 1000, -32768, 32767), true);
+    view.setInt16(18, vrcarClamp(this.gy * 1000, -32768, 32767), true);
+    view.setUint16(20, mask, true);
+    this.channel.send(this.buffer);
+};
+
+VRCarSender.prototype.sendOrientation = function (alpha, beta, gamma) {
+    if (this.channel.readyState !== 'open') {
+        return;
+    }
+    var wait = this.lastOrientation + this.minInterval - performance.now();
+    if (wait > 0) {  // Faster than the car asked for, send the latest reading when the interval has passed
+        this.pendingOrientation = [alpha, beta, gamma];
+        if (this.timer === null) {
+            var self = this;
+            this.timer = setTimeout(function () {
+                var pending = self.pendingOrientation;
+                self.timer = null;
+                self.pendingOrientation = null;
+                if (pending) {
+                    self.sendOrientation(pending[0], pending[1], pending[2]);
+                }
+            }, wait);
+        }
+        return;
+    }
+    this.lastOrientation = performance.now();
+    this.sequence = (this.sequence + 1) >>> 0;
+    if (this.binary) {
+        this.sendBinary(VRCAR_FLAG_ORIENTATION, alpha, beta, gamma, []);
+    } else {
+        this.channel.send(JSON.stringify({do: {alpha: alpha, beta: beta, gamma: gamma}, dm: {gx: this.gx, gy: this.gy},
+                                          seq: this.sequence, ts: performance.now()}));
+    }
+};
+
+VRCarSender.prototype.sendKeycodes = function (keycodes) {
+    if (this.channel.readyState !== 'open') {
+        return;
+    }
+    this.sequence = (this.sequence + 1) >>> 0;
+    if (this.binary) {
+        this.sendBinary(VRCAR_FLAG_KEYCODES, 0, 0, 0, keycodes);
+    } else {
+        this.channel.send(JSON.stringify({keycodes: keycodes, seq: this.sequence, ts: performance.now()}));
+    }
+};
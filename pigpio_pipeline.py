@@ -0,0 +1,208 @@
+"""pigpio client that does not wait for the reply of every command, for running the control program on another
+computer than the Raspberry Pi.
+
+pigpio.pi('raspberrypi.local') already speaks to a remote pigpiod, but sends a command and waits for its reply
+before the next one, so a LAN round trip of a millisecond limits it to about a thousand commands per second and
+every drive function of v10 to six round trips. PipelinedPi speaks the same socket protocol: every command is 16
+bytes (command, p1, p2, length of the extension) plus the extension, every reply 16 bytes with the result in the
+last word. The daemon handles the commands of one socket in order, so the replies are matched to the commands in
+the order they were sent, by a reader thread.
+
+The commands that set something (write, set_servo_pulsewidth, ...) return a Reply at once, result() waits for it.
+Failed results of replies nobody waits for are counted in failed and kept in last_error. The commands that read
+something (read, get_PWM_dutycycle, ...) wait for their reply, like pigpio.pi. Commands are sent at once, or with
+batch=True collected until flush(), so a burst is one send. sim_pigpiod.py is a stand-in daemon to test against,
+see Benchmark scripts/pigpio_pipeline_benchmark.py."""
+
+import collections
+import socket
+import struct
+import threading
+
+from latency_stats import monotonic
+
+try:
+    from pigpio import error
+except ImportError:  # The computer running the control program does not need pigpio
+    class error(Exception):
+        """Raised for failed commands, like pigpio.error"""
+
+# -------------------- Variables -----------------------------
+PORT = 8888  # Default port of pigpiod
+COMMAND = struct.Struct('<IIII')  # command, p1, p2, p3 (length of the extension), also the reply with the result
+COMMAND_SIZE = COMMAND.size  # 16 bytes
+MODES, MODEG, READ, WRITE, PWM, PFS, SERVO = 0, 1, 3, 4, 5, 7, 8  # Command numbers of pigpiod
+BC1, BS1, HWVER, GDC, GPW, HP = 12, 14, 17, 83, 84, 86
+COMMAND_NAMES = {MODES: 'set_mode', MODEG: 'get_mode', READ: 'read', WRITE: 'write', PWM: 'set_PWM_dutycycle',
+                 PFS: 'set_PWM_frequency', SERVO: 'set_servo_pulsewidth', BC1: 'clear_bank_1', BS1: 'set_bank_1',
+                 HWVER: 'get_hardware_revision', GDC: 'get_PWM_dutycycle', GPW: 'get_servo_pulsewidth',
+                 HP: 'hardware_PWM'}
+RECEIVE_SIZE = 65536
+# ------------------- END Variables --------------------------
+
+
+class Reply(object):
+    """The pending result of one command"""
+    __slots__ = ('command', 'p1', 'p2', 'number', 'value')
+
+    def __init__(self, command, p1, p2, number):
+        self.command = command
+        self.p1 = p1
+        self.p2 = p2
+        self.number = number  # Position of the command on the connection
+        self.value = None  # Result, set by the reader thread
+
+    def describe(self):
+        return '%s(%d, %d)' % (COMMAND_NAMES.get(self.command, self.command), self.p1, self.p2)
+
+
+class PipelinedPi(object):
+    """A pigpio.pi replacement that sends commands without waiting for their replies"""
+
+    def __init__(self, host='localhost', port=PORT, batch=False):
+        self.socket = socket.create_connection((host, port))
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.batch = batch
+        self.pending = collections.deque()  # Replies not received yet, in the order the commands were sent
+        self.outgoing = bytearray()  # Commands not sent yet with batch=True
+        self.send_lock = threading.Lock()  # Keeps the order of pending and the socket the same
+        self.received = threading.Condition()
+        self.sent_count = 0
+        self.received_count = 0
+        self.failed = 0  # Failed commands
+        self.last_error = None
+        self.connected = True
+        self.reader = threading.Thread(target=self.read_replies)
+        self.reader.daemon = True
+        self.reader.start()
+
+    def command(self, command, p1=0, p2=0, extension=b''):
+        """Queues one command, sends it unless batching, and returns its Reply"""
+        with self.send_lock:
+            reply = Reply(command, p1, p2, self.sent_count)
+            self.sent_count += 1
+            self.pending.append(reply)
+            self.outgoing += COMMAND.pack(command, p1, p2, len(extension))
+            if extension:
+                self.outgoing += extension
+            if not self.batch:
+                self.socket.sendall(self.outgoing)
+                del self.outgoing[:]
+        return reply
+
+    def flush(self):
+        """Sends the commands collected with batch=True"""
+        with self.send_lock:
+            if self.outgoing:
+                self.socket.sendall(self.outgoing)
+                del self.outgoing[:]
+
+    def read_replies(self):
+        received = bytearray()
+        while True:
+            try:
+                data = self.socket.recv(RECEIVE_SIZE)
+            except socket.error:
+                data = b''
+            if not data:
+                break
+            received += data
+            count = len(received) // COMMAND_SIZE
+            with self.received:
+                for i in range(count):
+                    command, p1, p2, result = COMMAND.unpack_from(received, i * COMMAND_SIZE)
+                    reply = self.pending.popleft()
+                    if (command, p1, p2) != (reply.command, reply.p1, reply.p2):
+                        self.last_error = 'reply %d to %s does not match' % (reply.number, reply.describe())
+                        self.connected = False
+                    if result >= 0x80000000:
+                        result -= 0x100000000  # Errors are negative
+                        self.failed += 1
+                        self.last_error = '%s failed with %d' % (reply.describe(), result)
+                    reply.value = result
+                self.received_count += count
+                self.received.notify_all()
+            del received[:count * COMMAND_SIZE]
+        with self.received:
+            self.connected = False
+            self.received.notify_all()
+
+    def wait(self, number, timeout):
+        """Waits until the first number commands have been answered or timeout seconds have passed"""
+        if self.batch:
+            self.flush()
+        end = None if timeout is None else monotonic() + timeout
+        with self.received:
+            while self.received_count < number and self.connected:
+                if end is None:
+                    self.received.wait()
+                elif monotonic() < end:
+                    self.received.wait(end - monotonic())
+                else:
+                    break
+
+    def result(self, reply, timeout=None):
+        """Waits for a reply and returns its result, raises error (pigpio.error) for a failed command"""
+        self.wait(reply.number + 1, timeout)
+        if reply.value is None:
+            raise error('no reply to %s' % reply.describe())
+        if reply.value < 0:
+            raise error('%s failed with %d' % (reply.describe(), reply.value))
+        return reply.value
+
+    def sync(self, timeout=None):
+        """Waits until every command sent so far has been answered, returns the number of failed commands"""
+        self.wait(self.sent_count, timeout)
+        return self.failed
+
+    # The pigpio.pi methods used by the car programs
+    def set_mode(self, gpio, mode):
+        return self.command(MODES, gpio, mode)
+
+    def get_mode(self, gpio):
+        return self.result(self.command(MODEG, gpio))
+
+    def write(self, gpio, level):
+        return self.command(WRITE, gpio, int(bool(level)))
+
+    def read(self, gpio):
+        return self.result(self.command(READ, gpio))
+
+    def set_bank_1(self, bits):
+        return self.command(BS1, bits)
+
+    def clear_bank_1(self, bits):
+        return self.command(BC1, bits)
+
+    def set_servo_pulsewidth(self, user_gpio, pulsewidth):
+        return self.command(SERVO, user_gpio, int(pulsewidth))
+
+    def get_servo_pulsewidth(self, user_gpio):
+        return self.result(self.command(GPW, user_gpio))
+
+    def set_PWM_frequency(self, user_gpio, frequency):
+        return self.command(PFS, user_gpio, frequency)
+
+    def set_PWM_dutycycle(self, user_gpio, dutycycle):
+        return self.command(PWM, user_gpio, int(dutycycle))
+
+    def get_PWM_dutycycle(self, user_gpio):
+        return self.result(self.command(GDC, user_gpio))
+
+    def hardware_PWM(self, gpio, PWMfreq, PWMduty):
+        return self.command(HP, gpio, PWMfreq, struct.pack('<I', PWMduty))
+
+    def get_hardware_revision(self):
+        return self.result(self.command(HWVER))
+
+    def stop(self):
+        """Waits for the outstanding replies and closes the connection"""
+        if self.connected:
+            self.sync(1.0)
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self.socket.close()
+        self.reader.join(1.0)
+        self.connected = False
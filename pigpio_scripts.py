@@ -0,0 +1,78 @@
+"""All pin changes of one control loop message in a single pigpio daemon round trip, with a stored script.
+
+Every pigpio call of v10 is a request and a response over the socket to the daemon: a drive function is six of them,
+each servo update one more. The TickScript is stored in the daemon once at startup (store_script) and run with the
+new state as parameters (run_script), so a message that changes the motors and both servos costs one round trip:
+
+    p0  1 when the driving direction changes, 0 to only update the servos
+    p1  level of the left direction pin     p2  level of the right direction pin
+    p3  level of the enable pins (0 for 'stop')
+    p4  pulse width of the z-axis servo     p5  pulse width of the elevation servo
+        (duty cycles of hp, in millionths, for servos on hardware PWM, see servo_output.py)
+
+The motors are disabled before the directions change, as in the drive functions of v10. run_script returns as soon
+as the daemon has started the script, which takes some microseconds to finish; a read of the pins right after it
+can still see the old levels. See Benchmark scripts/stored_script_benchmark.py."""
+
+import time
+
+import pigpio
+
+from servo_output import SERVO_FREQUENCY, duty_cycle
+
+# -------------------- Variables -----------------------------
+SCRIPT_INITING = 0  # Script states returned by script_status, as in pigpio
+SCRIPT_FAILED = 4
+STORE_TIMEOUT = 1.0  # Seconds to wait for the daemon to have stored a script
+TICK_SCRIPT = ('lda p0 jz 1 '
+               'w {enable_l} 0 w {enable_r} 0 w {dir_l} p1 w {dir_r} p2 w {enable_l} p3 w {enable_r} p3 '
+               'tag 1 {set_servo_z} {set_servo_elevation}')
+SERVO_COMMAND = 'servo {gpio} {parameter}'
+HARDWARE_PWM_COMMAND = 'hp {gpio} %d {parameter}' % SERVO_FREQUENCY
+# ------------------- END Variables --------------------------
+
+
+def store(pi, text, timeout=STORE_TIMEOUT):
+    """Stores a script in the daemon and returns its id once it can be run"""
+    script_id = pi.store_script(text.encode('ascii'))
+    end = time.time() + timeout
+    while True:
+        status = pi.script_status(script_id)[0]
+        if status == SCRIPT_FAILED:
+            raise pigpio.error('script failed: %s' % text)
+        if status != SCRIPT_INITING:
+            return script_id
+        if time.time() > end:
+            raise pigpio.error('script not stored in %.1f s: %s' % (timeout, text))
+        time.sleep(0.001)
+
+
+class TickScript(object):
+    """The stored script setting the motor pins and both servos. pins is a dict with the gpio numbers 'enable_l',
+       'enable_r', 'dir_l', 'dir_r', 'servo_z' and 'servo_elevation', levels the direction pin levels (left, right)
+       per driving direction (PinMap.levels() of pin_map.py), hardware the servo gpios on hardware PWM."""
+
+    def __init__(self, pi, pins, levels, hardware=()):
+        self.pi = pi
+        self.levels = dict((direction, (int(left), int(right))) for direction, (left, right) in levels.items())
+        self.hardware_z = pins['servo_z'] in hardware
+        self.hardware_elevation = pins['servo_elevation'] in hardware
+        commands = dict((name, (HARDWARE_PWM_COMMAND if on_hardware else SERVO_COMMAND).format(
+            gpio=pins[role], parameter=parameter)) for name, role, parameter, on_hardware in (
+            ('set_servo_z', 'servo_z', 'p4', self.hardware_z),
+            ('set_servo_elevation', 'servo_elevation', 'p5', self.hardware_elevation)))
+        commands.update(pins)
+        self.script_id = store(pi, TICK_SCRIPT.format(**commands))
+
+    def run(self, direction, pulse_width_z, pulse_width_elevation):
+        """Sets the servos and, unless direction is None, the driving direction"""
+        z = duty_cycle(pulse_width_z) if self.hardware_z else int(pulse_width_z)
+        elevation = duty_cycle(pulse_width_elevation) if self.hardware_elevation else int(pulse_width_elevation)
+        if direction is None:
+            self.pi.run_script(self.script_id, [0, 0, 0, 0, z, elevation])
+        else:
+            left, right = self.levels[direction]
+            self.pi.run_script(self.script_id, [1, left, right, int(direction != 'stop'), z, elevation])
+
+    def close(self):
+        self.pi.delete_script(self.script_id)
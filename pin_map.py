@@ -0,0 +1,115 @@
+"""Pin maps of the cars, validated when they are made and compiled into set/clear masks of the gpio bank.
+
+v1-v6 number the pins of the 40 pin header (BOARD: 7, 11, 13, 15 for the motors, 16 or 12 for the servo), v7-v10
+number the gpios (BCM: 4, 17, 27, 22 for the motors, 18 and 19 for the servos). A PinMap declares the pins of one
+car in either numbering, with the level of the direction pins for driving forward, and converts them to gpios.
+
+Every driving direction is compiled into bank operations on gpios 0-31 (pigpio clear_bank_1 / set_bank_1, GPCLR0 /
+GPSET0 with gpiomem.py):
+
+    clear  the enable pins, the motors are off before any direction changes
+    clear  the direction pins that go low (not for backward)
+    set    the direction pins that go high (only backward, left and right)
+    set    the enable pins (not for stop)
+
+so stop is two operations, forward and backward three and left and right four, instead of four to six writes. A
+direction pin never changes in the same operation that disables or enables the motors."""
+
+# -------------------- Variables -----------------------------
+BOARD_TO_BCM = {3: 2, 5: 3, 7: 4, 8: 14, 10: 15, 11: 17, 12: 18, 13: 27, 15: 22, 16: 23, 18: 24, 19: 10, 21: 9,
+                22: 25, 23: 11, 24: 8, 26: 7, 29: 5, 31: 6, 32: 12, 33: 13, 35: 19, 36: 16, 37: 26, 38: 20, 40: 21}
+USABLE_GPIOS = range(2, 28)  # gpios of the header, 0 and 1 are kept for the HAT EEPROM
+DIRECTIONS = ('stop', 'forward', 'backward', 'left', 'right')
+CLEAR, SET = 'clear', 'set'
+# ------------------- END Variables --------------------------
+
+
+class PinMap(object):
+    """The pins of one car. numbering is 'BCM' or 'BOARD', forward the level (bool) of the direction pins for
+       driving forward. Raises ValueError for unknown, unusable or shared pins."""
+
+    def __init__(self, numbering, enable_l, enable_r, dir_l, dir_r, servo_z=None, servo_elevation=None,
+                 forward=False, name='car'):
+        if numbering not in ('BCM', 'BOARD'):
+            raise ValueError('%s: numbering must be BCM or BOARD, not %r' % (name, numbering))
+        self.name = name
+        self.forward = bool(forward)
+        declared = (('enable_l', enable_l), ('enable_r', enable_r), ('dir_l', dir_l), ('dir_r', dir_r),
+                    ('servo_z', servo_z), ('servo_elevation', servo_elevation))
+        used = {}
+        for role, pin in declared:
+            gpio = pin
+            if pin is not None and numbering == 'BOARD':
+                if pin not in BOARD_TO_BCM:
+                    raise ValueError('%s: %s is on header pin %r, which is not a gpio' % (name, role, pin))
+                gpio = BOARD_TO_BCM[pin]
+            if gpio is not None:
+                if gpio not in USABLE_GPIOS:
+                    raise ValueError('%s: %s is on gpio %r, which is not usable' % (name, role, gpio))
+                if gpio in used:
+                    raise ValueError('%s: %s and %s are both on gpio %d' % (name, used[gpio], role, gpio))
+                used[gpio] = role
+            setattr(self, role, gpio)
+        if None in (self.enable_l, self.enable_r, self.dir_l, self.dir_r):
+            raise ValueError('%s: every motor pin is needed' % name)
+        self.enable_mask = (1 << self.enable_l) | (1 << self.enable_r)
+        self.direction_mask = (1 << self.dir_l) | (1 << self.dir_r)
+        self.operations = dict((direction, self.compile(direction)) for direction in DIRECTIONS)
+
+    def pins(self):
+        """The gpios by role, as used by actuator_process, drive_waveforms and pigpio_scripts"""
+        return dict((role, getattr(self, role)) for role in ('enable_l', 'enable_r', 'dir_l', 'dir_r', 'servo_z',
+                                                              'servo_elevation') if getattr(self, role) is not None)
+
+    def direction_levels(self, direction):
+        """Levels (left, right) of the direction pins, stop leaves them low"""
+        forward, backward = self.forward, not self.forward
+        return {'stop': (False, False), 'forward': (forward, forward), 'backward': (backward, backward),
+                'left': (backward, forward), 'right': (forward, backward)}[direction]
+
+    def levels(self):
+        """Direction pin levels (left, right) of every driving direction, for actuator_process, drive_waveforms and
+           pigpio_scripts"""
+        return dict((direction, self.direction_levels(direction)) for direction in DIRECTIONS)
+
+    def compile(self, direction):
+        """The bank operations (CLEAR or SET, mask) of a driving direction"""
+        left, right = self.direction_levels(direction)
+        high = (1 << self.dir_l if left else 0) | (1 << self.dir_r if right else 0)
+        low = self.direction_mask & ~high
+        operations = [(CLEAR, self.enable_mask)]
+        if low:
+            operations.append((CLEAR, low))
+        if high:
+            operations.append((SET, high))
+        if direction != 'stop':
+            operations.append((SET, self.enable_mask))
+        return operations
+
+
+class BankDriver(object):
+    """Drives the motors with the compiled bank operations of a PinMap"""
+
+    def __init__(self, pi, pin_map):
+        self.pi = pi
+        self.operations = pin_map.operations
+
+    def drive(self, direction):
+        pi = self.pi
+        for operation, mask in self.operations[direction]:
+            if operation == CLEAR:
+                pi.clear_bank_1(mask)
+            else:
+                pi.set_bank_1(mask)
+
+    def functions(self):
+        """Drive functions per direction, to replace the driving_direction_list of v10"""
+        return dict((direction, lambda direction=direction: self.drive(direction)) for direction in DIRECTIONS)
+
+
+CARS = {  # The cars of this repository
+    'v1': PinMap('BOARD', enable_l=7, enable_r=11, dir_l=13, dir_r=15, servo_z=16, forward=True, name='v1, v3'),
+    'v2': PinMap('BOARD', enable_l=7, enable_r=11, dir_l=13, dir_r=15, servo_z=12, forward=True, name='v2'),
+    'v6': PinMap('BOARD', enable_l=7, enable_r=11, dir_l=13, dir_r=15, servo_z=12, name='v5, v6'),
+    'v10': PinMap('BCM', enable_l=4, enable_r=17, dir_l=27, dir_r=22, servo_z=19, servo_elevation=18, name='v7-v10'),
+}
@@ -0,0 +1,85 @@
+"""Tells the phone page how many messages per second the car can use.
+
+The phone fires orientation events as fast as the browser delivers them. When the car cannot keep up, the messages
+queue up in the socket and every one of them is parsed only to be overwritten by the next. The car measures how long
+it takes to handle one message and regularly sends the phone page
+
+    {"rate": {"capacity": messages/s the car could handle, "desired": messages/s to send, "received": messages/s}}
+
+The page (phone_data_channel.js) then sends at most "desired" orientation messages per second, always the latest
+reading. Key presses are never held back. Pages that do not know the message ignore it."""
+
+import json
+
+# -------------------- Variables -----------------------------
+ADVICE_INTERVAL = 1.0  # Seconds between two rate messages
+MAX_RATE = 60.0  # Never ask for more messages per second than this, the servos can not follow faster
+MIN_RATE = 10.0  # Never ask for fewer messages per second than this
+UTILISATION = 0.5  # Part of the car's capacity that may be spent on handling messages
+SMOOTHING = 0.05  # Weight of the latest handling time in the moving average
+CHANGE_THRESHOLD = 0.1  # Relative change of the desired rate that is sent before the next interval
+# ------------------- END Variables --------------------------
+
+
+class RateAdvisor(object):
+    """Measures the handling time of the messages and decides the sample rate the phone should send"""
+
+    def __init__(self, max_rate=MAX_RATE, min_rate=MIN_RATE, utilisation=UTILISATION):
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.utilisation = utilisation
+        self.reset()
+
+    def reset(self):
+        """Forget the measurements of the previous connection"""
+        self.handling_time = None  # Moving average of the time to handle one message (seconds)
+        self.received = 0  # Messages handled since the last advice
+        self.last_advice = None  # Time of the last advice, None before the first
+        self.advised_rate = None  # Desired rate sent in the last advice
+        self.received_rate = 0.0
+
+    def handled(self, seconds):
+        """Register the time it took to handle one message, from receiving it to the servo update"""
+        self.received += 1
+        if self.handling_time is None:
+            self.handling_time = seconds
+        else:
+            self.handling_time += SMOOTHING * (seconds - self.handling_time)
+
+    def capacity(self):
+        """Messages per second the car could handle if it did nothing else, None before the first message"""
+        if self.handling_time is None:
+            return None
+        return 1.0 / max(self.handling_time, 1e-6)
+
+    def desired_rate(self):
+        capacity = self.capacity()
+        if capacity is None:
+            return self.max_rate
+        return max(self.min_rate, min(self.max_rate, capacity * self.utilisation))
+
+    def advice_due(self, now):
+        """Returns True when a rate message should be sent: every ADVICE_INTERVAL, or earlier if the desired rate
+           has changed by more than CHANGE_THRESHOLD"""
+        if self.last_advice is None:
+            self.last_advice = now  # Measure for one interval before the first advice
+            return False
+        elapsed = now - self.last_advice
+        if elapsed >= ADVICE_INTERVAL:
+            return True
+        if self.advised_rate is not None and elapsed >= ADVICE_INTERVAL / 4 and \
+                abs(self.desired_rate() - self.advised_rate) > CHANGE_THRESHOLD * self.advised_rate:
+            return True
+        return False
+
+    def advice(self, now):
+        """Returns the rate message (bytes) to send to the phone and starts a new interval"""
+        elapsed = now - self.last_advice if self.last_advice is not None else 0.0
+        if elapsed > 0:
+            self.received_rate = self.received / elapsed
+        self.received = 0
+        self.last_advice = now
+        self.advised_rate = self.desired_rate()
+        return json.dumps({'rate': {'capacity': round(self.capacity() or 0.0, 1),
+                                    'desired': round(self.advised_rate, 1),
+                                    'received': round(self.received_rate, 1)}}).encode('utf-8')
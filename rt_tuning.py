@@ -0,0 +1,176 @@
+"""Opt-in real-time tuning for the control loop.
+
+RealTimeMode.apply() is called from the thread running the loop (the actuator process with SPLIT_PROCESSES, else the
+main loop of v10) and, as far as the system allows:
+
+    pins the thread to one cpu core, away from the UV4L video encoding when that runs on the other cores
+    switches the thread to the SCHED_FIFO real-time scheduling policy (needs root or CAP_SYS_NICE)
+    locks the process memory with mlockall, so the loop never waits for a page fault (needs RLIMIT_MEMLOCK)
+    moves everything allocated so far out of the reach of the garbage collector with gc.freeze (Python 3.7+)
+
+Every step that is not supported or not permitted is skipped and reported, the program runs on either way. The
+jitter of a timed loop is measured before and after, so the effect can be seen in the printed report.
+
+GcControl disables the cyclic garbage collector while the car is driving, so a collection never delays a motor
+command. Reference counting still frees almost everything; if too many objects pile up while driving, only the
+youngest generation is collected. When the car stops, the young generations are collected; the full collection
+waits until the car has stood still for IDLE_COLLECT_AFTER, as a stop is often only a short pause between two key
+presses."""
+
+import ctypes
+import ctypes.util
+import gc
+import os
+import time
+
+from latency_stats import LogHistogram, monotonic
+
+# -------------------- Variables -----------------------------
+CPU = 3  # Core the control loop is pinned to, the last core of a Raspberry Pi 3/4
+PRIORITY = 50  # SCHED_FIFO priority (1-99), above normal tasks and below the kernel interrupt threads
+MCL_CURRENT = 1  # mlockall flags from <sys/mman.h>
+MCL_FUTURE = 2
+JITTER_PERIOD = 0.005  # Period of the loop used to measure the jitter (seconds)
+JITTER_SECONDS = 1.0  # Length of each jitter measurement, 0 skips the measurements
+MAX_PENDING_ALLOCATIONS = 100000  # Youngest generation is collected while driving when it grows beyond this
+IDLE_COLLECT_AFTER = 1.0  # Seconds the car has to stand still before the full collection
+# ------------------- END Variables --------------------------
+
+
+def measure_jitter(seconds=JITTER_SECONDS, period=JITTER_PERIOD):
+    """Runs a loop sleeping until every period and returns a LogHistogram of how late it woke up"""
+    lateness = LogHistogram()
+    start = deadline = monotonic()
+    while deadline - start < seconds:
+        deadline += period
+        now = monotonic()
+        if deadline > now:
+            time.sleep(deadline - now)
+        lateness.record(max(monotonic() - deadline, 0.0))
+    return lateness
+
+
+def pin_to_cpu(cpu):
+    """Pins the calling thread to one cpu core. Returns a description of the outcome (String)"""
+    if not hasattr(os, 'sched_setaffinity'):
+        return 'not supported'
+    try:
+        available = os.sched_getaffinity(0)
+        if cpu not in available:
+            cpu = max(available)
+        os.sched_setaffinity(0, set([cpu]))
+    except OSError as e:
+        return 'failed: %s' % e.strerror
+    return 'cpu %d' % cpu
+
+
+def set_fifo_scheduling(priority):
+    """Switches the calling thread to SCHED_FIFO. Returns a description of the outcome (String)"""
+    if not hasattr(os, 'sched_setscheduler'):
+        return 'not supported'
+    try:
+        priority = min(priority, os.sched_get_priority_max(os.SCHED_FIFO))
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+    except OSError as e:
+        return 'not permitted: %s' % e.strerror
+    return 'SCHED_FIFO priority %d' % priority
+
+
+def lock_memory():
+    """Locks the current and future memory of the process. Returns a description of the outcome (String)"""
+    library = ctypes.util.find_library('c')
+    if library is None:
+        return 'not supported'
+    libc = ctypes.CDLL(library, use_errno=True)
+    if not hasattr(libc, 'mlockall'):
+        return 'not supported'
+    if libc.mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+        return 'not permitted: %s' % os.strerror(ctypes.get_errno())
+    return 'locked'
+
+
+def freeze_objects():
+    """Collects once and hides all objects that exist now from later collections"""
+    gc.collect()
+    if not hasattr(gc, 'freeze'):  # Python < 3.7
+        return 'collected, gc.freeze not supported'
+    gc.freeze()
+    return '%d objects frozen' % gc.get_freeze_count()
+
+
+class RealTimeMode(object):
+    """Applies the real-time settings to the calling thread and keeps the outcome of every step for the report"""
+
+    def __init__(self, cpu=CPU, priority=PRIORITY, memory_lock=True, jitter_seconds=JITTER_SECONDS):
+        self.cpu = cpu
+        self.priority = priority
+        self.memory_lock = memory_lock
+        self.jitter_seconds = jitter_seconds
+        self.steps = []  # (step, outcome)
+        self.jitter_before = None
+        self.jitter_after = None
+
+    def apply(self):
+        """Applies every setting, skipping those that fail. Call it from the thread that runs the loop, after the
+           other threads have been started, since new threads inherit the cpu and the scheduling policy."""
+        if self.jitter_seconds:
+            self.jitter_before = measure_jitter(self.jitter_seconds)
+        self.steps = [('cpu affinity', pin_to_cpu(self.cpu)),
+                      ('scheduling', set_fifo_scheduling(self.priority)),
+                      ('memory lock', lock_memory() if self.memory_lock else 'off'),
+                      ('garbage collector', freeze_objects())]
+        if self.jitter_seconds:
+            self.jitter_after = measure_jitter(self.jitter_seconds)
+        return self
+
+    def format_report(self):
+        lines = ['real-time mode:']
+        for step, outcome in self.steps:
+            lines.append('    %-18s %s' % (step, outcome))
+        for name, jitter in (('jitter before', self.jitter_before), ('jitter after', self.jitter_after)):
+            if jitter is not None:
+                lines.append('    %-18s p50 %.0f us p99 %.0f us max %.0f us (%d wake ups)' % (
+                    name, jitter.percentile(0.5) * 1e6, jitter.percentile(0.99) * 1e6, jitter.max * 1e6,
+                    jitter.count))
+        return '\n'.join(lines)
+
+
+def _do_nothing(*args):
+    pass
+
+
+class GcControl(object):
+    """Keeps the cyclic garbage collector off while driving. Call set_driving() after every command; when disabled,
+       set_driving does nothing."""
+
+    def __init__(self, enabled=True, max_pending=MAX_PENDING_ALLOCATIONS, idle_collect_after=IDLE_COLLECT_AFTER):
+        self.enabled = enabled
+        self.max_pending = max_pending
+        self.idle_collect_after = idle_collect_after
+        self.driving = False
+        self.stopped_at = None  # Time (monotonic) the car stopped, None once the full collection has been done
+        self.stop_collections = 0  # Young generation collections when driving stopped
+        self.idle_collections = 0  # Full collections after standing still for idle_collect_after
+        self.young_collections = 0  # Youngest generation collections while driving
+        if not enabled:
+            self.set_driving = _do_nothing
+
+    def set_driving(self, driving):
+        """Tell whether the car is driving (bool)"""
+        if driving != self.driving:
+            self.driving = driving
+            if driving:
+                gc.disable()
+            else:
+                gc.enable()
+                gc.collect(1)  # Cheap, the next command may follow right away
+                self.stop_collections += 1
+                self.stopped_at = monotonic()
+        elif driving:
+            if gc.get_count()[0] > self.max_pending:
+                gc.collect(0)
+                self.young_collections += 1
+        elif self.stopped_at is not None and monotonic() - self.stopped_at >= self.idle_collect_after:
+            gc.collect()  # Standing still for a while, nothing is waiting for the loop
+            self.idle_collections += 1
+            self.stopped_at = None
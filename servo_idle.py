@@ -0,0 +1,104 @@
+"""Detaches the camera servos while the head is still, to save battery and stop the hum of a servo holding position.
+
+A servo that gets no new target beyond DEADBAND_US (microseconds of pulse width) for IDLE_AFTER seconds is
+detached: its pulses are turned off (pulse width 0) and it stops driving its motor. Targets within the deadband of
+where it was left are not sent. The first target beyond the deadband attaches it again: the pulse width is sent
+with that message, and the servo gets its first pulse within one 20 ms frame.
+
+The time every axis spent attached, and how often it was detached and attached again, are counted for the report
+and the metrics. See Benchmark scripts/servo_idle_benchmark.py."""
+
+from latency_stats import monotonic
+
+# -------------------- Variables -----------------------------
+IDLE_AFTER = 3.0  # Seconds without a target beyond the deadband before a servo is detached
+DEADBAND_US = 20  # Pulse width changes (microseconds) smaller than this are not a movement, ~2.4 deg of the z servo
+# ------------------- END Variables --------------------------
+
+
+class IdleAxis(object):
+    """Attachment state and counters of one servo"""
+    __slots__ = ('name', 'attached', 'reference', 'last_move', 'attached_since', 'attached_seconds', 'detaches',
+                 'reattaches')
+
+    def __init__(self, name, now):
+        self.name = name
+        self.attached = True
+        self.reference = None  # Pulse width of the latest movement
+        self.last_move = now
+        self.attached_since = now
+        self.attached_seconds = 0.0  # Attached time until attached_since
+        self.detaches = 0
+        self.reattaches = 0
+
+    def attached_time(self, now):
+        """Seconds attached in total"""
+        return self.attached_seconds + (now - self.attached_since if self.attached else 0.0)
+
+
+class IdleServos(object):
+    """Idle manager of the servos named in axes ('z', 'elevation')"""
+
+    def __init__(self, axes, idle_after=IDLE_AFTER, deadband=DEADBAND_US, enabled=True):
+        now = monotonic()
+        self.idle_after = idle_after
+        self.deadband = deadband
+        self.enabled = enabled
+        self.axes = dict((name, IdleAxis(name, now)) for name in axes)
+        self.started = now
+
+    def reset(self, now):
+        """All servos were just set by someone else (started, parked), they are attached and moving"""
+        for axis in self.axes.values():
+            if not axis.attached:
+                axis.attached = True
+                axis.attached_since = now
+            axis.reference = None
+            axis.last_move = now
+
+    def stopped(self, now):
+        """All servos were turned off (stop_servos), that is not counted as a detach"""
+        for axis in self.axes.values():
+            if axis.attached:
+                axis.attached = False
+                axis.attached_seconds += now - axis.attached_since
+
+    def target(self, name, pulse_width, applied, now):
+        """Returns the pulse width to send for a new target: pulse_width, or applied when a detached servo stays
+           within the deadband"""
+        axis = self.axes[name]
+        if axis.reference is None or abs(pulse_width - axis.reference) > self.deadband:
+            axis.reference = pulse_width
+            axis.last_move = now
+            if not axis.attached:
+                axis.attached = True
+                axis.attached_since = now
+                axis.reattaches += 1
+        elif not axis.attached:
+            return applied
+        return pulse_width
+
+    def output(self, name, pulse_width):
+        """The pulse width that holds a servo as it is, 0 while it is detached"""
+        return pulse_width if self.axes[name].attached else 0
+
+    def check(self, now):
+        """Returns the names of the servos to detach now (send them pulse width 0)"""
+        detach = []
+        if not self.enabled:
+            return detach
+        for name, axis in self.axes.items():
+            if axis.attached and now - axis.last_move >= self.idle_after:
+                axis.attached = False
+                axis.attached_seconds += now - axis.attached_since
+                axis.detaches += 1
+                detach.append(name)
+        return detach
+
+    def format_report(self, now=None):
+        now = monotonic() if now is None else now
+        elapsed = max(now - self.started, 1e-9)
+        return 'servos: ' + ', '.join(
+            '%s attached %.1f s (%.0f %%), %d detaches, %d reattaches' % (
+                name, axis.attached_time(now), axis.attached_time(now) / elapsed * 100, axis.detaches,
+                axis.reattaches) for name, axis in sorted(self.axes.items()))
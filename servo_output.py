@@ -0,0 +1,44 @@
+"""Servo pulses from the PWM peripheral of the Raspberry Pi, for the servos on gpios that have it.
+
+pi.set_servo_pulsewidth times the pulses with DMA in steps of the pigpiod sample rate (5 us by default), which is why
+car_model rounds the z-axis pulse width to tens of microseconds. The PWM peripheral has two channels, each on two
+gpios of the header: PWM0 on 12 and 18, PWM1 on 13 and 19. pi.hardware_PWM runs a channel at SERVO_FREQUENCY with the
+duty cycle in millionths, a step of 0.02 us at 50 Hz, clocked by the peripheral instead of the DMA.
+
+hardware_servos picks hardware PWM for every servo on such a gpio, unless another servo already has its channel (the
+two gpios of a channel carry the same signal). The analog audio output uses both channels, it has to be off
+(dtparam=audio=off in /boot/config.txt) while the servos use them."""
+
+# -------------------- Variables -----------------------------
+HARDWARE_PWM_CHANNELS = {12: 0, 18: 0, 13: 1, 19: 1}  # gpio -> PWM channel
+SERVO_FREQUENCY = 50  # Hz, a pulse every 20 ms like set_servo_pulsewidth
+DUTY_RANGE = 1000000  # Full duty cycle of pi.hardware_PWM
+HARDWARE_DIGITS = 1  # Pulse widths on hardware PWM are rounded to tenths of microseconds
+# ------------------- END Variables --------------------------
+
+
+def hardware_servos(gpios):
+    """Returns the set of servo gpios that get a hardware PWM channel, the first servo on a channel gets it"""
+    channels = set()
+    chosen = set()
+    for gpio in gpios:
+        channel = HARDWARE_PWM_CHANNELS.get(gpio)
+        if channel is not None and channel not in channels:
+            channels.add(channel)
+            chosen.add(gpio)
+    return chosen
+
+
+def duty_cycle(pulse_width, frequency=SERVO_FREQUENCY):
+    """Duty cycle (millionths) of pi.hardware_PWM for a pulse width in microseconds"""
+    return int(round(pulse_width * frequency * DUTY_RANGE / 1e6))
+
+
+def set_pulse_width(pi, gpio, pulse_width, hardware):
+    """Sets the pulse width (microseconds) of a servo, 0 turns its pulses off. hardware selects pi.hardware_PWM,
+       otherwise pi.set_servo_pulsewidth is used."""
+    if not hardware:
+        return pi.set_servo_pulsewidth(gpio, pulse_width)
+    if not pulse_width:
+        return pi.hardware_PWM(gpio, 0, 0)  # Frequency 0 turns the channel off
+    return pi.hardware_PWM(gpio, SERVO_FREQUENCY, duty_cycle(pulse_width))
@@ -0,0 +1,247 @@
+"""Simulated camera servos, to compare control loop configurations offline without the hardware.
+
+ServoModel turns the pulse widths sent to a servo (a trace of (time, pulse width) commands as the control loop sends
+them) into the angle the camera actually has over time:
+
+    quantization   the pulse width is rounded to QUANTIZATION_US, like set_camera_direction_z rounds to 10 us
+    frames         the servo only sees the pulse width of the latest 50 Hz PWM frame
+    dead time      the motor starts to react dead_time after the frame
+    response       first order (time_constant) or second order (natural_frequency, damping) towards the target
+    slew rate      the angular speed never exceeds max_slew
+
+Run the module to simulate a head movement through the whole pipeline (network delay, Car math with and without
+head prediction, servo model) and print the RMS tracking error and the latency of the camera for each
+configuration. With a flight recorder file, the recorded pulse widths are simulated against the recorded phone
+angles instead:
+
+    python servo_simulator.py [flight_recorder.bin]"""
+
+import argparse
+import math
+
+from car_model import Car, FORWARD_PW_Z, DEG2PW_FACTOR_Z, FORWARD_PW_ELEVATION, DEG2PW_FACTOR_ELEVATION, \
+    MIN_PW_Z, MAX_PW_Z, MIN_PW_ELEVATION, MAX_PW_ELEVATION
+
+# -------------------- Variables -----------------------------
+QUANTIZATION_US = 10  # Pulse width resolution (us)
+FRAME_PERIOD = 0.02  # 50 Hz servo PWM
+DEAD_TIME = 0.01  # Seconds from a frame until the motor reacts
+MAX_SLEW = 600.0  # Degrees per second, 0.1 s/60 degrees like an SG90 at 5 V
+TIME_CONSTANT = 0.03  # First order response (seconds)
+NATURAL_FREQUENCY = 40.0  # Second order response (rad/s)
+DAMPING = 0.7
+STEP = 0.001  # Simulation time step (seconds)
+MAX_LATENCY = 0.5  # Longest camera latency searched for (seconds)
+# Axes: (pulse width of the forward direction, us per degree), angle = (forward - pulse width) / factor
+AXIS_Z = (FORWARD_PW_Z, DEG2PW_FACTOR_Z)
+AXIS_ELEVATION = (FORWARD_PW_ELEVATION, DEG2PW_FACTOR_ELEVATION)
+# ------------------- END Variables --------------------------
+
+
+class ServoModel(object):
+    """Dynamics of one servo. order is 1 or 2."""
+
+    def __init__(self, order=1, dead_time=DEAD_TIME, max_slew=MAX_SLEW, time_constant=TIME_CONSTANT,
+                 natural_frequency=NATURAL_FREQUENCY, damping=DAMPING, quantization=QUANTIZATION_US,
+                 frame_period=FRAME_PERIOD):
+        self.order = order
+        self.dead_time = dead_time
+        self.max_slew = max_slew
+        self.time_constant = time_constant
+        self.natural_frequency = natural_frequency
+        self.damping = damping
+        self.quantization = quantization
+        self.frame_period = frame_period
+
+    def quantize(self, pulse_width):
+        return round(pulse_width / float(self.quantization)) * self.quantization if self.quantization else pulse_width
+
+    def simulate(self, command_times, pulse_widths, axis, end_time, start_angle=None, step=STEP):
+        """Simulates the servo from the first command until end_time. command_times (seconds, ascending) and
+           pulse_widths (us) are the commands sent to the servo, axis is AXIS_Z or AXIS_ELEVATION. Returns the lists
+           (times, camera angles in degrees) with one value per step."""
+        forward, factor = axis
+        commands = [(t, (forward - self.quantize(pw)) / factor) for t, pw in zip(command_times, pulse_widths)
+                    if pw]  # A pulse width of 0 switches the servo off, it keeps its position
+        if not commands:
+            return [], []
+        angle = commands[0][1] if start_angle is None else start_angle
+        velocity = 0.0
+        target = angle
+        next_command = 0
+        next_frame = commands[0][0]
+        frame_targets = []  # (time the motor reacts, target) of the frames not reacted to yet
+        times = []
+        angles = []
+        t = commands[0][0]
+        while t <= end_time:
+            if t >= next_frame:  # The servo reads the latest pulse width at the start of every frame
+                while next_command < len(commands) and commands[next_command][0] <= t:
+                    next_command += 1
+                frame_targets.append((next_frame + self.dead_time, commands[next_command - 1][1]))
+                next_frame += self.frame_period
+            while frame_targets and frame_targets[0][0] <= t:
+                target = frame_targets.pop(0)[1]
+            if self.order == 1:
+                velocity = (target - angle) / self.time_constant
+            else:
+                acceleration = self.natural_frequency ** 2 * (target - angle) - \
+                    2 * self.damping * self.natural_frequency * velocity
+                velocity += acceleration * step
+            if velocity > self.max_slew:
+                velocity = self.max_slew
+            elif velocity < -self.max_slew:
+                velocity = -self.max_slew
+            angle += velocity * step
+            times.append(t)
+            angles.append(angle)
+            t += step
+        return times, angles
+
+
+def tracking_error(times, angles, reference_times, reference_angles, valid_range=None):
+    """RMS difference (degrees) between the simulated camera angles and the reference (head) angles at the same times,
+       and the latency (seconds) of the camera: the delay of the reference that fits the camera best. valid_range
+       (low, high) leaves out the times the reference is outside the reach of the servo."""
+    import numpy as np
+    times = np.asarray(times)
+    angles = np.asarray(angles)
+    reference_times = np.asarray(reference_times)
+    reference_angles = np.asarray(reference_angles)
+    times_in_reference = (times >= reference_times[0] + MAX_LATENCY) & (times <= reference_times[-1])
+    times = times[times_in_reference]
+    angles = angles[times_in_reference]
+    reference = np.interp(times, reference_times, reference_angles)
+    valid = np.ones(len(times), dtype=bool)
+    if valid_range is not None:
+        valid = (reference >= valid_range[0]) & (reference <= valid_range[1])
+    rms = math.sqrt(np.mean((angles - reference)[valid] ** 2))
+    best_latency, best_rms = 0.0, None
+    for latency in np.arange(0.0, MAX_LATENCY, STEP * 5):
+        delayed = np.interp(times - latency, reference_times, reference_angles)
+        delayed_rms = np.mean((angles - delayed)[valid] ** 2)
+        if best_rms is None or delayed_rms < best_rms:
+            best_latency, best_rms = latency, delayed_rms
+    return rms, best_latency
+
+
+def axis_range(axis, low_pw, high_pw):
+    """Camera angles (degrees) the servo can reach, lowest first"""
+    forward, factor = axis
+    return tuple(sorted(((forward - low_pw) / factor, (forward - high_pw) / factor)))
+
+
+# ------------------------ Pipeline simulation ------------------------
+
+
+def control_trace(times, alpha, gamma, network_delay=0.04, network_jitter=0.01, predictor=None, seed=2):
+    """Runs phone samples through the network and the Car math like v10. Returns (arrival times, pulse widths z,
+       pulse widths elevation) in the order the messages arrive."""
+    import numpy as np
+    rng = np.random.RandomState(seed)
+    arrivals = np.asarray(times) + network_delay + np.abs(rng.normal(0.0, network_jitter, len(times)))
+    order = np.argsort(arrivals, kind='stable')
+    the_car = Car()
+    the_car.predictor = predictor
+    command_times, pulse_widths_z, pulse_widths_elevation = [], [], []
+    for i in order:
+        the_car.alpha_degrees = float(alpha[i])
+        the_car.gamma_degrees = float(gamma[i])
+        the_car.sample_time = float(times[i])  # Phone time, known in v10 once the clocks are synced
+        the_car.calculate_new_pulse_widths()
+        command_times.append(float(arrivals[i]))
+        pulse_widths_z.append(round(the_car.cameraDirection_Z, -1))
+        pulse_widths_elevation.append(round(the_car.cameraDirection_Elevation, 0))
+    return command_times, pulse_widths_z, pulse_widths_elevation
+
+
+def synthetic_references(seconds=60.0):
+    """Phone angles of a synthetic head movement and the camera angles they ask for (degrees):
+       (times, alpha, gamma, pan reference, tilt reference)"""
+    import numpy as np
+    from head_prediction import synthetic_session
+    times, pan, tilt = synthetic_session(seconds)
+    alpha = np.asarray(pan)
+    gamma = 60.0 - np.asarray(tilt)  # Phone held upright in front of the face, the tilt stays within the range
+    pan_reference = (alpha - 180.0 + 180.0) % 360.0 - 180.0  # Car.cameraForward is 180 at the start
+    tilt_reference = 90.0 - gamma
+    return np.asarray(times), alpha, gamma, pan_reference, tilt_reference
+
+
+def evaluate_pipeline(times, alpha, gamma, pan_reference, tilt_reference, model, predictor=None, network_delay=0.04,
+                      network_jitter=0.01):
+    """Returns ((rms pan, latency pan), (rms tilt, latency tilt)) of one pipeline configuration"""
+    command_times, pulse_widths_z, pulse_widths_elevation = control_trace(times, alpha, gamma, network_delay,
+                                                                          network_jitter, predictor)
+    end_time = command_times[-1]
+    results = []
+    for axis, pulse_widths, reference, limits in (
+            (AXIS_Z, pulse_widths_z, pan_reference, axis_range(AXIS_Z, MIN_PW_Z, MAX_PW_Z)),
+            (AXIS_ELEVATION, pulse_widths_elevation, tilt_reference,
+             axis_range(AXIS_ELEVATION, MIN_PW_ELEVATION, MAX_PW_ELEVATION))):
+        sim_times, angles = model.simulate(command_times, pulse_widths, axis, end_time)
+        results.append(tracking_error(sim_times, angles, times, reference, limits))
+    return results
+
+
+def recorded_pipeline(path, model):
+    """Simulates the recorded pulse widths of a flight recorder file against the recorded phone angles"""
+    import numpy as np
+    import flight_recorder
+    records = [record for record in flight_recorder.read_records(path)
+               if record[2] == flight_recorder.ORIENTATION]
+    if len(records) < 10:
+        return None
+    times = np.array([record[1] for record in records])
+    alpha = np.array([record[4] for record in records])  # After Car.calculate_new_pulse_widths
+    tilt_reference = 90.0 - np.array([record[5] for record in records])
+    pulse_widths_z = np.array([record[8] for record in records])
+    pulse_widths_elevation = np.array([record[9] for record in records])
+    # The forward direction is not recorded, take it from the pulse widths that were not limited
+    free = (pulse_widths_z > MIN_PW_Z) & (pulse_widths_z < MAX_PW_Z)
+    commanded_pan = (FORWARD_PW_Z - pulse_widths_z) / DEG2PW_FACTOR_Z
+    forward = np.median(((alpha - commanded_pan)[free] + 180.0) % 360.0 - 180.0) if free.any() else 180.0
+    pan_reference = (alpha - forward + 180.0) % 360.0 - 180.0
+    results = []
+    for axis, pulse_widths, reference, limits in (
+            (AXIS_Z, pulse_widths_z, pan_reference, axis_range(AXIS_Z, MIN_PW_Z, MAX_PW_Z)),
+            (AXIS_ELEVATION, pulse_widths_elevation, tilt_reference,
+             axis_range(AXIS_ELEVATION, MIN_PW_ELEVATION, MAX_PW_ELEVATION))):
+        sim_times, angles = model.simulate(times, pulse_widths, axis, times[-1])
+        results.append(tracking_error(sim_times, angles, times, reference, limits))
+    return results
+
+
+def print_results(name, results):
+    (pan_rms, pan_latency), (tilt_rms, tilt_latency) = results
+    print('%-28s %8.2f %8.0f %8.2f %8.0f' % (name, pan_rms, pan_latency * 1000, tilt_rms, tilt_latency * 1000))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Camera tracking error with simulated servos')
+    parser.add_argument('path', nargs='?', help='flight recorder file, a synthetic head movement is used without it')
+    parser.add_argument('--order', type=int, choices=(1, 2), default=1, help='order of the servo response')
+    parser.add_argument('--seconds', type=float, default=60.0, help='length of the synthetic head movement')
+    args = parser.parse_args(argv)
+    model = ServoModel(order=args.order)
+    print('%-28s %8s %8s %8s %8s' % ('configuration', 'pan deg', 'pan ms', 'tilt deg', 'tilt ms'))
+    if args.path:
+        results = recorded_pipeline(args.path, model)
+        if results is None:
+            print('not enough orientation samples')
+        else:
+            print_results('recorded', results)
+        return
+    from head_prediction import HeadPredictor
+    references = synthetic_references(args.seconds)
+    for delay in (0.02, 0.08):
+        print_results('delay %d ms, direct' % (delay * 1000), evaluate_pipeline(*references, model=model,
+                                                                              network_delay=delay))
+        for lookahead in (0.05, 0.1, 0.15):
+            print_results('delay %d ms, predict %d ms' % (delay * 1000, lookahead * 1000),
+                          evaluate_pipeline(*references, model=model, predictor=HeadPredictor(lookahead),
+                                            network_delay=delay))
+
+
+if __name__ == "__main__":
+    main()
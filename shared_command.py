@@ -0,0 +1,77 @@
+"""The latest drive and servo command, shared between the network process and the actuator process.
+
+The command lives in one slot in shared memory (multiprocessing.shared_memory, Python 3.8+) protected by a sequence
+lock: the writer makes the sequence number odd, writes the command and makes it even again. The reader copies the
+command and only accepts the copy if the sequence number was even and unchanged before and after. Neither side ever
+waits for the other, so a slow parse in the network process can not hold up the actuator, and the actuator always
+gets the newest complete command; older ones are simply overwritten.
+
+Slot layout (little endian):
+
+    offset 0    uint32  sequence lock counter, odd while a write is in progress
+    offset 8    double  time the command was written (monotonic clock, seconds)
+    offset 16   uint32  command number, incremented by every write
+    offset 20   uint8   driving direction, index in DIRECTIONS
+    offset 21   uint8   flags, FLAG_QUIT asks the actuator process to stop the car and exit
+    offset 22   uint16  pulse width z-axis servo (us)
+    offset 24   uint16  pulse width elevation servo (us)"""
+
+import struct
+
+from multiprocessing import shared_memory
+
+# -------------------- Variables -----------------------------
+DIRECTIONS = ('stop', 'forward', 'backward', 'left', 'right')  # Driving directions by their number in the slot
+SEQUENCE = struct.Struct('<I')
+COMMAND = struct.Struct('<dIBBHH')
+COMMAND_OFFSET = 8
+SLOT_SIZE = COMMAND_OFFSET + COMMAND.size
+FLAG_QUIT = 1
+READ_ATTEMPTS = 100  # Reads retried while the writer is busy before giving up for this tick
+# ------------------- END Variables --------------------------
+
+
+class CommandSlot(object):
+    """One command slot in shared memory. Create it in one process with create=True and attach to it by name in the
+       other. Only one process may write."""
+
+    def __init__(self, name=None, create=False):
+        self.memory = shared_memory.SharedMemory(name=name, create=create, size=SLOT_SIZE if create else 0)
+        self.name = self.memory.name
+        self.buffer = self.memory.buf
+        self.sequence = SEQUENCE.unpack_from(self.buffer, 0)[0]
+        self.number = 0
+        if create:
+            SEQUENCE.pack_into(self.buffer, 0, 0)
+            COMMAND.pack_into(self.buffer, COMMAND_OFFSET, 0.0, 0, 0, 0, 0, 0)
+            self.sequence = 0
+
+    def write(self, written, direction, pulse_width_z, pulse_width_elevation, flags=0):
+        """Publish a new command (direction is the number in DIRECTIONS)"""
+        self.number = (self.number + 1) & 0xffffffff
+        self.sequence = (self.sequence + 1) & 0xffffffff  # Odd: write in progress
+        SEQUENCE.pack_into(self.buffer, 0, self.sequence)
+        COMMAND.pack_into(self.buffer, COMMAND_OFFSET, written, self.number, direction, flags,
+                          int(pulse_width_z), int(pulse_width_elevation))
+        self.sequence = (self.sequence + 1) & 0xffffffff  # Even: command complete
+        SEQUENCE.pack_into(self.buffer, 0, self.sequence)
+
+    def read(self):
+        """Returns the latest complete command as (written, number, direction, flags, pulse width z, pulse width
+           elevation), or None if the writer kept the slot busy for READ_ATTEMPTS attempts"""
+        buffer = self.buffer
+        for _ in range(READ_ATTEMPTS):
+            before = SEQUENCE.unpack_from(buffer, 0)[0]
+            if before & 1:
+                continue
+            command = COMMAND.unpack_from(buffer, COMMAND_OFFSET)
+            if SEQUENCE.unpack_from(buffer, 0)[0] == before:
+                return command
+        return None
+
+    def close(self, unlink=False):
+        """Detach from the slot, the creating process also unlinks it"""
+        self.buffer = None
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
@@ -0,0 +1,359 @@
+"""Simulated pigpio backend for running the car programs on a computer without a Raspberry Pi.
+
+Implements the parts of the pigpio.pi interface used by the car programs, keeps the state of every pin and counts the
+calls made, so benchmarks can measure the Python side of the control loop and check what would have been sent to the
+pigpio daemon. Use install() before the car program is imported:
+
+    import sim_pigpio
+    sim_pigpio.install()
+    import v10_VRCarcontrol_WebRTC_Two_Servos as car_program"""
+
+import sys
+import time
+
+try:
+    from time import monotonic
+except ImportError:  # Python 2
+    from time import time as monotonic
+
+# -------------------- Variables -----------------------------
+INPUT = 0  # Same values as in pigpio
+OUTPUT = 1
+LOW = 0
+HIGH = 1
+PI_SCRIPT_INITING = 0  # Script states, as in pigpio
+PI_SCRIPT_HALTED = 1
+PI_SCRIPT_FAILED = 4
+SCRIPT_ARGUMENTS = {'w': 2, 'servo': 2, 'hp': 3, 'lda': 1, 'jz': 1, 'jnz': 1, 'jmp': 1, 'tag': 1,
+                    'halt': 0}  # Supported
+HARDWARE_PWM_GPIOS = (12, 13, 18, 19)  # Of the 40 pin header
+CALL_DELAY = 0.0  # Seconds every call busy waits, to simulate the round trip to the pigpio daemon (~50-100 us)
+# ------------------- END Variables --------------------------
+
+
+class error(Exception):
+    """Raised for bad arguments, like pigpio.error"""
+
+
+class pulse(object):
+    """One step of a waveform, like pigpio.pulse: gpios set high and low (bit masks), then a delay in microseconds"""
+
+    def __init__(self, gpio_on, gpio_off, delay):
+        self.gpio_on = gpio_on
+        self.gpio_off = gpio_off
+        self.delay = delay
+
+
+class pi(object):
+    """Simulated connection to the pigpio daemon. Every call is logged in calls as (time, name, gpio, value) when
+       keep_log is True, and counted per name in call_counts. Waveforms and wave chains are executed at once into
+       a timeline of (microseconds, gpio, level), appended with the start time to wave_transmissions. Stored
+       scripts (the commands in SCRIPT_ARGUMENTS) run at once in run_script; their pin changes are passed to the
+       listeners and logged, but not counted as calls."""
+    instances = []  # All created connections, the benchmarks use the last one
+
+    def __init__(self, host='localhost', port=8888, call_delay=None):
+        self.connected = True
+        self.call_delay = CALL_DELAY if call_delay is None else call_delay
+        self.modes = {}
+        self.levels = {}
+        self.servo_pulsewidths = {}
+        self.pwm_frequencies = {}
+        self.pwm_dutycycles = {}
+        self.hardware_pwm = {}
+        self.call_counts = {}
+        self.calls = []
+        self.keep_log = False
+        self.listeners = []  # Functions called with (time, name, gpio, value) after every call
+        self.wave_pulses = []  # Pulses added since the last wave_create
+        self.waves = {}  # wave id -> list of pulses
+        self.next_wave_id = 0
+        self.wave_transmissions = []  # (time, timeline) of every wave_send_once and wave_chain
+        self.scripts = {}  # script id -> list of (command, arguments)
+        self.next_script_id = 0
+        pi.instances.append(self)
+
+    def _call(self, name, gpio, value):
+        if self.call_delay:
+            end = monotonic() + self.call_delay
+            while monotonic() < end:
+                pass
+        self.call_counts[name] = self.call_counts.get(name, 0) + 1
+        if self.keep_log or self.listeners:
+            now = monotonic()
+            if self.keep_log:
+                self.calls.append((now, name, gpio, value))
+            for listener in self.listeners:
+                listener(now, name, gpio, value)
+        return 0
+
+    def total_calls(self):
+        """Returns the number of calls that would have been sent to the pigpio daemon"""
+        return sum(self.call_counts.values())
+
+    def reset_counts(self):
+        self.call_counts = {}
+        del self.calls[:]
+
+    def set_mode(self, gpio, mode):
+        self.modes[gpio] = mode
+        return self._call('set_mode', gpio, mode)
+
+    def get_mode(self, gpio):
+        self._call('get_mode', gpio, None)
+        return self.modes.get(gpio, INPUT)
+
+    def write(self, gpio, level):
+        self.levels[gpio] = int(bool(level))
+        self.pwm_dutycycles.pop(gpio, None)  # Like pigpio, a write ends the PWM on the pin
+        return self._call('write', gpio, int(bool(level)))
+
+    def read(self, gpio):
+        self._call('read', gpio, None)
+        return self.levels.get(gpio, LOW)
+
+    def set_bank_1(self, bits):
+        for gpio in range(32):
+            if bits & (1 << gpio):
+                self.levels[gpio] = HIGH
+        return self._call('set_bank_1', None, bits)
+
+    def clear_bank_1(self, bits):
+        for gpio in range(32):
+            if bits & (1 << gpio):
+                self.levels[gpio] = LOW
+        return self._call('clear_bank_1', None, bits)
+
+    def set_servo_pulsewidth(self, user_gpio, pulsewidth):
+        if pulsewidth != 0 and not 500 <= pulsewidth <= 2500:
+            raise error('GPIO %d: bad pulsewidth %r' % (user_gpio, pulsewidth))
+        self.servo_pulsewidths[user_gpio] = pulsewidth
+        return self._call('set_servo_pulsewidth', user_gpio, pulsewidth)
+
+    def get_servo_pulsewidth(self, user_gpio):
+        self._call('get_servo_pulsewidth', user_gpio, None)
+        return self.servo_pulsewidths.get(user_gpio, 0)
+
+    def set_PWM_frequency(self, user_gpio, frequency):
+        self.pwm_frequencies[user_gpio] = frequency
+        return self._call('set_PWM_frequency', user_gpio, frequency)
+
+    def set_PWM_dutycycle(self, user_gpio, dutycycle):
+        if not 0 <= dutycycle <= 255:
+            raise error('GPIO %d: bad dutycycle %r' % (user_gpio, dutycycle))
+        self.pwm_dutycycles[user_gpio] = dutycycle
+        self.levels[user_gpio] = int(dutycycle > 0)
+        return self._call('set_PWM_dutycycle', user_gpio, dutycycle)
+
+    def get_PWM_dutycycle(self, user_gpio):
+        self._call('get_PWM_dutycycle', user_gpio, None)
+        if user_gpio not in self.pwm_dutycycles:
+            raise error('GPIO %d: not a PWM gpio' % user_gpio)
+        return self.pwm_dutycycles[user_gpio]
+
+    @staticmethod
+    def _check_hardware_PWM(gpio, duty):
+        if gpio not in HARDWARE_PWM_GPIOS:
+            raise error('GPIO %d: no hardware PWM' % gpio)
+        if not 0 <= duty <= 1000000:
+            raise error('GPIO %d: bad hardware PWM dutycycle %r' % (gpio, duty))
+
+    def hardware_PWM(self, gpio, PWMfreq, PWMduty):
+        self._check_hardware_PWM(gpio, PWMduty)
+        self.hardware_pwm[gpio] = (PWMfreq, PWMduty)
+        return self._call('hardware_PWM', gpio, (PWMfreq, PWMduty))
+
+    def wave_clear(self):
+        self.wave_pulses = []
+        self.waves = {}
+        return self._call('wave_clear', None, None)
+
+    def wave_add_generic(self, pulses):
+        self.wave_pulses.extend(pulses)
+        self._call('wave_add_generic', None, len(pulses))
+        return len(self.wave_pulses)
+
+    def wave_create(self):
+        wave_id = self.next_wave_id
+        self.next_wave_id += 1
+        self.waves[wave_id] = self.wave_pulses
+        self.wave_pulses = []
+        self._call('wave_create', None, wave_id)
+        return wave_id
+
+    def wave_delete(self, wave_id):
+        if self.waves.pop(wave_id, None) is None:
+            raise error('bad wave id %r' % wave_id)
+        return self._call('wave_delete', None, wave_id)
+
+    def _run_wave(self, wave_id, start, timeline):
+        """Appends the level changes of a waveform starting at start (microseconds), returns its end time"""
+        if wave_id not in self.waves:
+            raise error('bad wave id %r' % wave_id)
+        t = start
+        for step in self.waves[wave_id]:
+            for gpio in range(32):
+                if step.gpio_off & (1 << gpio):
+                    timeline.append((t, gpio, 0))
+            for gpio in range(32):
+                if step.gpio_on & (1 << gpio):
+                    timeline.append((t, gpio, 1))
+            t += step.delay
+        return t
+
+    def _run_chain(self, data, i, t, timeline):
+        """Runs wave_chain commands from index i until the end or a loop end, returns (index, time)"""
+        while i < len(data):
+            if data[i] != 255:
+                t = self._run_wave(data[i], t, timeline)
+                i += 1
+            elif data[i + 1] == 0:  # Loop start: run the body once to find its end, then the remaining repeats
+                body = i + 2
+                i, t = self._run_chain(data, body, t, timeline)
+                if i >= len(data) or data[i + 1] != 1:
+                    raise error('loop without end or loop forever, not simulated')
+                for _ in range(data[i + 2] + 256 * data[i + 3] - 1):
+                    t = self._run_chain(data, body, t, timeline)[1]
+                i += 4
+            elif data[i + 1] in (1, 3):  # Loop end, handled by the loop start
+                return i, t
+            elif data[i + 1] == 2:  # Delay
+                t += data[i + 2] + 256 * data[i + 3]
+                i += 4
+            else:
+                raise error('bad chain command %r' % data[i + 1])
+        return i, t
+
+    def _transmit(self, timeline):
+        for t, gpio, level in timeline:
+            self.levels[gpio] = level
+        self.wave_transmissions.append((monotonic(), timeline))
+
+    def wave_send_once(self, wave_id):
+        timeline = []
+        self._run_wave(wave_id, 0, timeline)
+        self._transmit(timeline)
+        return self._call('wave_send_once', None, wave_id)
+
+    def wave_chain(self, data):
+        timeline = []
+        self._run_chain(list(data), 0, 0, timeline)
+        self._transmit(timeline)
+        return self._call('wave_chain', None, len(data))
+
+    def wave_tx_busy(self):
+        self._call('wave_tx_busy', None, None)
+        return 0  # Transmissions are done at once
+
+    def wave_tx_stop(self):
+        return self._call('wave_tx_stop', None, None)
+
+    def _daemon_change(self, name, gpio, value):
+        """A pin change made by the daemon itself, not a call"""
+        if self.keep_log or self.listeners:
+            now = monotonic()
+            if self.keep_log:
+                self.calls.append((now, name, gpio, value))
+            for listener in self.listeners:
+                listener(now, name, gpio, value)
+
+    def store_script(self, script):
+        if not isinstance(script, str):
+            script = script.decode('ascii')
+        words = script.lower().split()
+        commands = []
+        i = 0
+        while i < len(words):
+            command = words[i]
+            if command not in SCRIPT_ARGUMENTS:
+                raise error('bad script command %r' % command)
+            commands.append((command, words[i + 1:i + 1 + SCRIPT_ARGUMENTS[command]]))
+            i += 1 + SCRIPT_ARGUMENTS[command]
+        script_id = self.next_script_id
+        self.next_script_id += 1
+        self.scripts[script_id] = commands
+        self._call('store_script', None, script_id)
+        return script_id
+
+    def script_status(self, script_id):
+        self._call('script_status', None, script_id)
+        if script_id not in self.scripts:
+            raise error('bad script id %r' % script_id)
+        return PI_SCRIPT_HALTED, [0] * 10
+
+    def run_script(self, script_id, params=None):
+        if script_id not in self.scripts:
+            raise error('bad script id %r' % script_id)
+        params = list(params or []) + [0] * (10 - len(params or []))
+        commands = self.scripts[script_id]
+
+        def value(argument):
+            return params[int(argument[1:])] if argument.startswith('p') else int(argument)
+        tags = dict((value(arguments[0]), index) for index, (command, arguments) in enumerate(commands)
+                    if command == 'tag')
+        accumulator = 0
+        index = 0
+        while index < len(commands):
+            command, arguments = commands[index]
+            index += 1
+            if command == 'w':
+                gpio, level = value(arguments[0]), int(bool(value(arguments[1])))
+                self.levels[gpio] = level
+                self.pwm_dutycycles.pop(gpio, None)
+                self._daemon_change('write', gpio, level)
+            elif command == 'servo':
+                gpio, pulsewidth = value(arguments[0]), value(arguments[1])
+                if pulsewidth != 0 and not 500 <= pulsewidth <= 2500:
+                    raise error('GPIO %d: bad pulsewidth %r' % (gpio, pulsewidth))
+                self.servo_pulsewidths[gpio] = pulsewidth
+                self._daemon_change('set_servo_pulsewidth', gpio, pulsewidth)
+            elif command == 'hp':
+                gpio, frequency, duty = [value(argument) for argument in arguments]
+                self._check_hardware_PWM(gpio, duty)
+                self.hardware_pwm[gpio] = (frequency, duty)
+                self._daemon_change('hardware_PWM', gpio, (frequency, duty))
+            elif command == 'lda':
+                accumulator = value(arguments[0])
+            elif command == 'halt':
+                break
+            elif command == 'jmp' or (command == 'jz' and accumulator == 0) or (command == 'jnz' and accumulator):
+                index = tags[value(arguments[0])]
+        return self._call('run_script', None, script_id)
+
+    def delete_script(self, script_id):
+        if self.scripts.pop(script_id, None) is None:
+            raise error('bad script id %r' % script_id)
+        return self._call('delete_script', None, script_id)
+
+    def stop(self):
+        self.connected = False
+        self._call('stop', None, None)
+
+
+def servo_pulse_width(name, value):
+    """Pulse width (microseconds) set by a logged set_servo_pulsewidth or hardware_PWM call, None for other calls"""
+    if name == 'set_servo_pulsewidth':
+        return value
+    if name == 'hardware_PWM':
+        frequency, duty = value
+        return duty / float(frequency) if frequency else 0
+    return None
+
+
+def install():
+    """Make 'import pigpio' return this module"""
+    sys.modules['pigpio'] = sys.modules[__name__]
+    return sys.modules[__name__]
+
+
+def no_sleep_time():
+    """Returns an object that can replace the time module of a car program so its waits for the servos (time.sleep)
+       return immediately"""
+    class NoSleepTime(object):
+        def __getattr__(self, name):
+            return getattr(time, name)
+
+        @staticmethod
+        def sleep(seconds):
+            pass
+    return NoSleepTime()
@@ -0,0 +1,180 @@
+"""Stand-in for the pigpio daemon: speaks the pigpiod socket protocol and keeps the pin state in a simulated pigpio
+backend (sim_pigpio.pi), for testing pigpio_pipeline.py and the car programs without a Raspberry Pi.
+
+Every connection is served by its own thread, in order, like pigpiod. A delay (seconds) holds every reply back
+before it is sent, to simulate a LAN round trip; replies are still sent in order and commands keep being read in
+the meantime. Only the commands in pigpio_pipeline.COMMAND_NAMES are known, others fail.
+
+    python sim_pigpiod.py [--port 8888] [--delay-ms 1.0]"""
+
+import argparse
+import collections
+import socket
+import struct
+import threading
+import time
+
+import sim_pigpio
+from latency_stats import monotonic
+from pigpio_pipeline import COMMAND, COMMAND_SIZE, MODES, MODEG, READ, WRITE, PWM, PFS, SERVO, BC1, BS1, HWVER, \
+    GDC, GPW, HP, PORT
+
+# -------------------- Variables -----------------------------
+FAILED = -1  # Result of a failed or unknown command, pigpiod has a code per error
+HARDWARE_REVISION = 0xa02082  # Raspberry Pi 3 Model B
+# ------------------- END Variables --------------------------
+
+
+class StandInDaemon(object):
+    """Serves pigpio connections on host:port (port 0 picks a free port, see self.port)"""
+
+    def __init__(self, host='127.0.0.1', port=PORT, delay=0.0, pi=None):
+        self.pi = sim_pigpio.pi() if pi is None else pi
+        self.delay = delay
+        self.lock = threading.Lock()  # One simulated pi for all connections
+        self.commands = 0  # Commands handled
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((host, port))
+        self.listener.listen(5)
+        self.port = self.listener.getsockname()[1]
+        self.running = True
+
+    def start(self):
+        """Serves in a background thread, returns self"""
+        thread = threading.Thread(target=self.serve)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def serve(self):
+        while self.running:
+            try:
+                connection, address = self.listener.accept()
+            except socket.error:
+                break
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            thread = threading.Thread(target=self.handle, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def execute(self, command, p1, p2, extension):
+        """Runs one command on the simulated pi and returns its result (int)"""
+        pi = self.pi
+        try:
+            if command == MODES:
+                return pi.set_mode(p1, p2)
+            elif command == MODEG:
+                return pi.get_mode(p1)
+            elif command == READ:
+                return pi.read(p1)
+            elif command == WRITE:
+                return pi.write(p1, p2)
+            elif command == PWM:
+                return pi.set_PWM_dutycycle(p1, p2)
+            elif command == PFS:
+                pi.set_PWM_frequency(p1, p2)
+                return p2
+            elif command == SERVO:
+                return pi.set_servo_pulsewidth(p1, p2)
+            elif command == BC1:
+                return pi.clear_bank_1(p1)
+            elif command == BS1:
+                return pi.set_bank_1(p1)
+            elif command == HWVER:
+                return HARDWARE_REVISION
+            elif command == GDC:
+                return pi.get_PWM_dutycycle(p1)
+            elif command == GPW:
+                return pi.get_servo_pulsewidth(p1)
+            elif command == HP:
+                return pi.hardware_PWM(p1, p2, struct.unpack('<I', extension)[0])
+        except sim_pigpio.error:
+            return FAILED
+        return FAILED
+
+    def handle(self, connection):
+        """Reads, runs and answers the commands of one connection"""
+        delayed = collections.deque()  # (send time, replies) while a delay is simulated
+        ready = threading.Condition()
+        if self.delay:
+            sender = threading.Thread(target=self.send_delayed, args=(connection, delayed, ready))
+            sender.daemon = True
+            sender.start()
+        received = bytearray()
+        while True:
+            try:
+                data = connection.recv(65536)
+            except socket.error:
+                data = b''
+            if not data:
+                break
+            received += data
+            replies = bytearray()
+            offset = 0
+            while len(received) - offset >= COMMAND_SIZE:
+                command, p1, p2, length = COMMAND.unpack_from(received, offset)
+                if len(received) - offset < COMMAND_SIZE + length:
+                    break  # The extension has not arrived yet
+                extension = bytes(received[offset + COMMAND_SIZE:offset + COMMAND_SIZE + length])
+                offset += COMMAND_SIZE + length
+                with self.lock:
+                    result = self.execute(command, p1, p2, extension)
+                    self.commands += 1
+                replies += COMMAND.pack(command, p1, p2, result & 0xffffffff)
+            del received[:offset]
+            if not replies:
+                continue
+            if self.delay:
+                with ready:
+                    delayed.append((monotonic() + self.delay, bytes(replies)))
+                    ready.notify()
+            else:
+                connection.sendall(replies)
+        with ready:
+            delayed.append((None, None))
+            ready.notify()
+        connection.close()
+
+    @staticmethod
+    def send_delayed(connection, delayed, ready):
+        while True:
+            with ready:
+                while not delayed:
+                    ready.wait()
+                send_time, replies = delayed.popleft()
+            if send_time is None:
+                return
+            wait = send_time - monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            try:
+                connection.sendall(replies)
+            except socket.error:
+                return
+
+    def close(self):
+        self.running = False
+        try:
+            self.listener.shutdown(socket.SHUT_RDWR)  # Ends the accept of serve()
+        except socket.error:
+            pass
+        self.listener.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stand-in pigpio daemon with simulated pins')
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--delay-ms', type=float, default=0.0, help='delay of every reply in milliseconds')
+    args = parser.parse_args()
+    daemon = StandInDaemon(args.host, args.port, args.delay_ms / 1000.0)
+    print('serving pigpio on %s:%d' % (args.host, daemon.port))
+    try:
+        daemon.serve()
+    except KeyboardInterrupt:
+        daemon.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,44 @@
 import pigpio
-import pygame
 import time
-from pygame.locals import *
-import re
 import socket
 import os
 import json
 from subprocess import call
+from latency_stats import LatencyStats, monotonic
+from metrics_server import Metrics, start_metrics_server
+import flight_recorder
+import binary_protocol
+from link_timing import LinkTiming
+from rate_control import RateAdvisor
+from rt_tuning import RealTimeMode, GcControl
+from head_prediction import HeadPredictor, SERVO_LAG
+import link_monitor
+from drive_waveforms import DriveWaves
+from pigpio_scripts import TickScript
+from gpiomem import GpioMem, GpioMemPi
+from pigpio_pipeline import PipelinedPi
+from pin_map import CARS, BankDriver
+import servo_output
+from servo_idle import IdleServos
+from control_log import ControlLog
+from emergency_stop import EmergencyStop
+import gimbal
+from car_model import Car, START_PW_Z, START_PW_ELEVATION  # Servo limits and the camera math are in car_model.py
 
 # ------------------ GPIO INITIATION ------------------------
 """ This section declares and initialize the gpio pins """
-pi = pigpio.pi()  # Setup pigpio connection to the raspberry pi
-ENABLE_L_PIN = 4  # GPIO pin number for enabling left side wheels
-ENABLE_R_PIN = 17  # GPIO pin number for enabling right side wheels
-DIR_L_PIN = 27  # GPIO pin number for direction of left side wheels
-DIR_R_PIN = 22  # GPIO pin number for direction of right side wheels
-SERVO_PIN_Z_AXIS = 19  # GPIO pin number for Servo pin rotating around the z-axis
-SERVO_PIN_ELEVATION = 18  # GPIO pin number for Servo pin changing the elevation angle
+PIGPIO_HOST = 'localhost'  # Computer running pigpiod, the control program can run on another one
+PIGPIO_PIPELINE = False  # Set to True to send pigpio commands without waiting for every reply (pigpio_pipeline.py),
+                        # without DRIVE_WAVEFORMS and STORED_SCRIPTS
+pi = PipelinedPi(PIGPIO_HOST) if PIGPIO_PIPELINE else pigpio.pi(PIGPIO_HOST)  # Setup pigpio connection to the RPi
+PIN_MAP = CARS['v10']  # Pins and direction polarity of this car, validated in pin_map.py. Wired differently? Change
+                       # the map, not the drive functions
+ENABLE_L_PIN = PIN_MAP.enable_l  # GPIO pin number for enabling left side wheels
+ENABLE_R_PIN = PIN_MAP.enable_r  # GPIO pin number for enabling right side wheels
+DIR_L_PIN = PIN_MAP.dir_l  # GPIO pin number for direction of left side wheels
+DIR_R_PIN = PIN_MAP.dir_r  # GPIO pin number for direction of right side wheels
+SERVO_PIN_Z_AXIS = PIN_MAP.servo_z  # GPIO pin number for Servo pin rotating around the z-axis
+SERVO_PIN_ELEVATION = PIN_MAP.servo_elevation  # GPIO pin number for Servo pin changing the elevation angle
 
 pi.set_mode(ENABLE_L_PIN, pigpio.OUTPUT)  # EN1 controls left hand side wheels (H-bridge connector J1 pin1)
 pi.set_mode(ENABLE_R_PIN, pigpio.OUTPUT)  # EN2 controls right hand side wheels (H-bridge connector J1 pin7)
@@ -32,161 +54,194 @@ pi.write(ENABLE_R_PIN, False)  # Set right side wheels to stop spinning.
 """This section initialize constants used through out the program"""
 # t = 0.05  # run time
 # servoStepLength = 0.5  # Set Step length for Servo
-forward = False  # Constant to set the direction the wheels spin
-backward = True  # Constant to set the direction the wheels spin
-MAX_PW_ELEVATION = 2100  # set the maximum pulse width of the pulse width modulation
-                         # for the Servo controlling elevation angle. Larger pulse width points the cameras downward
-                         # for maximum possible rotation without cameras = 2200
-MIN_PW_ELEVATION = 900  # set the minimum pulse width of the pulse width modulation
-                        # for the Servo controlling elevation angle. Lower pulse width points the cameras upwards
-START_PW_ELEVATION = 900  # initialization value for the z-axis servo
-FORWARD_PW_ELEVATION = 1900  # pulse width to make the cameras face forward
-DEG2PW_FACTOR_ELEVATION = 1000.0/90.0  # Factor to change from degrees into pulse width.
-MAX_PW_Z = 1850  # set the maximum pulse width of the pulse width modulation
-                 # for the Servo controlling rotation around Z-axis
-                 # for maximum possible rotation without cameras = 2250
-MIN_PW_Z = 1050  # set the minimum pulse width of the pulse width modulation
-                # for the Servo controlling rotation around Z-axis
-                # for maximum possible rotation without cameras = 750
-START_PW_Z = 1500  # initialization value for the z-axis servo
-FORWARD_PW_Z = 1500  # pulse width to make the cameras face forward
-DEG2PW_FACTOR_Z = 750/90.0  # Factor to change from degrees into pulse width.
+forward = PIN_MAP.forward  # Constant to set the direction the wheels spin
+backward = not PIN_MAP.forward  # Constant to set the direction the wheels spin
 keycode_forward = [103]  # set key code for driving forward
 keycode_backward = [108]  # set key code for driving backward
 keycode_left = [105]  # set key code for turning left
 keycode_right = [106]  # set key code for turning right
 keycode_calibrate_forward = [28]  # set key code for calibrating forward servo direction
-quit_command = 'quit'  # Command sent through webRTC server to turn off program.
-stop_command = 'stop'  # Command sent through webRTC server to sever connection to cellphone
+quit_command = b'quit'  # Command sent through webRTC server to turn off program.
+stop_command = b'stop'  # Command sent through webRTC server to sever connection to cellphone
+BINARY_PROTOCOL = True  # Accept the compact binary messages (binary_protocol.py) when the phone page asks for them
+RATE_CONTROL = True  # Tell timestamping phone pages how many messages per second to send (rate_control.py)
+SPLIT_PROCESSES = False  # Set to True to let a separate actuator process own pigpio (actuator_process.py, Python 3.8+)
+ACTUATOR_TICK = 0.005  # Seconds between two command reads of the actuator process
+actuator = None  # ActuatorProcess while SPLIT_PROCESSES is running
+REALTIME_MODE = False  # Set to True to pin the loop (the actuator process with SPLIT_PROCESSES) to REALTIME_CPU, run it
+                       # with SCHED_FIFO and locked memory when permitted, and keep the garbage collector off while
+                       # driving (rt_tuning.py). Run with sudo for SCHED_FIFO
+REALTIME_CPU = 3  # Core the loop is pinned to
+REALTIME_PRIORITY = 50  # SCHED_FIFO priority
+gc_control = GcControl(REALTIME_MODE and not SPLIT_PROCESSES)  # Garbage collector off while driving
+HEAD_PREDICTION = False  # Set to True to aim the cameras where the head is predicted to be (head_prediction.py)
+PREDICTION_LOOKAHEAD = None  # Seconds to predict ahead, None to use the measured sample age + SERVO_LAG
+head_predictor = HeadPredictor(PREDICTION_LOOKAHEAD if PREDICTION_LOOKAHEAD is not None else SERVO_LAG) \
+    if HEAD_PREDICTION else None
+GPIO_MEM = False  # Set to True to write the motor pins straight to the GPIO registers (gpiomem.py, Raspberry Pi 1-4),
+                 # the servos stay with pigpio
+GPIO_MEM_PATH = '/dev/gpiomem'
+DRIVE_WAVEFORMS = False  # Set to True to let the pigpio daemon time the motor transitions (drive_waveforms.py)
+STORED_SCRIPTS = False  # Set to True to send the motor and servo changes of a message in one stored pigpio script run
+                       # (pigpio_scripts.py), instead of one call per pin. Takes the place of DRIVE_WAVEFORMS
+tick_script = None  # TickScript while STORED_SCRIPTS is running
+GIMBAL = False  # Set to True to compute the camera servos from a declared list of axes (gimbal.py), with
+                # GIMBAL_EXTRA_AXES after the z-axis and elevation servos. Under 1 us more per sample than the two
+                # servo code paths of Car
+GIMBAL_EXTRA_AXES = []  # Arguments of gimbal.GimbalAxis for more servos, driven with one call per pin only, e.g.
+                        # {'name': 'roll', 'source': 'roll', 'gpio': 13, 'forward': 1500, 'factor': 750 / 90.0,
+                        #  'minimum': 1000, 'maximum': 2000}
+camera_gimbal = None  # gimbal.Gimbal while GIMBAL is running
+HARDWARE_PWM_SERVOS = True  # Drive the servos on gpios with a hardware PWM channel (18 and 19 here) with
+                           # pi.hardware_PWM at 50 Hz in 0.1 us steps instead of set_servo_pulsewidth in 10 us steps
+                           # (servo_output.py). Needs the analog audio off
+hardware_servo_pins = servo_output.hardware_servos(
+    (SERVO_PIN_Z_AXIS, SERVO_PIN_ELEVATION) + tuple(axis['gpio'] for axis in GIMBAL_EXTRA_AXES if GIMBAL)) \
+    if HARDWARE_PWM_SERVOS else set()
+SERVO_IDLE = True  # Detach a camera servo (pulse width 0) when the head has been still for SERVO_IDLE_AFTER and attach
+                   # it again on the next movement (servo_idle.py). Saves battery and stops the hum of the servos
+SERVO_IDLE_AFTER = 3.0  # Seconds without a movement beyond servo_idle.DEADBAND_US
+SERVO_PINS = {'z': SERVO_PIN_Z_AXIS, 'elevation': SERVO_PIN_ELEVATION}
+servo_idle = IdleServos(('z', 'elevation'), SERVO_IDLE_AFTER, enabled=SERVO_IDLE)
+BANK_DRIVE = True  # Drive with the set/clear bank masks compiled from PIN_MAP, two to four pigpio calls per
+                  # direction instead of six writes. DRIVE_WAVEFORMS and STORED_SCRIPTS take its place
+WRITE_CHANGES_ONLY = True  # Only send the driving direction and the servo pulse widths to pigpio when they changed.
+                           # The other writers of these pins keep applied_direction and applied_pw_* right or end the
+                           # program: the stopped and parked link policies, the degraded speed limit (re-applied after
+                           # every drive call), stop_motors/stop_servos, and the emergency stop. False sends them for
+                           # every message, e.g. to recover from a restarted pigpio daemon. With SPLIT_PROCESSES the
+                           # actuator process decides what it sends
+CONTROL_LOG = True  # Write the log (connections, link levels, direction changes, a sample of the messages) as JSON
+                    # lines from a background thread (control_log.py). False writes every record in the control
+                    # loop, like print
+LOG_LIMITS = {'message': (2.0, 5, 10),  # Per kind of record: records per second, burst, and keep one in sample_every
+              'direction': (10.0, 20, 1),
+              'invalid': (1.0, 5, 1)}
+control_log = ControlLog(LOG_LIMITS)
+LINK_MONITOR = True  # Check the link at least every link_monitor.CHECK_INTERVAL and slow down, stop and park the
+                     # cameras when the phone goes silent (link_monitor.py)
+DEGRADED_DUTY_CYCLE = 128  # PWM duty cycle (0-255) of the enable pins while the link is degraded
+speed_limited = False  # Set while the motors are held at DEGRADED_DUTY_CYCLE
+monitor = link_monitor.LinkMonitor(control_log.log)
+LATENCY_STATS = False  # Set to True to measure the time spent in each stage of the control loop.
+                       # The statistics are printed on shutdown and when the program receives SIGUSR1
+latency_stats = LatencyStats(LATENCY_STATS)  # Latency histograms per stage of the control loop
+METRICS_SERVER = False  # Set to True to serve the control loop metrics in the Prometheus text format
+METRICS_PORT = 9101  # Local TCP port of the metrics server (curl http://127.0.0.1:9101/metrics)
+METRICS_SOCKET = None  # Path of a Unix socket to serve the metrics on instead, e.g. '/tmp/vrcar_metrics.socket'
+FLIGHT_RECORDER = False  # Set to True to record every handled message in a memory mapped ring file
+FLIGHT_RECORDER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'flight_recorder.bin')
+FLIGHT_RECORDER_RECORDS = 65536  # Number of messages kept in the ring file, ~18 minutes at 60 messages per second
+if FLIGHT_RECORDER:  # Read back with: python flight_recorder.py flight_recorder.bin --last 60
+    recorder = flight_recorder.FlightRecorder(FLIGHT_RECORDER_PATH, FLIGHT_RECORDER_RECORDS, latency_stats)
+else:
+    recorder = None
+EMERGENCY_STOP = True  # Write the enable pins low first on SIGTERM, SIGINT, an uncaught exception or exit, over a
+                       # pigpio connection of its own, before stop_program() parks the cameras (emergency_stop.py)
+emergency = None  # EmergencyStop once installed by run()
 # ------------------- END Variables --------------------------
-# ------------------- Start Car Class ------------------------
-"""The Car class is used to keep track of the car settings. 
-   The car is initialized as standing still with camera direction forward"""
-
-
-class Car(object):
-    def __init__(self):
-        """The car is initialized as standing still with camera direction forward"""
-        self.drivingDirection = "stop"
-        self.cameraDirection_Z = START_PW_Z
-        self.cameraDirection_Elevation = START_PW_ELEVATION
-        self.cameraForward = 180.0
-        self.alpha_degrees = 90
-        self.gamma_degrees = 90
-        self.gx = 0
-        self.gy = 0
-        self.upside_down = False
-
-    def get_driving_direction(self):
-        """Returns the driving direction (String)"""
-        return self.drivingDirection
-
-    def set_driving_direction(self, driving_direction):
-        """Set the driving direction (String): possible values: forward, backward, left, right and stop."""
-        self.drivingDirection = driving_direction
-
-    def get_camera_direction_z(self):
-        """Returns the pulse width of the PWM signal that controls the servo rotating around the z-axis."""
-        return self.cameraDirection_Z
-
-    def get_camera_direction_elevation(self):
-        """Returns the pulse width of the PWM signal that controls the servo controlling the elevation angle."""
-        return self.cameraDirection_Elevation
-
-    def set_camera_direction_z(self, camera_direction_z):
-        """Set the pulse width of the PWM signal that controls the servo rotating around the z-axis (float).
-           Checks if the pulse width is within the allowed pulse width length and otherwise sets it to the upper or
-           lower limit. If within the allowed pulse width it rounds the number to the closest tens, since the RPI can
-           only handle this resolution"""
-        if camera_direction_z < MIN_PW_Z:
-            self.cameraDirection_Z = MIN_PW_Z
-        elif camera_direction_z > MAX_PW_Z:
-            self.cameraDirection_Z = MAX_PW_Z
-        else:
-            self.cameraDirection_Z = round(camera_direction_z, -1)
-
-    def set_camera_direction_elevation(self, camera_direction_elevation):
-        """Set the pulse width of the PWM signal that controls the servo rotating around the z-axis. 
-           Checks if the pulse width is within the allowed pulse width length and otherwise sets it to the upper or
-           lower limit. If within the allowed pulse width it rounds the number to the closest tens, since the RPI can
-           only handle this resolution"""
-        if camera_direction_elevation < MIN_PW_ELEVATION:
-            self.cameraDirection_Elevation = MIN_PW_ELEVATION
-        elif camera_direction_elevation > MAX_PW_ELEVATION:
-            self.cameraDirection_Elevation = MAX_PW_ELEVATION
-        else:
-            self.cameraDirection_Elevation = round(camera_direction_elevation, 0)
-
-    def set_camera_forward(self):
-        """Recalibrates which angle is considered forward around the z axis (float)."""
-        self.cameraForward = self.alpha_degrees
-
-    def get_camera_forward(self):
-        """Returns which angle is considered forward (float)"""
-        return self.cameraForward
-
-    def calculate_new_pulse_widths(self):
-        """Calculates and sets the pulse width of the servos. All angles changes with 180 degrees when the phone passes
-        from being pointed upward to downward and vice versa. First check if the phone is pointed up or down and change
-        the degrees accordingly."""
-        if self.gamma_degrees < 0:
-            self.alpha_degrees -= 180
-            self.gamma_degrees += 180
-            if self.alpha_degrees < 0:
-                self.alpha_degrees += 360
-        self.check_upside_down()
-        if self.upside_down:
-            self.gamma_degrees = 180 - self.gamma_degrees
-        alpha_forward_diff1 = self.alpha_degrees - self.cameraForward
-        gamma_diff = 90 - self.gamma_degrees
-        if alpha_forward_diff1 < 0:
-            alpha_forward_diff2 = 360.0 + self.alpha_degrees - self.cameraForward
-        else:
-            alpha_forward_diff2 = -360.0 + self.alpha_degrees - self.cameraForward
-
-        if abs(alpha_forward_diff1) <= abs(alpha_forward_diff2):
-            alpha_forward_diff = alpha_forward_diff1
-        else:
-            alpha_forward_diff = alpha_forward_diff2
-
-        self.set_camera_direction_z(FORWARD_PW_Z-alpha_forward_diff*DEG2PW_FACTOR_Z)
-        self.set_camera_direction_elevation(FORWARD_PW_ELEVATION-gamma_diff*DEG2PW_FACTOR_ELEVATION)
-
-    def extract_json_data(self, json_data):
-        """Extracts the relevant orientation data sent from phone and save them to class variables"""
-        self.alpha_degrees = float(json_data.get('do').get('alpha'))
-        self.gamma_degrees = float(json_data.get('do').get('gamma'))
-        self.gx = float(json_data.get('dm').get('gx'))
-        self.gy = float(json_data.get('dm').get('gy'))
-
-    def check_upside_down(self):
-        """ Check if the phone has turned 180 degrees around the phone's y-axis. upside down will change if the up down
-        tilt of the phone is between +/- 30 degrees"""
-        if self.gx > 7 or self.gy > 7:
-            self.upside_down = True
-        elif self.gx < -7 or self.gy < -7:
-            self.upside_down = False
-
-# ------------------- End Car Class------------------------------
-# ----------------- Servo initialization/stop ----------------------------
+# ------------------------ Metrics ---------------------------
+"""Counters and gauges updated by the control loop, only read by the metrics server thread."""
+metrics = Metrics()
+messages_received = metrics.counter('messages_received', 'Messages received from the phone')
+messages_parsed = metrics.counter('messages_parsed', 'Messages parsed as json')
+messages_dropped = metrics.counter('messages_dropped', 'Messages that were neither json nor a command')
+drive_commands_issued = metrics.counter('drive_commands_issued', 'Calls of the motor driving functions')
+drive_commands_suppressed = metrics.counter('drive_commands_suppressed',
+                                            'Motor driving function calls skipped since the direction was unchanged')
+servo_writes_issued = metrics.counter('servo_writes_issued', 'Servo pulse width updates sent to pigpio')
+servo_writes_suppressed = metrics.counter('servo_writes_suppressed',
+                                          'Servo pulse width updates skipped since the pulse width was unchanged')
+pulse_width_z = metrics.gauge('pulse_width_z_microseconds', 'Current pulse width of the z-axis servo')
+pulse_width_elevation = metrics.gauge('pulse_width_elevation_microseconds',
+                                      'Current pulse width of the elevation servo')
+loop_period = metrics.histogram('loop_period_seconds', 'Time between two received messages')
+metrics.add_latency_stats('stage_latency_seconds', latency_stats, 'Time spent in each stage of the control loop')
+link_timing = LinkTiming(metrics.histogram('sample_age_seconds', 'Time from the phone reading a sample until it is '
+                                                                 'handled, needs a timestamped phone page'),
+                         log=control_log.log)
+metrics.callback('samples_lost', 'Messages missing in the sequence numbers of the current connection',
+                 lambda: link_timing.sequences.lost)
+metrics.callback('samples_reordered', 'Messages received after a newer one on the current connection',
+                 lambda: link_timing.sequences.reordered)
+metrics.callback('clock_offset_milliseconds', 'Estimated phone clock minus car clock',
+                 lambda: link_timing.clock.offset or 0.0)
+metrics.callback('round_trip_time_milliseconds', 'Round trip time of the echo used for the clock offset',
+                 lambda: link_timing.clock.rtt or 0.0)
+rate_advisor = RateAdvisor()
+metrics.callback('message_capacity_per_second', 'Messages per second the control loop could handle',
+                 lambda: rate_advisor.capacity() or 0.0)
+metrics.callback('advised_message_rate_per_second', 'Message rate last asked from the phone page',
+                 lambda: rate_advisor.advised_rate or 0.0)
+metrics.callback('prediction_lookahead_seconds', 'Time the cameras are aimed ahead of the head, 0 without prediction',
+                 lambda: head_predictor.lookahead if head_predictor is not None else 0.0)
+metrics.callback('link_level', 'Link quality: 0 good, 1 degraded, 2 motors stopped, 3 cameras parked',
+                 lambda: monitor.level)
+metrics.callback('heartbeat_round_trip_time_milliseconds', 'Round trip time of the latest heartbeat',
+                 lambda: monitor.rtt * 1000.0 if monitor.rtt is not None else 0.0)
+metrics.callback('heartbeats_lost', 'Heartbeats the phone page did not answer in time', lambda: monitor.lost)
+metrics.callback('servo_z_attached_seconds', 'Time the z-axis servo has been attached',
+                 lambda: servo_idle.axes['z'].attached_time(monotonic()))
+metrics.callback('servo_elevation_attached_seconds', 'Time the elevation servo has been attached',
+                 lambda: servo_idle.axes['elevation'].attached_time(monotonic()))
+metrics.callback('servo_detaches', 'Times a servo was detached while the head was still',
+                 lambda: sum(axis.detaches for axis in servo_idle.axes.values()))
+# ---------------------- END Metrics -------------------------
 """The Servo is started, and later only the duty cycle is changed to
 direct the cameras in different directions"""
 
 
+def set_servo(gpio, pulse_width):
+    """Set the pulse width of a servo, 0 turns it off. Uses hardware PWM for the gpios in hardware_servo_pins"""
+    servo_output.set_pulse_width(pi, gpio, pulse_width, gpio in hardware_servo_pins)
+
+
+def set_extra_axes(forward):
+    """Point the servos of GIMBAL_EXTRA_AXES forward, or turn them off"""
+    if camera_gimbal is None or actuator is not None:
+        return
+    for axis in camera_gimbal.axes[2:]:
+        set_servo(axis.gpio, axis.forward if forward else 0)
+    camera_gimbal.forget_sent()
+
+
 def initialize_servo():
     """ Initialize the Servos and make them point to starting position"""
-    pi.set_servo_pulsewidth(SERVO_PIN_Z_AXIS, START_PW_Z)  # Makes the servo point straight forward
-    pi.set_servo_pulsewidth(SERVO_PIN_ELEVATION, START_PW_ELEVATION)  # Makes the servo point straight up
+    if actuator is not None:
+        actuator.publish(pulse_width_z=START_PW_Z, pulse_width_elevation=START_PW_ELEVATION)
+    else:
+        set_servo(SERVO_PIN_Z_AXIS, START_PW_Z)  # Makes the servo point straight forward
+        set_servo(SERVO_PIN_ELEVATION, START_PW_ELEVATION)  # Makes the servo point straight up
+    set_extra_axes(True)
+    servo_idle.reset(monotonic())
     time.sleep(0.5)  # The time for the servo to straighten forward
 
 
+def detach_idle_servos(now):
+    """Turn off the pulses of the servos that have been still for SERVO_IDLE_AFTER"""
+    for name in servo_idle.check(now):
+        if actuator is not None:
+            actuator.publish(**{'pulse_width_' + name: 0})
+        else:
+            set_servo(SERVO_PINS[name], 0)
+
+
 def stop_servos():
     """ Make the servo point to starting position and then turn the PWM signal off"""
-    pi.set_servo_pulsewidth(SERVO_PIN_Z_AXIS, START_PW_Z)  # Points the servo to starting position
-    pi.set_servo_pulsewidth(SERVO_PIN_ELEVATION, START_PW_ELEVATION)  # points the servo to starting position
+    if actuator is not None:
+        actuator.publish(pulse_width_z=START_PW_Z, pulse_width_elevation=START_PW_ELEVATION)
+        time.sleep(1)
+        actuator.publish(pulse_width_z=0, pulse_width_elevation=0)
+        servo_idle.stopped(monotonic())
+        return
+    set_servo(SERVO_PIN_Z_AXIS, START_PW_Z)  # Points the servo to starting position
+    set_servo(SERVO_PIN_ELEVATION, START_PW_ELEVATION)  # points the servo to starting position
+    set_extra_axes(True)
     time.sleep(1)  # wait one second for the servo to reach starting position
-    pi.set_servo_pulsewidth(SERVO_PIN_Z_AXIS, 0)  # Stop servo
-    pi.set_servo_pulsewidth(SERVO_PIN_ELEVATION, 0)  # Stop servo
+    set_servo(SERVO_PIN_Z_AXIS, 0)  # Stop servo
+    set_servo(SERVO_PIN_ELEVATION, 0)  # Stop servo
+    set_extra_axes(False)
+    servo_idle.stopped(monotonic())
 # ---------------- END Servo on startup -------------------------
 # -------Define class with GPIO instructions for driving---------
 """Functions to drive the Car. Because how the h-bridge is designed, the motors need to be
@@ -235,6 +290,9 @@ def drive_right_pivot():
 
 def stop_motors():
     """Stop all motors, turn all motor GPIO pins to low."""
+    if actuator is not None:
+        actuator.publish('stop')
+        return
     pi.write(ENABLE_L_PIN, False)  # Stop LH wheels
     pi.write(ENABLE_R_PIN, False)  # Stop RH wheels
     pi.write(DIR_L_PIN, False)  # Set LH wheels to spin backward
@@ -242,11 +300,79 @@ def stop_motors():
 
 
 # -------END-Define class with GPIO instructions for driving---------
+# --------------------- Link policies ---------------------------
+"""Called by the link monitor when the link gets worse (and better again)."""
+
+
+def reduce_speed():
+    """Drive the running motors at DEGRADED_DUTY_CYCLE, also used after every drive call while the link is degraded"""
+    global speed_limited
+    if actuator is not None:  # The actuator process owns the enable pins, the link policies only stop the motors
+        return
+    speed_limited = True
+    for pin in (ENABLE_L_PIN, ENABLE_R_PIN):
+        if pi.read(pin):
+            pi.set_PWM_dutycycle(pin, DEGRADED_DUTY_CYCLE)
+
+
+def restore_speed():
+    """Drive the motors still running at DEGRADED_DUTY_CYCLE at full speed again"""
+    global speed_limited
+    if actuator is not None:
+        return
+    speed_limited = False
+    for pin in (ENABLE_L_PIN, ENABLE_R_PIN):
+        try:
+            running = pi.get_PWM_dutycycle(pin) > 0
+        except pigpio.error:  # Written since, the motors were stopped or started at full speed
+            continue
+        pi.write(pin, running)
+
+
+def park_camera():
+    """Point the cameras to the starting position"""
+    if actuator is not None:
+        actuator.publish(pulse_width_z=START_PW_Z, pulse_width_elevation=START_PW_ELEVATION)
+    else:
+        set_servo(SERVO_PIN_Z_AXIS, START_PW_Z)
+        set_servo(SERVO_PIN_ELEVATION, START_PW_ELEVATION)
+    set_extra_axes(True)
+    servo_idle.reset(monotonic())
+
+
+monitor.add_policy(link_monitor.DEGRADED, reduce_speed, restore_speed)
+monitor.add_policy(link_monitor.STOPPED, stop_motors)
+monitor.add_policy(link_monitor.PARKED, park_camera)
+# ------------------- END Link policies -------------------------
+# ------------------------- Keycodes ----------------------------
+
+
+def dispatch_keycodes(the_car, keycodes):
+    """Sets the driving direction according to the keycodes sent from the phone (list). Returns the number of
+    iterations the motors should run, or None if the keycodes did not start the motors."""
+    if keycodes == keycode_forward:  # check if relevant keycode has been sent
+        the_car.set_driving_direction('forward')
+        return 5
+    elif keycodes == keycode_backward:
+        the_car.set_driving_direction('backward')
+        return 5
+    elif keycodes == keycode_left:
+        the_car.set_driving_direction('left')
+        return 2
+    elif keycodes == keycode_right:
+        the_car.set_driving_direction('right')
+        return 2
+    elif keycodes == keycode_calibrate_forward:
+        the_car.set_camera_forward()
+    return None
+
+# ----------------------- END Keycodes --------------------------
 # --------------------- Driving direction list ----------------------
 """The driving list is later used as a look up table to call the driving functions."""
 
 driving_direction_list = {'forward': drive_forward, 'backward': drive_backward,
                           'left': drive_left_pivot, 'right': drive_right_pivot, 'stop': stop_motors}
+write_driving_direction_list = dict(driving_direction_list)  # pi.write versions, also with DRIVE_WAVEFORMS
 
 # --------------------- End Driving Direction List ------------------
 # -----------------------Define quit game class ------------------
@@ -256,7 +382,23 @@ def stop_program():
     """shuts down all running components of program"""
     stop_motors()
     stop_servos()
+    if actuator is not None:
+        actuator.quit()
     pi.stop()
+    latency_stats.print_report()
+    if link_timing.ages.count:
+        print (link_timing.format_report())
+    if LINK_MONITOR:
+        print (monitor.format_report())
+    if SERVO_IDLE:
+        print (servo_idle.format_report())
+    if recorder is not None:
+        recorder.close()
+    control_log.close()  # Before the last lines, they would mix with the queued records
+    if CONTROL_LOG:
+        print (control_log.format_report())
+    if emergency is not None and emergency.stops:
+        print (emergency.format_report())
     print ("Shutting down!")
 
 
@@ -289,69 +431,297 @@ def main():
     By sending Quit/Stop it is possible to quit the program or stop the connection to the phone.
     After stopping, it is possible to connect another phone to the car.
     """
+    global actuator, tick_script, pi, camera_gimbal
     the_car = Car()  # Create the Car object
+    the_car.predictor = head_predictor
     iteration_control = 0  # used to control how many iterations the car should enable the motors
     turn_off_program = False  # Used to send quit command
+    receive_buffer = bytearray(256)  # Every message is received into this buffer, binary messages are decoded from it
+    received_view = memoryview(receive_buffer)
+    message = binary_protocol.Message()  # Filled in place for every binary message
+    latency_stats.install_signal_handler()  # kill -USR1 <pid> prints the latency statistics
+    if SPLIT_PROCESSES:  # Started before any thread, the actuator process is forked
+        import actuator_process
+        actuator = actuator_process.ActuatorProcess(
+            PIN_MAP.pins(), PIN_MAP.levels(), START_PW_Z, START_PW_ELEVATION, ACTUATOR_TICK,
+            realtime=RealTimeMode(REALTIME_CPU, REALTIME_PRIORITY) if REALTIME_MODE else None,
+            hardware_pwm=HARDWARE_PWM_SERVOS, host=PIGPIO_HOST)
+    if CONTROL_LOG:  # After the fork, the actuator process must not inherit the writer thread or its locks
+        control_log.start()
+    digits = servo_output.HARDWARE_DIGITS if actuator is None else 0  # The command slot has whole microseconds
+    if SERVO_PIN_Z_AXIS in hardware_servo_pins:  # Finer pulse widths than set_servo_pulsewidth
+        the_car.digits_z = digits
+    if SERVO_PIN_ELEVATION in hardware_servo_pins:
+        the_car.digits_elevation = digits
+    if GIMBAL:
+        camera_gimbal = the_car.gimbal = gimbal.Gimbal(
+            gimbal.v10_axes(SERVO_PIN_Z_AXIS, SERVO_PIN_ELEVATION, the_car.digits_z, the_car.digits_elevation) +
+            [gimbal.GimbalAxis(**dict({'digits': digits if axis['gpio'] in hardware_servo_pins else 0}, **axis))
+             for axis in GIMBAL_EXTRA_AXES])
+        if GIMBAL_EXTRA_AXES and (actuator is not None or STORED_SCRIPTS):
+            print ('The extra gimbal axes are only driven with one call per pin, not with %s' %
+                   ('SPLIT_PROCESSES' if actuator is not None else 'STORED_SCRIPTS'))
+    if GPIO_MEM and actuator is None:
+        try:
+            pi = GpioMemPi(pi, GpioMem(GPIO_MEM_PATH), (ENABLE_L_PIN, ENABLE_R_PIN, DIR_L_PIN, DIR_R_PIN))
+        except (IOError, OSError) as e:  # No /dev/gpiomem or not in the gpio group
+            print ('Motor pins stay with pigpio, %s: %s' % (GPIO_MEM_PATH, e))
+    if STORED_SCRIPTS and actuator is None:  # Stored in the daemon once, run for every message that changes a pin
+        tick_script = TickScript(pi, PIN_MAP.pins(), PIN_MAP.levels(), hardware_servo_pins)
+    elif DRIVE_WAVEFORMS and actuator is None:  # The transitions are sent as one waveform each
+        driving_direction_list.update(DriveWaves(pi, PIN_MAP.pins(), PIN_MAP.levels()).functions())
+    elif BANK_DRIVE and actuator is None:  # Every direction is one clear and at most two sets of the gpio bank
+        driving_direction_list.update(BankDriver(pi, PIN_MAP).functions())
+    if METRICS_SERVER:
+        start_metrics_server(metrics, METRICS_PORT, METRICS_SOCKET)
+    if REALTIME_MODE and actuator is None:  # After the metrics thread was started, it should not inherit the settings
+        print (RealTimeMode(REALTIME_CPU, REALTIME_PRIORITY).apply().format_report())
     while True:
         if turn_off_program:  # Exit main loop if quit command received
             break
         s = setup_connection()  # Setup connection
-        print 'awaiting connection...'
+        control_log.log('connection', state='awaiting connection...')
         connection, client_address = s.accept()  # Establish connection to client
-        print 'Connection established'
+        control_log.log('connection', state='Connection established')
+        if LINK_MONITOR:  # recv waits at most CHECK_INTERVAL, so a silent link is noticed
+            connection.settimeout(link_monitor.CHECK_INTERVAL)
         initialize_servo()  # initialize the servo
         stop = False  # used to stop the control loop and a new connection is possible.
+        applied_direction = 'stop'  # Driving direction last sent to the motors
+        logged_direction = 'stop'
+        binary_messages = False  # Set when the phone page has switched to binary messages
+        link_timing.reset()  # Clock offset and sequence numbers are per phone
+        rate_advisor.reset()
+        if head_predictor is not None:
+            head_predictor.reset()
+        applied_pw_z = pulse_width_z.value = START_PW_Z  # Pulse widths last sent to the servos
+        applied_pw_elevation = pulse_width_elevation.value = START_PW_ELEVATION
+        last_received = monotonic()
+        monitor.reset(last_received)
+        timestamped = False  # Set when the phone page timestamps its messages, it also answers heartbeats
         while True:
             if stop:  # if stop command has been received, enter stop sequence.
                 stop_servos()
                 stop_motors()
-                print 'stop sequence initiated'
-                connection.send('Connection aborted, will reconnect in 15s if call not hanged up.')
+                control_log.log('connection', state='stop sequence initiated')
+                connection.send(b'Connection aborted, will reconnect in 15s if call not hanged up.')
                 connection.close()
                 time.sleep(15)
                 s.close()
                 break
-            data_in_string = connection.recv(256)  # Retrieved the received string.
+            latency_stats.start()
             try:
-                data_in_json = json.loads(data_in_string)  # change string into json object
-                if data_in_json.get('do'):  # if the json-object contains 'do'
-                    the_car.extract_json_data(data_in_json)
+                size = connection.recv_into(receive_buffer)  # Receive the message into the buffer, size in bytes
+            except socket.timeout:  # Nothing from the phone for CHECK_INTERVAL
+                now = monotonic()
+                level = monitor.check(now)
+                if level >= link_monitor.STOPPED:  # The policies have stopped the motors
+                    the_car.set_driving_direction('stop')
+                    applied_direction = 'stop'
+                    iteration_control = 0
+                    gc_control.set_driving(False)  # Collect while the car stands
+                if level >= link_monitor.PARKED:  # and parked the cameras
+                    the_car.set_camera_direction_z(START_PW_Z)
+                    the_car.set_camera_direction_elevation(START_PW_ELEVATION)
+                    applied_pw_z = pulse_width_z.value = START_PW_Z
+                    applied_pw_elevation = pulse_width_elevation.value = START_PW_ELEVATION
+                if timestamped and monitor.heartbeat_due(now):
+                    connection.send(monitor.ping(now))
+                detach_idle_servos(now)
+                continue
+            if size == 0:  # The phone closed the data channel, nothing will be heard from it again
+                stop_motors()
+                stop_servos()
+                gc_control.set_driving(False)
+                control_log.log('connection', state='closed by the phone')
+                connection.close()
+                s.close()
+                break
+            latency_stats.received()
+            messages_received.value += 1
+            now = monotonic()
+            monitor.heard(now)
+            loop_period.record(now - last_received)
+            last_received = now
+            try:
+                binary = binary_messages and size == binary_protocol.MESSAGE_SIZE and \
+                    receive_buffer[0] == binary_protocol.TAG_VALUE
+                if binary:  # Compact binary message, can contain both orientation and keycodes
+                    data_in_string = None
+                    binary_protocol.decode_into(receive_buffer, size, message)
+                    orientation = message.flags & binary_protocol.FLAG_ORIENTATION
+                    keycodes = message.keycodes if message.flags & binary_protocol.FLAG_KEYCODES else None
+                    sequence = message.sequence
+                    timestamp = message.timestamp
+                else:
+                    data_in_string = received_view[:size].tobytes()
+                    data_in_json = json.loads(data_in_string)  # change string into json object
+                    orientation = data_in_json.get('do')  # if the json-object contains 'do'
+                    keycodes = None if orientation else data_in_json.get('keycodes')  # or if it contains 'keycodes'
+                    sequence = data_in_json.get('seq')  # Sent by timestamping phone pages (phone_data_channel.js)
+                    timestamp = data_in_json.get('ts')
+                messages_parsed.value += 1
+                latency_stats.mark('parse')
+                if timestamp is not None:
+                    timestamped = True
+                if timestamp is not None and link_timing.echo_due(now):  # Echoes to sync the phone and car clocks
+                    connection.send(link_timing.clock.echo_request())
+                    if head_predictor is not None and PREDICTION_LOOKAHEAD is None and link_timing.ages.count:
+                        head_predictor.set_lookahead(link_timing.ages.percentile(0.5) + SERVO_LAG)
+                message_type = flight_recorder.OTHER_JSON
+                if orientation:
+                    message_type = flight_recorder.ORIENTATION
+                    if binary:
+                        the_car.set_orientation(message.alpha, message.gamma, message.gx, message.gy, message.beta)
+                    else:
+                        the_car.extract_json_data(data_in_json)
+                    latency_stats.mark('extract')
+                    if head_predictor is not None:  # Predict from the time the phone read the sample when known
+                        phone_time = link_timing.clock.to_car_time(timestamp) if timestamp is not None else None
+                        the_car.sample_time = phone_time / 1000.0 if phone_time is not None else now
                     the_car.calculate_new_pulse_widths()
-                elif data_in_json.get('keycodes'):  # if the json-object contains 'keycodes'
-                    if data_in_json.get('keycodes') == keycode_forward:  # check if relevant keycode has been sent
-                        the_car.set_driving_direction('forward')
-                        iteration_control = 5
-                    elif data_in_json.get('keycodes') == keycode_backward:
-                        the_car.set_driving_direction('backward')
-                        iteration_control = 5
-                    elif data_in_json.get('keycodes') == keycode_left:
-                        the_car.set_driving_direction('left')
-                        iteration_control = 2
-                    elif data_in_json.get('keycodes') == keycode_right:
-                        the_car.set_driving_direction('right')
-                        iteration_control = 2
-                    elif data_in_json.get('keycodes') == keycode_calibrate_forward:
-                        the_car.set_camera_forward()
+                    latency_stats.mark('calculate')
+                if keycodes:
+                    message_type = flight_recorder.KEYCODES
+                    iterations = dispatch_keycodes(the_car, keycodes)
+                    if iterations is not None:
+                        iteration_control = iterations
+                    latency_stats.mark('keycodes')
+                if not binary and BINARY_PROTOCOL and binary_protocol.is_protocol_request(data_in_json):
+                    connection.send(binary_protocol.ACCEPT_MESSAGE)  # The phone switches to binary messages
+                    binary_messages = True
+                elif not binary and data_in_json.get('echo'):  # Answer to an echo request
+                    link_timing.clock.echo_answer(data_in_json.get('echo'), now * 1000.0)
+                elif not binary and data_in_json.get('pong'):  # Answer to a heartbeat
+                    monitor.pong(data_in_json.get('pong'), now)
                 if iteration_control <= 0:  # Check if car motors has been going for the specified number of iterations
                     the_car.set_driving_direction('stop')  # stop motors if it has.
                     iteration_control = 0
 
-                driving_direction_list[the_car.get_driving_direction()]()  # Call motor function from list
-                pi.set_servo_pulsewidth(SERVO_PIN_Z_AXIS, round(the_car.get_camera_direction_z(), -1))  # Set servos
-                pi.set_servo_pulsewidth(SERVO_PIN_ELEVATION, round(the_car.get_camera_direction_elevation(), 0))
+                if actuator is not None:  # The actuator process applies the command at its next tick
+                    applied_direction = the_car.drivingDirection
+                    applied_pw_z = pulse_width_z.value = servo_idle.target(
+                        'z', round(the_car.cameraDirection_Z, the_car.digits_z), applied_pw_z, now)
+                    applied_pw_elevation = pulse_width_elevation.value = servo_idle.target(
+                        'elevation', round(the_car.cameraDirection_Elevation, the_car.digits_elevation),
+                        applied_pw_elevation, now)
+                    actuator.publish(applied_direction, servo_idle.output('z', applied_pw_z),
+                                     servo_idle.output('elevation', applied_pw_elevation))
+                    latency_stats.mark('publish')
+                elif tick_script is not None:  # One daemon round trip for all pins of the message
+                    new_direction = the_car.drivingDirection
+                    new_pw_z = servo_idle.target('z', round(the_car.cameraDirection_Z, the_car.digits_z),
+                                                 applied_pw_z, now)
+                    new_pw_elevation = servo_idle.target(
+                        'elevation', round(the_car.cameraDirection_Elevation, the_car.digits_elevation),
+                        applied_pw_elevation, now)
+                    if new_direction == applied_direction and WRITE_CHANGES_ONLY:
+                        drive_commands_suppressed.value += 1
+                        new_direction = None  # The script only updates the servos
+                    else:
+                        applied_direction = new_direction
+                        drive_commands_issued.value += 1
+                        if speed_limited:  # The enable pins need PWM again, the script would race with it
+                            write_driving_direction_list[new_direction]()
+                            reduce_speed()
+                            new_direction = None
+                    if new_direction is not None or new_pw_z != applied_pw_z or \
+                            new_pw_elevation != applied_pw_elevation or not WRITE_CHANGES_ONLY:
+                        tick_script.run(new_direction, servo_idle.output('z', new_pw_z),
+                                        servo_idle.output('elevation', new_pw_elevation))
+                        applied_pw_z = pulse_width_z.value = new_pw_z
+                        applied_pw_elevation = pulse_width_elevation.value = new_pw_elevation
+                        servo_writes_issued.value += 1
+                    else:
+                        servo_writes_suppressed.value += 1
+                    latency_stats.mark('script')
+                else:
+                    if the_car.drivingDirection != applied_direction or not WRITE_CHANGES_ONLY:
+                        applied_direction = the_car.drivingDirection
+                        if speed_limited:  # Only a write ends the PWM on the enable pins, a waveform does not
+                            write_driving_direction_list[applied_direction]()
+                            reduce_speed()
+                        else:
+                            driving_direction_list[applied_direction]()  # Call motor function from list
+                        drive_commands_issued.value += 1
+                    else:
+                        drive_commands_suppressed.value += 1
+                    latency_stats.mark('gpio_drive')
+                    new_pw_z = servo_idle.target('z', round(the_car.cameraDirection_Z, the_car.digits_z),
+                                                 applied_pw_z, now)  # Unchanged while detached and still
+                    if new_pw_z != applied_pw_z or not WRITE_CHANGES_ONLY:  # The servo keeps its pulse width
+                        set_servo(SERVO_PIN_Z_AXIS, servo_idle.output('z', new_pw_z))  # 0 while detached
+                        applied_pw_z = pulse_width_z.value = new_pw_z
+                        servo_writes_issued.value += 1
+                    else:
+                        servo_writes_suppressed.value += 1
+                    latency_stats.mark('servo_z')
+                    new_pw_elevation = servo_idle.target(
+                        'elevation', round(the_car.cameraDirection_Elevation, the_car.digits_elevation),
+                        applied_pw_elevation, now)
+                    if new_pw_elevation != applied_pw_elevation or not WRITE_CHANGES_ONLY:
+                        set_servo(SERVO_PIN_ELEVATION, servo_idle.output('elevation', new_pw_elevation))
+                        applied_pw_elevation = pulse_width_elevation.value = new_pw_elevation
+                        servo_writes_issued.value += 1
+                    else:
+                        servo_writes_suppressed.value += 1
+                    latency_stats.mark('servo_elevation')
+                    if GIMBAL_EXTRA_AXES and camera_gimbal is not None:  # Only the axes whose pulse width changed
+                        if not WRITE_CHANGES_ONLY:
+                            camera_gimbal.forget_sent()
+                        for gpio, pulse_width in camera_gimbal.changes(2):
+                            set_servo(gpio, pulse_width)
+                            servo_writes_issued.value += 1
+                gc_control.set_driving(applied_direction != 'stop')
+                if timestamp is not None:  # Age of the sample now that the servos have been updated
+                    link_timing.sample(sequence, timestamp)
+                    rate_advisor.handled(monotonic() - now)
+                    if RATE_CONTROL and rate_advisor.advice_due(now):  # The phone page throttles its messages
+                        connection.send(rate_advisor.advice(now))
+                detach_idle_servos(now)
+                if LINK_MONITOR:  # Releases the policies, or degrades on a slow or lossy heartbeat
+                    monitor.check(now)
+                    if timestamped and monitor.heartbeat_due(now):
+                        connection.send(monitor.ping(now))
+                latency_stats.finish()
+                if recorder is not None:
+                    recorder.record(message_type, the_car, applied_pw_z, applied_pw_elevation)
+                if applied_direction != logged_direction:  # Logged after the motors and servos were updated
+                    control_log.log('direction', direction=applied_direction)
+                    logged_direction = applied_direction
+                control_log.log('message', type=flight_recorder.MESSAGE_TYPE_NAMES[message_type],
+                                direction=applied_direction, z=applied_pw_z, elevation=applied_pw_elevation)
                 iteration_control -= 1
             except ValueError:  # Check if something other than json-object has been sent.
+                message_type = flight_recorder.COMMAND
                 if data_in_string == quit_command:  # Check if quit command has been sent
                     stop = True
                     turn_off_program = True
                 elif data_in_string == stop_command:  # Check if stop command has been sent
                     stop = True
-# ------------------------End Main---------------------------------------
-
-if __name__ == "__main__":
+                else:
+                    message_type = flight_recorder.INVALID
+                    messages_dropped.value += 1
+                    control_log.log('invalid', size=size)
+                if recorder is not None:
+                    recorder.record(message_type, the_car, applied_pw_z, applied_pw_elevation)
+
+
+def run():
+    """Runs the car program until it is quit or ended, then shuts it down. The motors are disabled first"""
+    global emergency
+    if EMERGENCY_STOP:  # Own connection, a signal may arrive while pi is in the middle of a call
+        emergency = EmergencyStop(pigpio.pi(PIGPIO_HOST), (ENABLE_L_PIN, ENABLE_R_PIN)).install()
     try:
         main()
     except Exception as e:
-        print e
-    stop_program()
+        if emergency is not None:
+            emergency.trigger('exception')
+        print (e)
+    finally:  # Also after SIGTERM and SIGINT
+        stop_program()
+# ------------------------End Main---------------------------------------
+
+if __name__ == "__main__":
+    run()
     # call("sudo nohup shutdown -h now", shell=True)  # Turns off RPi when program ends.
\ No newline at end of file
@@ -8,6 +8,8 @@ import pygame
 import time
 from pygame.locals import *
 import socket
+from keyboard_input import KeyboardInput, PygameEventSource
+from pin_map import CARS
 
 # -------------------Accelerometer-----------------------
 host = ''
@@ -20,17 +22,23 @@ s.bind((host, port))
 # -----------------END Accelerometer---------------------
 
 # -------------------- GPIO INITIATION ------------------------
-GPIO.setmode(GPIO.BOARD)
+PIN_MAP = CARS['v6']  # Pins and direction polarity of this car (pin_map.py), in BCM numbering
+ENABLE_L_PIN = PIN_MAP.enable_l  # EN1, header pin 7
+ENABLE_R_PIN = PIN_MAP.enable_r  # EN2, header pin 11
+DIR_L_PIN = PIN_MAP.dir_l  # DIR1, header pin 13
+DIR_R_PIN = PIN_MAP.dir_r  # DIR2, header pin 15
+SERVO_PIN = PIN_MAP.servo_z  # Header pin 12
+GPIO.setmode(GPIO.BCM)
 # Below 4 rows just tells the RPi what theese pins are output pinns =(pins to send signals to the H-brige with)
-GPIO.setup(7, GPIO.OUT)  # EN1 controls left hand side wheels (H-bridge connector J1 pin1)
-GPIO.setup(11, GPIO.OUT)  # EN2 controles right hand side wheelsa (H-bridge connector J1 pin7)
-GPIO.setup(13, GPIO.OUT)  # DIR1 LH True=Forward & False=Backward
-GPIO.setup(15, GPIO.OUT)  # DIR2 RH True=Forward & False=Backward
+GPIO.setup(ENABLE_L_PIN, GPIO.OUT)  # EN1 controls left hand side wheels (H-bridge connector J1 pin1)
+GPIO.setup(ENABLE_R_PIN, GPIO.OUT)  # EN2 controles right hand side wheelsa (H-bridge connector J1 pin7)
+GPIO.setup(DIR_L_PIN, GPIO.OUT)  # DIR1 LH True=Forward & False=Backward
+GPIO.setup(DIR_R_PIN, GPIO.OUT)  # DIR2 RH True=Forward & False=Backward
 
-GPIO.setup(12, GPIO.OUT)  # Sets the pin 12 as an output/signaling pin for the Servo
+GPIO.setup(SERVO_PIN, GPIO.OUT)  # Sets the servo pin as an output/signaling pin
 GPIO.setwarnings(False)
-GPIO.output(7, False)
-GPIO.output(11, False)
+GPIO.output(ENABLE_L_PIN, False)
+GPIO.output(ENABLE_R_PIN, False)
 
 
 # ------------------ END GPIO INITIATION -----------------------
@@ -70,7 +78,7 @@ class Car(object):
 # -------------------End Car Class------------------------------
 
 # ------------- Servo on startup -------------------------------
-servoPin = 12  # Servo signaling pin
+servoPin = SERVO_PIN  # Servo signaling pin
 pwm = GPIO.PWM(servoPin, 50)
 pwm.start(7.5)  # Makes the servo point straight forward
 time.sleep(0.5)  # The time for the servo to straighten forward
@@ -81,8 +89,8 @@ time.sleep(0.5)  # The time for the servo to straighten forward
 t = 0.05  # run time
 servoStepLength = 0.5  # Set Step length for Servo
 stop = False
-forward = False  # Constant to set the direction the wheels spin
-backward = True  # Constant to set the direction the wheels spin
+forward = PIN_MAP.forward  # Constant to set the direction the wheels spin
+backward = not PIN_MAP.forward  # Constant to set the direction the wheels spin
 
 # ---END Variables-------
 
@@ -90,47 +98,47 @@ backward = True  # Constant to set the direction the wheels spin
 
 
 def drive_forward():
-    GPIO.output(7, False)  # EN1 Enable RH wheels to spin
-    GPIO.output(11, False)  # EN2 Enable LH wheels to spin
-    GPIO.output(13, forward)  # Enable RH wheels to spin forward
-    GPIO.output(15, forward)  # Enable LH wheels to spin forward
-    GPIO.output(7, True)  # EN1 Enable RH wheels to spin
-    GPIO.output(11, True)  # EN2 Enable LH wheels to spin
+    GPIO.output(ENABLE_L_PIN, False)  # EN1 Enable RH wheels to spin
+    GPIO.output(ENABLE_R_PIN, False)  # EN2 Enable LH wheels to spin
+    GPIO.output(DIR_L_PIN, forward)  # Enable RH wheels to spin forward
+    GPIO.output(DIR_R_PIN, forward)  # Enable LH wheels to spin forward
+    GPIO.output(ENABLE_L_PIN, True)  # EN1 Enable RH wheels to spin
+    GPIO.output(ENABLE_R_PIN, True)  # EN2 Enable LH wheels to spin
 
 
 def drive_backward():
-    GPIO.output(7, False)  # EN1 Enable RH wheels to spin
-    GPIO.output(11, False)  # EN2 Enable LH wheels to spin
-    GPIO.output(13, backward)  # Enable RH wheels to spin backwards
-    GPIO.output(15, backward)  # Enable LH wheels to spin backwards
-    GPIO.output(7, True)  # EN1 Enable RH wheels to spin
-    GPIO.output(11, True)  # EN2 Enable LH wheels to spin
+    GPIO.output(ENABLE_L_PIN, False)  # EN1 Enable RH wheels to spin
+    GPIO.output(ENABLE_R_PIN, False)  # EN2 Enable LH wheels to spin
+    GPIO.output(DIR_L_PIN, backward)  # Enable RH wheels to spin backwards
+    GPIO.output(DIR_R_PIN, backward)  # Enable LH wheels to spin backwards
+    GPIO.output(ENABLE_L_PIN, True)  # EN1 Enable RH wheels to spin
+    GPIO.output(ENABLE_R_PIN, True)  # EN2 Enable LH wheels to spin
 
 
 def drive_left_pivot():
-    GPIO.output(7, False)  # EN1 Enables RH wheels to spin
-    GPIO.output(11, False)  # EN2 Disable LH wheels to spin
-    GPIO.output(13, backward)  # Enabels RH wheels to spin forward
-    GPIO.output(15, forward)  # Enabels LH wheels to spin backwards
-    GPIO.output(7, True)  # EN1 Enables RH wheels to spin
-    GPIO.output(11, True)  # EN2 Disable LH wheels to spin
+    GPIO.output(ENABLE_L_PIN, False)  # EN1 Enables RH wheels to spin
+    GPIO.output(ENABLE_R_PIN, False)  # EN2 Disable LH wheels to spin
+    GPIO.output(DIR_L_PIN, backward)  # Enabels RH wheels to spin forward
+    GPIO.output(DIR_R_PIN, forward)  # Enabels LH wheels to spin backwards
+    GPIO.output(ENABLE_L_PIN, True)  # EN1 Enables RH wheels to spin
+    GPIO.output(ENABLE_R_PIN, True)  # EN2 Disable LH wheels to spin
 
 
 def drive_right_pivot():
-    GPIO.output(7, False)  # EN1 Disable RH wheels to spin
-    GPIO.output(11, False)  # EN2 Enables LH wheels to spin
-    GPIO.output(13, forward)  # Enabels RH wheels to spin backwards
-    GPIO.output(15, backward)  # Enabels LH wheels to spin forward
-    GPIO.output(7, True)  # EN1 Disable RH wheels to spin
-    GPIO.output(11, True)  # EN2 Enables LH wheels to spin
+    GPIO.output(ENABLE_L_PIN, False)  # EN1 Disable RH wheels to spin
+    GPIO.output(ENABLE_R_PIN, False)  # EN2 Enables LH wheels to spin
+    GPIO.output(DIR_L_PIN, forward)  # Enabels RH wheels to spin backwards
+    GPIO.output(DIR_R_PIN, backward)  # Enabels LH wheels to spin forward
+    GPIO.output(ENABLE_L_PIN, True)  # EN1 Disable RH wheels to spin
+    GPIO.output(ENABLE_R_PIN, True)  # EN2 Enables LH wheels to spin
 
 
 # --- Stop motors --- #
 def stop_all():
-    GPIO.output(7, 0)
-    GPIO.output(11, 0)
-    GPIO.output(13, 0)
-    GPIO.output(15, 0)
+    GPIO.output(ENABLE_L_PIN, 0)
+    GPIO.output(ENABLE_R_PIN, 0)
+    GPIO.output(DIR_L_PIN, 0)
+    GPIO.output(DIR_R_PIN, 0)
 
 
 # --END Stop motors--##
@@ -177,58 +185,33 @@ drivingDirectionList = {'forward': drive_forward, 'backward': drive_backward,
 
 # --------------------- keyboard steering -------------------------
 def main():
+    """Waits for keyboard/joystick events instead of polling with sleeps. All pending events are handled at once and
+    the drive function is only called when the held keys give a new driving direction."""
     the_car = Car()
-    runs = True
 
-    while runs:
-        time.sleep(.02)
-        if stop:
+    def drive(direction):
+        the_car.set_driving_direction(direction)
+        drivingDirectionList[direction]()
+        print(direction)
+
+    def set_camera(direction):
+        the_car.set_camera_direction(direction)
+        pwm.ChangeDutyCycle(the_car.get_camera_direction())
+
+    def camera_step(turn):
+        turn()
+        pwm.ChangeDutyCycle(the_car.get_camera_direction())
+        print('Camera Direction DC = ', the_car.get_camera_direction())
+
+    camera_actions = {'servo_left': lambda: set_camera(5.5),  # key <Q> Turn servo left
+                      'servo_right': lambda: set_camera(9.5),  # key <R> Turn servo right
+                      'servo_forward': lambda: set_camera(7.5),  # key <E> Turn servo straight forward
+                      'servo_step_left': lambda: camera_step(the_car.servo_turn_left),  # key <C>
+                      'servo_step_right': lambda: camera_step(the_car.servo_turn_right)}  # key <V>
+    keyboard = KeyboardInput(PygameEventSource(pygame), drive, camera_actions)
+    while not stop:
+        if not keyboard.poll():  # key <Esc> or closing the window quits
             break
-        for event in pygame.event.get():
-            if event.type == pygame.KEYDOWN:
-                if event.key == 32:  # key <SPACE> Stop motors / Break
-                    stop_all()
-                if event.key == K_w:  # key <W> Move forward
-                    the_car.set_driving_direction('forward')
-                    print(the_car.get_driving_direction())
-                if event.key == K_s:  # key <S> Move backward
-                    the_car.set_driving_direction('backward')
-                    print(the_car.get_driving_direction())
-                if event.key == K_a:  # key <A> Move left
-                    the_car.set_driving_direction('left')
-                    print(the_car.get_driving_direction())
-                if event.key == K_d:  # key <D> Move right
-                    the_car.set_driving_direction('right')
-                    print(the_car.get_driving_direction())
-
-                if event.key == K_q:  # key <Q> Turn servo left
-                    the_car.set_camera_direction(5.5)
-                if event.key == K_r:  # key <R> Turn servo right
-                    the_car.set_camera_direction(9.5)
-                if event.key == K_e:  # key <E> Turn servo straight forward
-                    the_car.set_camera_direction(7.5)
-
-                if event.key == K_c:
-                    the_car.servo_turn_left()
-                    print('Camera Direction DC = ', the_car.get_camera_direction())
-                if event.key == K_v:
-                    the_car.servo_turn_right()
-                    print('Camera Direction DC = ', the_car.get_camera_direction())
-
-                if event.key == K_ESCAPE:  # key <Esc> QUIT
-                    global stop
-                    stop = True
-            elif event.type == pygame.KEYUP:
-                the_car.set_driving_direction('stop')
-                print(the_car.get_driving_direction())
-
-            elif event.type == pygame.QUIT:
-                global stop
-                stop = True
-
-            drivingDirectionList[the_car.get_driving_direction()]()
-            pwm.ChangeDutyCycle(the_car.get_camera_direction())
-            time.sleep(0.05)
 
 # -------------------- END keyboard steering -----------------------
 
@@ -4,6 +4,7 @@ import time
 from pygame.locals import *
 import re
 import socket
+from pin_map import CARS
 
 # ------------------- Accelerometer --------------------
 host = ''
@@ -16,24 +17,30 @@ s.bind((host, port))
 
 # ------------------ GPIO INITIATION ------------------------
 
-GPIO.setmode(GPIO.BOARD)  # Below 4 rows sets the output pins for motor control
-GPIO.setup(7, GPIO.OUT)  # EN1 controls left hand side wheels (H-bridge connector J1 pin1)
-GPIO.setup(11, GPIO.OUT)  # EN2 controls right hand side wheels (H-bridge connector J1 pin7)
-GPIO.setup(13, GPIO.OUT)  # DIR1 LH True=Forward & False=Backward
-GPIO.setup(15, GPIO.OUT)  # DIR2 RH True=Forward & False=Backward
-
-GPIO.setup(12, GPIO.OUT)  # Sets the pin 12 as an output/signaling pin for the Servo
+PIN_MAP = CARS['v6']  # Pins and direction polarity of this car (pin_map.py), in BCM numbering
+ENABLE_L_PIN = PIN_MAP.enable_l  # EN1, header pin 7
+ENABLE_R_PIN = PIN_MAP.enable_r  # EN2, header pin 11
+DIR_L_PIN = PIN_MAP.dir_l  # DIR1, header pin 13
+DIR_R_PIN = PIN_MAP.dir_r  # DIR2, header pin 15
+SERVO_PIN = PIN_MAP.servo_z  # Header pin 12
+GPIO.setmode(GPIO.BCM)  # Below 4 rows sets the output pins for motor control
+GPIO.setup(ENABLE_L_PIN, GPIO.OUT)  # EN1 controls left hand side wheels (H-bridge connector J1 pin1)
+GPIO.setup(ENABLE_R_PIN, GPIO.OUT)  # EN2 controls right hand side wheels (H-bridge connector J1 pin7)
+GPIO.setup(DIR_L_PIN, GPIO.OUT)  # DIR1 LH True=Forward & False=Backward
+GPIO.setup(DIR_R_PIN, GPIO.OUT)  # DIR2 RH True=Forward & False=Backward
+
+GPIO.setup(SERVO_PIN, GPIO.OUT)  # Sets the servo pin as an output/signaling pin
 GPIO.setwarnings(False)
-GPIO.output(7, False)
-GPIO.output(11, False)
+GPIO.output(ENABLE_L_PIN, False)
+GPIO.output(ENABLE_R_PIN, False)
 
 # ---------------- END GPIO INITIATION -----------------------
 
 # -------------------- Variables -----------------------------
 t = 0.05  # run time
 servoStepLength = 0.5  # Set Step length for Servo
-forward = False  # Constant to set the direction the wheels spin
-backward = True  # Constant to set the direction the wheels spin
+forward = PIN_MAP.forward  # Constant to set the direction the wheels spin
+backward = not PIN_MAP.forward  # Constant to set the direction the wheels spin
 # ------------------- END Variables --------------------------
 
 # ------------------- Start Car Class ------------------------
@@ -86,7 +93,7 @@ class Car(object):
 # ------------------- End Car Class------------------------------
 
 # ----------------- Servo on startup ----------------------------
-servoPin = 12  # Servo signaling pin
+servoPin = SERVO_PIN  # Servo signaling pin
 pwm = GPIO.PWM(servoPin, 50)
 pwm.start(7.5)  # Makes the servo point straight forward
 time.sleep(0.5)  # The time for the servo to straighten forward
@@ -95,46 +102,46 @@ time.sleep(0.5)  # The time for the servo to straighten forward
 # -------Define class with GPIO instructions for driving---------
 
 def drive_forward():
-    GPIO.output(7, False)  # EN1 Disable RH wheels to spin
-    GPIO.output(11, False)  # EN2 Disable LH wheels to spin
-    GPIO.output(13, forward)  # Enable RH wheels to spin forward
-    GPIO.output(15, forward)  # Enable LH wheels to spin forward
-    GPIO.output(7, True)  # EN1 Enable RH wheels to spin
-    GPIO.output(11, True)  # EN2 Enable LH wheels to spin
+    GPIO.output(ENABLE_L_PIN, False)  # EN1 Disable RH wheels to spin
+    GPIO.output(ENABLE_R_PIN, False)  # EN2 Disable LH wheels to spin
+    GPIO.output(DIR_L_PIN, forward)  # Enable RH wheels to spin forward
+    GPIO.output(DIR_R_PIN, forward)  # Enable LH wheels to spin forward
+    GPIO.output(ENABLE_L_PIN, True)  # EN1 Enable RH wheels to spin
+    GPIO.output(ENABLE_R_PIN, True)  # EN2 Enable LH wheels to spin
 
 
 def drive_backward():
-    GPIO.output(7, False)  # EN1 Disable RH wheels to spin
-    GPIO.output(11, False)  # EN2 Disable LH wheels to spin
-    GPIO.output(13, backward)  # Enable RH wheels to spin backwards
-    GPIO.output(15, backward)  # Enable LH wheels to spin backwards
-    GPIO.output(7, True)  # EN1 Enable RH wheels to spin
-    GPIO.output(11, True)  # EN2 Enable LH wheels to spin
+    GPIO.output(ENABLE_L_PIN, False)  # EN1 Disable RH wheels to spin
+    GPIO.output(ENABLE_R_PIN, False)  # EN2 Disable LH wheels to spin
+    GPIO.output(DIR_L_PIN, backward)  # Enable RH wheels to spin backwards
+    GPIO.output(DIR_R_PIN, backward)  # Enable LH wheels to spin backwards
+    GPIO.output(ENABLE_L_PIN, True)  # EN1 Enable RH wheels to spin
+    GPIO.output(ENABLE_R_PIN, True)  # EN2 Enable LH wheels to spin
 
 
 def drive_left_pivot():
-    GPIO.output(7, False)  # EN1 Disable RH wheels to spin
-    GPIO.output(11, False)  # EN2 Disable LH wheels to spin
-    GPIO.output(13, backward)  # Enabels RH wheels to spin forward
-    GPIO.output(15, forward)  # Enabels LH wheels to spin backwards
-    GPIO.output(7, True)  # EN1 Enables RH wheels to spin
-    GPIO.output(11, True)  # EN2 Enables LH wheels to spin
+    GPIO.output(ENABLE_L_PIN, False)  # EN1 Disable RH wheels to spin
+    GPIO.output(ENABLE_R_PIN, False)  # EN2 Disable LH wheels to spin
+    GPIO.output(DIR_L_PIN, backward)  # Enabels RH wheels to spin forward
+    GPIO.output(DIR_R_PIN, forward)  # Enabels LH wheels to spin backwards
+    GPIO.output(ENABLE_L_PIN, True)  # EN1 Enables RH wheels to spin
+    GPIO.output(ENABLE_R_PIN, True)  # EN2 Enables LH wheels to spin
 
 
 def drive_right_pivot():
-    GPIO.output(7, False)  # EN1 Disable RH wheels to spin
-    GPIO.output(11, False)  # EN2 Enables LH wheels to spin
-    GPIO.output(13, forward)  # Enabels RH wheels to spin backwards
-    GPIO.output(15, backward)  # Enabels LH wheels to spin forward
-    GPIO.output(7, True)  # EN1 Enables RH wheels to spin
-    GPIO.output(11, True)  # EN2 Enables LH wheels to spin
+    GPIO.output(ENABLE_L_PIN, False)  # EN1 Disable RH wheels to spin
+    GPIO.output(ENABLE_R_PIN, False)  # EN2 Enables LH wheels to spin
+    GPIO.output(DIR_L_PIN, forward)  # Enabels RH wheels to spin backwards
+    GPIO.output(DIR_R_PIN, backward)  # Enabels LH wheels to spin forward
+    GPIO.output(ENABLE_L_PIN, True)  # EN1 Enables RH wheels to spin
+    GPIO.output(ENABLE_R_PIN, True)  # EN2 Enables LH wheels to spin
 
 
 def stop_all():
-    GPIO.output(7, 0)
-    GPIO.output(11, 0)
-    GPIO.output(13, 0)
-    GPIO.output(15, 0)
+    GPIO.output(ENABLE_L_PIN, 0)
+    GPIO.output(ENABLE_R_PIN, 0)
+    GPIO.output(DIR_L_PIN, 0)
+    GPIO.output(DIR_R_PIN, 0)
 
 
 # -------END-Define class with GPIO instructions for driving---------
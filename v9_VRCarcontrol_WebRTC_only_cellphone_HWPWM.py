@@ -7,6 +7,7 @@ import re
 import socket
 import os
 import json
+from control_log import ControlLog
 
 # ------------------ Communication with phone ----------------
 """Setup of the communication servo through the webrtc server"""
@@ -38,6 +39,7 @@ pi.write(ENABLE_R_PIN, False)
 # ---------------- END GPIO INITIATION -----------------------
 # -------------------- Variables -----------------------------
 t = 0.05  # run time
+control_log = ControlLog({'message': (5.0, 10, 1)})  # Received messages, at most 5 per second from a background thread
 servoStepLength = 0.5  # Set Step length for Servo
 forward = False  # Constant to set the direction the wheels spin
 backward = True  # Constant to set the direction the wheels spin
@@ -171,6 +173,7 @@ def stop_program():
     stop_all()
     pi.set_servo_pulsewidth(SERVO_PIN, 0)
     pi.stop()
+    control_log.close()
     print ("Shutting down!")
 
 
@@ -189,6 +192,7 @@ def main():
     iteration_control = 0
     turn_off_program = False
     averaging_duty_cycle = [180.0, 180.0, 180.0]
+    control_log.start()
     while True:
         if turn_off_program:
             break
@@ -208,7 +212,7 @@ def main():
             data_in_string = connection.recv(256)
             try:
                 data_in_json = json.loads(data_in_string)
-                print data_in_json
+                control_log.log('message', data=data_in_json)
                 if data_in_json.get('do'):
                     alpha_degrees = float(data_in_json.get('do').get('alpha'))
                     gamma_degrees = float(data_in_json.get('do').get('gamma'))